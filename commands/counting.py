@@ -1,48 +1,134 @@
-import json
-import os
 import re
 import ast
 import operator
 import time
-from typing import Dict, Optional, List
+from typing import Dict, Optional, List, Set, Tuple
 from ..helpers import rotur
+from ..helpers.storage import get_db
 
 counting_state = {}
 COUNTING_CHANNEL_ID = "1210367658927722506"
-STATE_FILE = None
 
-def init_state_file(module_dir):
-    """Initialize the state file path"""
-    global STATE_FILE
-    STATE_FILE = os.path.join(module_dir, "store", "counting_state.json")
+# Number of logged events after which the log is folded into the snapshot rows.
+COMPACT_EVERY = 500
+
+_log_seq = 0
+_events_since_snapshot = 0
+_dirty_users: Set[Tuple[str, str]] = set()
+# Set by init_state(); messages are ignored until the state is loaded.
+_state_ready = False
+
+def init_state():
+    """Load the counting snapshot from the database and replay the event log"""
+    global _state_ready
     load_state()
+    replayed = _replay_log()
+    if replayed:
+        print(f"Counting: replayed {replayed} logged event(s)")
+    save_state()
+    _state_ready = True
 
 def load_state():
-    """Load counting state from file"""
-    global counting_state
-    if STATE_FILE and os.path.exists(STATE_FILE):
-        try:
-            with open(STATE_FILE, 'r') as f:
-                data = json.load(f)
-                if isinstance(data, dict):
-                    counting_state = data
-                else:
-                    counting_state = {}
-        except Exception as e:
-            print(f"Error loading counting state: {e}")
-            counting_state = {}
-    else:
-        counting_state = {}
+    """Load the counting state snapshot rows"""
+    global counting_state, _log_seq
+    _dirty_users.clear()
+    try:
+        counting_state, _log_seq = get_db().counting.load_snapshot()
+    except Exception as e:
+        print(f"Error loading counting state: {e}")
+        counting_state, _log_seq = {}, 0
+
+def _replay_log() -> int:
+    """Apply logged events newer than the snapshot. Returns how many were applied."""
+    global _log_seq
+    applied = 0
+    try:
+        for seq, event in get_db().counting.events_after(_log_seq):
+            _apply_event(event)
+            _log_seq = seq
+            applied += 1
+    except Exception as e:
+        print(f"Error replaying counting log: {e}")
+    return applied
 
 def save_state():
-    """Save counting state to file"""
-    if STATE_FILE:
-        try:
-            os.makedirs(os.path.dirname(STATE_FILE), exist_ok=True)
-            with open(STATE_FILE, 'w') as f:
-                json.dump(counting_state, f, indent=2)
-        except Exception as e:
-            print(f"Error saving counting state: {e}")
+    """Fold the event log into the snapshot rows in one transaction"""
+    global _events_since_snapshot
+    try:
+        get_db().counting.compact(counting_state, _dirty_users, _log_seq)
+        _dirty_users.clear()
+        _events_since_snapshot = 0
+    except Exception as e:
+        print(f"Error saving counting state: {e}")
+
+def _record(event: Dict) -> None:
+    """Apply an event to the in-memory state and append it to the log"""
+    global _log_seq, _events_since_snapshot
+    _apply_event(event)
+    _log_seq += 1
+    event["seq"] = _log_seq
+    try:
+        get_db().counting.append_event(_log_seq, event)
+    except Exception as e:
+        print(f"Error appending counting event: {e}")
+        return
+    _events_since_snapshot += 1
+    if _events_since_snapshot >= COMPACT_EVERY:
+        save_state()
+
+def _apply_event(event: Dict) -> None:
+    """Mutate counting_state according to a single logged event"""
+    kind = event.get("type")
+    state = get_channel_state(str(event.get("channel")))
+    user_id = event.get("user")
+    user_stats = None
+    if user_id:
+        user_stats = _get_or_create_user(state, user_id, event.get("ts"))
+        _dirty_users.add((str(event.get("channel")), user_id))
+
+    if kind == "count":
+        number = int(event["number"])
+        state["current_count"] = number
+        state["last_user"] = user_id
+        state["last_count_message_id"] = event.get("message_id")
+        state["last_count_value"] = number if event.get("message_id") else None
+        state["total_counts"] += 1
+        user_stats["counts"] += 1
+        if state["current_count"] > state["highest_count"]:
+            state["highest_count"] = state["current_count"]
+    elif kind == "fail":
+        _clear_count(state, 0)
+        state["resets"] = state.get("resets", 0) + 1
+        user_stats["fails"] += 1
+    elif kind == "wrong":
+        user_stats["wrong_attempts"] += 1
+    elif kind == "boost":
+        state["current_count"] += int(event["amount"])
+    elif kind == "set":
+        _clear_count(state, int(event["number"]))
+    elif kind == "reset":
+        state["current_count"] = 0
+        state["last_user"] = None
+    elif kind == "delete":
+        state["current_count"] = max(0, int(event["number"]))
+        state["last_count_message_id"] = None
+        state["last_count_value"] = None
+
+def _clear_count(state: Dict, number: int) -> None:
+    state["current_count"] = number
+    state["last_user"] = None
+    state["last_count_message_id"] = None
+    state["last_count_value"] = None
+
+def reset_count(channel_id: str) -> int:
+    """Reset the count for a channel. Returns the count before the reset."""
+    old_count = get_channel_state(channel_id)["current_count"]
+    _record({"type": "reset", "channel": channel_id})
+    return old_count
+
+def restore_deleted_count(channel_id: str, value: int) -> None:
+    """Roll the count back to value after the last counted message was deleted"""
+    _record({"type": "delete", "channel": channel_id, "number": int(value)})
 
 def _make_default_channel_state() -> Dict:
     return {
@@ -160,20 +246,22 @@ async def is_rotur_user(user_id: str) -> str:
         print(f"Error checking rotur user: {e}")
         return ""
 
-def _get_or_create_user(state: Dict, user_id: str) -> Dict:
+def _get_or_create_user(state: Dict, user_id: str, seen_at: Optional[int] = None) -> Dict:
     users = state.setdefault('users', {})
+    if seen_at is None:
+        seen_at = int(time.time())
     if user_id not in users:
         users[user_id] = {
             'counts': 0,
             'fails': 0,
             'wrong_attempts': 0,
-            'last_seen': int(time.time())
+            'last_seen': seen_at
         }
     else:
         users[user_id].setdefault('counts', 0)
         users[user_id].setdefault('fails', 0)
         users[user_id].setdefault('wrong_attempts', 0)
-        users[user_id]['last_seen'] = int(time.time())
+        users[user_id]['last_seen'] = seen_at
     return users[user_id]
 
 async def handle_counting_message(message, channel):
@@ -181,7 +269,7 @@ async def handle_counting_message(message, channel):
     if str(channel.id) != COUNTING_CHANNEL_ID:
         return False
     
-    if STATE_FILE is None:
+    if not _state_ready:
         return False
     
     user_id = str(message.author.id)
@@ -197,11 +285,7 @@ async def handle_counting_message(message, channel):
         
         try:
             number = int(parts[1])
-            state["current_count"] = number
-            state["last_user"] = None
-            state['last_count_message_id'] = None
-            state['last_count_value'] = None
-            save_state()
+            _record({"type": "set", "channel": str(channel.id), "number": number})
             await channel.send(f"✅ Count set to **{number}**. Next number is **{number + 1}**!")
         except ValueError:
             await channel.send(f"❌ Invalid number: `{parts[1]}`. Please provide a valid integer.")
@@ -245,7 +329,7 @@ async def handle_counting_message(message, channel):
             await channel.send(f"❌ Error boosting: {resp.get('error')}")
             return True
         addTo = boostBy * 10
-        state["current_count"] += addTo
+        _record({"type": "boost", "channel": str(channel.id), "amount": addTo})
         await channel.send(f"✅ Boosted count by {addTo} using {boostBy} credits, the next number is **{state['current_count'] + 1}**!")
         return True
     
@@ -268,21 +352,18 @@ async def handle_counting_message(message, channel):
                 pass
             return True
         
-        state["current_count"] = int(number)
-        state["last_user"] = user_id
         try:
-            state['last_count_message_id'] = str(message.id)
-            state['last_count_value'] = int(number)
+            message_id = str(message.id)
         except:
-            state['last_count_message_id'] = None
-            state['last_count_value'] = None
-        state["total_counts"] += 1
-        user_stats['counts'] += 1
-        
-        if state["current_count"] > state["highest_count"]:
-            state["highest_count"] = state["current_count"]
-        
-        save_state()
+            message_id = None
+        _record({
+            "type": "count",
+            "channel": str(channel.id),
+            "user": user_id,
+            "number": int(number),
+            "message_id": message_id,
+            "ts": int(time.time()),
+        })
         
         if state["current_count"] % 100 == 0:
             await message.add_reaction("💯")
@@ -298,13 +379,7 @@ async def handle_counting_message(message, channel):
     else:
         if state["last_user"] != user_id:
             old_count = state["current_count"]
-            state["current_count"] = 0
-            state["last_user"] = None
-            state['last_count_message_id'] = None
-            state['last_count_value'] = None
-            state['resets'] = state.get('resets', 0) + 1
-            user_stats['fails'] += 1
-            save_state()
+            _record({"type": "fail", "channel": str(channel.id), "user": user_id, "ts": int(time.time())})
             
             reset_msg = await channel.send(
                 f"💥 **Count reset!** {message.author.mention} ruined it at {old_count}! "
@@ -313,8 +388,7 @@ async def handle_counting_message(message, channel):
                 f"Start again from **1**!"
             )
         else:
-            user_stats['wrong_attempts'] += 1
-            save_state()
+            _record({"type": "wrong", "channel": str(channel.id), "user": user_id, "ts": int(time.time())})
             try:
                 await channel.send(
                     f"❌ {message.author.mention} wrong number! The next count should be **{expected_count}**, not **{int(number)}**."
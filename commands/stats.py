@@ -1,6 +1,11 @@
-import requests
+from ..helpers import json_codec
+from ..helpers.http_clients import http_clients
 
-def query(spl):
+async def _get_json(url):
+    async with http_clients.session("local").get(url) as resp:
+        return await resp.json(content_type=None, loads=json_codec.loads)
+
+async def query(spl):
     match spl[1]:
         case 'help':
             lines = [
@@ -13,16 +18,14 @@ def query(spl):
             ]
             return "\n".join(lines)
         case 'rank_aura':
-            val = requests.get('http://127.0.0.1:5602/stats/aura')
-            data = val.json()
+            data = await _get_json('http://127.0.0.1:5602/stats/aura')
             result = "```\n"
             for user in data:
                 result += f"{user['name']}: {user['aura']}\n"
             result += "```"
             return result
         case 'credits':
-            val = requests.get('http://127.0.0.1:5602/stats/economy')
-            data = val.json()
+            data = await _get_json('http://127.0.0.1:5602/stats/economy')
             result = (
                 f"```\nAverage: {data['average']}\n"
                 f"Total: {data['total']}\n"
@@ -34,8 +37,7 @@ def query(spl):
             )
             return result
         case 'store':
-            val = requests.get('http://127.0.0.1:5601/stats')
-            data = val.json()
+            data = await _get_json('http://127.0.0.1:5601/stats')
             views = data.get('views', {})
             downloads = data.get('downloads', {})
             all_names = set(views) | set(downloads)
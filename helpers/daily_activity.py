@@ -0,0 +1,154 @@
+"""
+Daily activity ledger for roturbot
+Tracks who has earned their daily chat credit, kept in memory and backed by
+one database row per award (daily_credits in store/roturbot.db).
+"""
+
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set, Any
+
+from .storage import get_db
+
+
+def _summarize(date: str, users: int, total: float) -> Dict[str, Any]:
+    return {
+        "date": date,
+        "users": users,
+        "total": round(total, 2),
+    }
+
+
+def _previous_date(date: str) -> str:
+    return (datetime.strptime(date, "%Y-%m-%d") - timedelta(days=1)).strftime("%Y-%m-%d")
+
+
+class DailyActivityLedger:
+    """In-memory record of today's daily credits plus summaries of past days."""
+
+    def __init__(self):
+        self.date = ""
+        self._credited: Dict[str, float] = {}
+        self._pending: Set[str] = set()
+        self._history: Dict[str, Dict[str, Any]] = {}
+
+    def _open_day(self, date: str) -> None:
+        """Make date the current day, rebuilding it from its rows."""
+        if self.date and self.date != date:
+            self._history.pop(self.date, None)
+        try:
+            credited = get_db().daily_credits.active_for_day(date)
+        except Exception as e:
+            print(f"Error loading daily activity: {e}")
+            credited = {}
+        self.date = date
+        self._credited = credited
+        self._pending = set()
+
+    def ensure_date(self, date: str) -> None:
+        if self.date != date:
+            self._open_day(date)
+
+    def is_credited(self, user_id, date: str) -> bool:
+        """Return True if the user already has (or is being given) today's credit."""
+        self.ensure_date(date)
+        uid = str(user_id)
+        return uid in self._credited or uid in self._pending
+
+    def claim(self, user_id, date: str) -> bool:
+        """Reserve today's credit for a user.
+
+        Returns False if they were already credited or a claim is in flight.
+        Follow up with record_credit() on success or release() on failure.
+        """
+        if self.is_credited(user_id, date):
+            return False
+        self._pending.add(str(user_id))
+        return True
+
+    def release(self, user_id) -> None:
+        self._pending.discard(str(user_id))
+
+    def record_credit(self, user_id, amount: float, date: str) -> None:
+        """Mark a user as credited today and store the award."""
+        self.ensure_date(date)
+        uid = str(user_id)
+        amount = float(amount)
+        self._pending.discard(uid)
+        self._credited[uid] = amount
+        try:
+            get_db().daily_credits.record(date, uid, amount)
+        except Exception as e:
+            print(f"Error saving daily activity: {e}")
+
+    def roll_over(self, date: str) -> Dict[str, Any]:
+        """Close the current day and start a fresh one at date.
+
+        Returns the summary ({"date", "users", "total"}) of the day that was
+        closed, plus "user_ids" of everyone credited that day. When date is
+        the current day, its credits are voided so users can earn again, as
+        the manual reset command expects.
+
+        Right after a restart nothing is open yet; the day closed is then the
+        one before date, read back from its stored rows (unless date already
+        has credits, which makes this a same-day reset).
+        """
+        if not self.date:
+            self._open_day(date)
+            if not self._credited:
+                return self._close_stored_day(_previous_date(date))
+        closing = _summarize(self.date, len(self._credited), sum(self._credited.values()))
+        closing["user_ids"] = list(self._credited)
+        if self.date == date:
+            self._credited = {}
+            self._pending = set()
+            try:
+                get_db().daily_credits.void_day(date)
+            except Exception as e:
+                print(f"Error saving daily activity: {e}")
+        else:
+            self._open_day(date)
+        return closing
+
+    def _close_stored_day(self, date: str) -> Dict[str, Any]:
+        """Summary of a day that is not open, plus its "user_ids", from the database."""
+        try:
+            credited = get_db().daily_credits.active_for_day(date)
+        except Exception as e:
+            print(f"Error loading daily activity: {e}")
+            credited = {}
+        closing = _summarize(date, len(credited), sum(credited.values()))
+        closing["user_ids"] = list(credited)
+        return closing
+
+    def today(self) -> Dict[str, Any]:
+        return _summarize(self.date, len(self._credited), sum(self._credited.values()))
+
+    def get_day(self, date: str) -> Optional[Dict[str, Any]]:
+        """Return the summary for a past or current day, or None if nothing was awarded.
+
+        Voided awards (from a same-day reset) are not counted, matching today().
+        """
+        if date == self.date:
+            return self.today()
+        if date not in self._history:
+            summary = get_db().daily_credits.summary(date)
+            if summary is None:
+                return None
+            self._history[date] = _summarize(date, *summary)
+        return self._history[date]
+
+    def get_history(self, limit: int = 7) -> List[Dict[str, Any]]:
+        """Return summaries for the most recent days with awards, newest first."""
+        dates = get_db().daily_credits.recent_dates(limit)
+        if self.date and self.date not in dates:
+            dates.insert(0, self.date)
+        summaries = []
+        for date in dates[:limit]:
+            summary = self.get_day(date)
+            if summary is not None:
+                summaries.append(summary)
+        return summaries
+
+
+# Global instance for easy access
+daily_ledger = DailyActivityLedger()
@@ -0,0 +1,121 @@
+"""
+Shared HTTP clients for roturbot
+One long-lived aiohttp session per outside service, so repeated calls reuse
+keep-alive TCP/TLS connections instead of setting up a fresh session each
+time. Each service has its own connection limit, which also caps how many
+requests run against it at once; the rest wait for a free connection.
+Shared sessions never keep cookies: a login gets its own short-lived
+session (login_session) so it cannot leak into other users' calls.
+The rotur API keeps its own session in helpers/rotur.py.
+"""
+
+import time
+import aiohttp
+from typing import Any, Dict, Optional
+
+from . import json_codec
+
+
+class ServiceConfig:
+    __slots__ = ("limit", "timeout", "keepalive")
+
+    def __init__(self, limit: int = 8, timeout: float = 20, keepalive: float = 30):
+        self.limit = limit
+        self.timeout = timeout
+        self.keepalive = keepalive
+
+
+SERVICES: Dict[str, ServiceConfig] = {
+    "tavily": ServiceConfig(limit=8, timeout=30),
+    "wiki": ServiceConfig(limit=4, timeout=20),
+    # apps.mistium.com: timezone info and the Tenor proxy
+    "mistium": ServiceConfig(limit=8, timeout=15),
+    "discord_cdn": ServiceConfig(limit=8, timeout=15),
+    "avatars": ServiceConfig(limit=4, timeout=20),
+    "truthordare": ServiceConfig(limit=4, timeout=10),
+    # services on this host: the moderation helper used by the shush
+    # reaction and the stats servers behind !stats
+    "local": ServiceConfig(limit=4, timeout=10, keepalive=60),
+    # arbitrary URLs from the make_web_request tool
+    "web": ServiceConfig(limit=8, timeout=20, keepalive=15),
+}
+
+
+class HTTPClients:
+    def __init__(self, services: Dict[str, ServiceConfig] = SERVICES):
+        self.services = services
+        self._sessions: Dict[str, aiohttp.ClientSession] = {}
+        self._created: Dict[str, float] = {}
+
+    def session(self, service: str) -> aiohttp.ClientSession:
+        """Return the service's session, creating it on first use.
+
+        Must be called from the event loop. Do not close the result.
+        """
+        session = self._sessions.get(service)
+        if session is None or session.closed:
+            config = self.services.get(service)
+            if config is None:
+                raise KeyError(f"Unknown HTTP service: {service}")
+            connector = aiohttp.TCPConnector(
+                limit=config.limit,
+                limit_per_host=config.limit,
+                keepalive_timeout=config.keepalive,
+                ttl_dns_cache=300,
+            )
+            session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=config.timeout),
+                cookie_jar=aiohttp.DummyCookieJar(),
+                json_serialize=json_codec.dumps,
+            )
+            self._sessions[service] = session
+            self._created[service] = time.time()
+        return session
+
+    def login_session(self, service: str) -> aiohttp.ClientSession:
+        """Return a new session with its own cookie jar, for a login and the calls it authorises.
+
+        It borrows the service's connection pool but its cookies die with it.
+        Use it as `async with http_clients.login_session(service) as session:`.
+        """
+        shared = self.session(service)
+        return aiohttp.ClientSession(
+            connector=shared.connector,
+            connector_owner=False,
+            timeout=shared.timeout,
+            cookie_jar=aiohttp.CookieJar(),
+            json_serialize=json_codec.dumps,
+        )
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Open sessions with their limit and (best effort) pooled connection counts."""
+        result = {}
+        for service, session in self._sessions.items():
+            if session.closed:
+                continue
+            connector = session.connector
+            acquired = getattr(connector, "_acquired", None)
+            idle = getattr(connector, "_conns", None)
+            result[service] = {
+                "limit": self.services[service].limit,
+                "in_use": len(acquired) if acquired is not None else None,
+                "idle": sum(len(c) for c in idle.values()) if isinstance(idle, dict) else None,
+                "age_seconds": round(time.time() - self._created[service]),
+            }
+        return result
+
+    async def close(self, service: Optional[str] = None) -> None:
+        """Close one service's session, or all of them. Call on shutdown."""
+        names = [service] if service else list(self._sessions)
+        for name in names:
+            session = self._sessions.pop(name, None)
+            if session is not None and not session.closed:
+                try:
+                    await session.close()
+                except Exception as e:
+                    print(f"Error closing {name} HTTP session: {e}")
+
+
+# Global instance for easy access
+http_clients = HTTPClients()
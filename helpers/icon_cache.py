@@ -1,35 +1,40 @@
-import json
-import os
 import hashlib
 from io import BytesIO
-from typing import Optional, Dict, Any, Union
+from typing import Optional, Dict, Any, Set, Union
 import discord
 from . import icn
+from .storage import get_db
 
 class IconCache:
-    def __init__(self, cache_file_path: str, client: discord.Client):
-        self.cache_file = cache_file_path
+    def __init__(self, client: discord.Client):
         self.client = client
+        self.repo = get_db().icons
         self.cache: Dict[str, Union[str, Dict[str, Any]]] = self._load_cache()
-        self._dirty = False
+        self._dirty: Set[str] = set()
     
     def _load_cache(self) -> Dict[str, Union[str, Dict[str, Any]]]:
         try:
-            if os.path.exists(self.cache_file):
-                with open(self.cache_file, 'r') as f:
-                    return json.load(f)
+            return self.repo.load_all()
         except Exception as e:
             print(f"Error loading icon cache: {e}")
         return {}
     
     def _save_cache(self):
+        """Write the entries changed since the last save."""
         try:
-            os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
-            with open(self.cache_file, 'w') as f:
-                json.dump(self.cache, f, indent=2)
+            self.repo.upsert_many({h: self.cache[h] for h in self._dirty if isinstance(self.cache.get(h), dict)})
+            self._dirty.clear()
         except Exception as e:
             print(f"Error saving icon cache: {e}")
     
+    def _forget(self, icon_hash: str):
+        self.cache.pop(icon_hash, None)
+        self._dirty.discard(icon_hash)
+        try:
+            self.repo.delete(icon_hash)
+        except Exception as e:
+            print(f"Error removing icon cache entry: {e}")
+    
     def _hash_icon(self, icon_code: str) -> str:
         return hashlib.md5(icon_code.encode()).hexdigest()[:12]
     
@@ -56,7 +61,7 @@ class IconCache:
                     'id': str(emoji_id),
                     'last_used': int(__import__('time').time())
                 }
-                self._dirty = True
+                self._dirty.add(icon_hash)
                 return f"<:i_{icon_hash}:{emoji_id}>"
         
         try:
@@ -73,6 +78,7 @@ class IconCache:
                 'id': str(emoji.id),
                 'last_used': int(__import__('time').time())
             }
+            self._dirty.add(icon_hash)
             self._save_cache()
             
             print(f"Created new application emoji: {emoji.name} ({emoji.id}) for icon hash {icon_hash}")
@@ -100,7 +106,6 @@ class IconCache:
         
         if self._dirty:
             self._save_cache()
-            self._dirty = False
         return emojis
     
     async def cleanup_old_emojis(self):
@@ -124,14 +129,13 @@ class IconCache:
                         if emoji:
                             await emoji.delete()
                             removed_count += 1
-                    del self.cache[icon_hash]
+                    self._forget(icon_hash)
                 except discord.NotFound:
-                    del self.cache[icon_hash]
+                    self._forget(icon_hash)
                 except Exception as e:
                     print(f"Error removing application emoji {emoji_id}: {e}")
         
         if removed_count > 0:
-            self._save_cache()
             print(f"Cleaned up {removed_count} unused application emoji(s)")
         
         return removed_count
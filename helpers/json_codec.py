@@ -0,0 +1,189 @@
+"""
+JSON codec for roturbot
+One place to encode and decode JSON. Uses orjson when it is installed and
+falls back to the stdlib json module otherwise; ROTUR_JSON_BACKEND=json
+forces the fallback. Output is compact UTF-8 (no ASCII escaping) with
+either backend. Values orjson refuses (integers over 64 bits, custom
+types handled by a default=) are retried with the stdlib encoder, so the
+codec never rejects anything json.dumps would accept.
+
+Run `python helpers/json_codec.py` to benchmark both backends on
+payloads shaped like the tool results the bot produces.
+"""
+
+import os
+import json
+import time
+import random
+from typing import IO, Any, Callable, Dict, Optional
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+JSONDecodeError = json.JSONDecodeError
+
+_STDLIB_SEPARATORS = (",", ":")
+
+
+class StdlibCodec:
+    name = "json"
+
+    def dumps(self, obj: Any, indent: Optional[int] = None, sort_keys: bool = False,
+              default: Optional[Callable[[Any], Any]] = None) -> str:
+        return json.dumps(
+            obj,
+            ensure_ascii=False,
+            indent=indent,
+            separators=None if indent else _STDLIB_SEPARATORS,
+            sort_keys=sort_keys,
+            default=default,
+        )
+
+    def loads(self, data: Any) -> Any:
+        return json.loads(data)
+
+
+class OrjsonCodec(StdlibCodec):
+    name = "orjson"
+
+    def dumps(self, obj: Any, indent: Optional[int] = None, sort_keys: bool = False,
+              default: Optional[Callable[[Any], Any]] = None) -> str:
+        # orjson only knows two-space indentation.
+        if indent not in (None, 0, 2):
+            return super().dumps(obj, indent, sort_keys, default)
+        option = orjson.OPT_NON_STR_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        try:
+            return orjson.dumps(obj, default=default, option=option).decode("utf-8")
+        except TypeError:
+            return super().dumps(obj, indent, sort_keys, default)
+
+    def loads(self, data: Any) -> Any:
+        return orjson.loads(data)
+
+
+BACKENDS: Dict[str, Callable[[], StdlibCodec]] = {"json": StdlibCodec}
+if orjson is not None:
+    BACKENDS["orjson"] = OrjsonCodec
+
+_codec: StdlibCodec = StdlibCodec()
+
+
+def set_backend(name: str) -> None:
+    """Switch the process to another backend ("orjson" or "json")."""
+    global _codec
+    factory = BACKENDS.get(name)
+    if factory is None:
+        raise ValueError(f"JSON backend not available: {name}")
+    _codec = factory()
+
+
+def backend() -> str:
+    return _codec.name
+
+
+def dumps(obj: Any, indent: Optional[int] = None, sort_keys: bool = False,
+          default: Optional[Callable[[Any], Any]] = None) -> str:
+    return _codec.dumps(obj, indent, sort_keys, default)
+
+
+def loads(data: Any) -> Any:
+    """Decode a str or bytes document. Raises JSONDecodeError (a ValueError)."""
+    return _codec.loads(data)
+
+
+def dump(obj: Any, f: IO[str], indent: Optional[int] = None, sort_keys: bool = False) -> None:
+    f.write(dumps(obj, indent, sort_keys))
+
+
+def load(f: IO) -> Any:
+    return loads(f.read())
+
+
+set_backend(os.getenv("ROTUR_JSON_BACKEND") or ("orjson" if orjson is not None else "json"))
+
+
+_WORDS = (
+    "rotur originos credits badge friend post reply like system theme app store "
+    "wallet transfer discord server profile avatar banner marriage follow standing"
+).split()
+
+
+def _text(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(_WORDS) for _ in range(words))
+
+
+def _post(rng: random.Random) -> Dict[str, Any]:
+    return {
+        "id": f"{rng.getrandbits(64):016x}",
+        "content": _text(rng, rng.randrange(5, 60)),
+        "user": rng.choice(_WORDS) + str(rng.randrange(1000)),
+        "timestamp": 1700000000000 + rng.randrange(10 ** 10),
+        "likes": [rng.choice(_WORDS) for _ in range(rng.randrange(8))],
+        "replies": [{"content": _text(rng, 10), "user": rng.choice(_WORDS)} for _ in range(rng.randrange(3))],
+        "os": "originOS",
+    }
+
+
+def sample_payloads(seed: int = 0) -> Dict[str, Any]:
+    """Payloads shaped like real tool results, from a small error up to a 50k-character profile."""
+    rng = random.Random(seed)
+    profile = {
+        "username": "mistium",
+        "pfp": "https://avatars.rotur.dev/mistium",
+        "bio": _text(rng, 80),
+        "currency": 12345.67,
+        "badges": [{"name": w, "description": _text(rng, 12)} for w in _WORDS[:12]],
+        "followers": 842,
+        "following": 120,
+        "created": 1680000000000,
+        "private": False,
+        "theme": {"primary": "#1e1e2e", "secondary": "#313244", "accent": "#f38ba8"},
+    }
+    posts = []
+    big_profile = dict(profile, posts=posts)
+    while len(dumps(big_profile)) < 50000:
+        posts.append(_post(rng))
+    return {
+        "error": {"error": "Missing required parameter: query"},
+        "profile": profile,
+        "search_posts": [_post(rng) for _ in range(20)],
+        "profile_with_posts": big_profile,
+    }
+
+
+def benchmark(rounds: int = 500) -> Dict[str, Dict[str, Any]]:
+    """Time dumps and loads of each sample payload on every available backend."""
+    current = backend()
+    results: Dict[str, Dict[str, Any]] = {}
+    try:
+        for name in BACKENDS:
+            set_backend(name)
+            for label, payload in sample_payloads().items():
+                encoded = dumps(payload)
+                assert loads(encoded) == payload, (name, label)
+                start = time.perf_counter()
+                for _ in range(rounds):
+                    dumps(payload)
+                dumps_us = (time.perf_counter() - start) / rounds * 1e6
+                start = time.perf_counter()
+                for _ in range(rounds):
+                    loads(encoded)
+                loads_us = (time.perf_counter() - start) / rounds * 1e6
+                results.setdefault(label, {"chars": len(encoded)})[name] = {
+                    "dumps_us": round(dumps_us, 1),
+                    "loads_us": round(loads_us, 1),
+                }
+    finally:
+        set_backend(current)
+    return results
+
+
+if __name__ == "__main__":
+    for label, row in benchmark().items():
+        print(label, row)
@@ -1,54 +1,872 @@
 """
 Global Memory System for roturbot
 Manages per-server AI memories with fuzzy and semantic search capabilities.
+
+Each guild's memories stay resident once loaded. Changes (including the
+access statistics bumped by every search) mark the guild dirty and are
+written out in batches by a background flush; call flush() on shutdown.
+
+Memories live in the shared SQLite store (see storage.py), one row per
+memory, so several processes can use them. Every write is one
+transaction that bumps the guild's version; resident guilds reload only
+when that version changes, and a write over a newer version merges in
+memories it has not seen instead of dropping them. Only rows that
+changed are rewritten.
+
+Expiry is tracked as a numeric epoch ('expires_ts') in a per-guild
+min-heap, and the earliest expiry of every guild is stored with its
+version, so cleanup only loads guilds that actually have something due.
+
+Saving a memory that nearly duplicates an existing one (found with
+MinHash LSH over character shingles) merges it into that memory instead,
+and each guild is capped at MAX_MEMORIES_PER_GUILD by evicting the
+memories with the lowest importance score.
+
+Keyword search ranks memories with BM25 over a per-guild inverted index
+and only re-ranks the best few dozen candidates with rapidfuzz.
+
+Embeddings are kept per guild as one float32 matrix aligned with the
+memory list and stored as a float32 blob beside each memory, so semantic
+search is a single matrix-vector product. Without NumPy the vectors are
+kept in the memory dicts and search falls back to a Python loop.
 """
 
 import os
-import json
+import re
+import sys
+import math
+import time
 import uuid
-from datetime import datetime, timedelta
-from typing import List, Dict, Any, Optional
-from pathlib import Path
+import heapq
+import random
+import asyncio
+import hashlib
+import threading
+from array import array
+from collections import Counter
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Set, Tuple
 
 from rapidfuzz import fuzz, process
 
-MODULE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-MEMORIES_DIR = os.path.join(MODULE_DIR, "store", "memories")
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
-# Ensure memories directory exists
-os.makedirs(MEMORIES_DIR, exist_ok=True)
+try:
+    from . import json_codec
+    from .storage import Database, connect as connect_db
+except ImportError:  # run as a script
+    import json_codec
+    from storage import Database, connect as connect_db
 
+# Embedding configuration. Changing any of these re-embeds a guild's
+# memories the next time it is loaded (see EMBEDDER_TAG).
+EMBEDDING_DIM = int(os.getenv("MEMORY_EMBEDDING_DIM", "256"))
+EMBEDDING_SEED = os.getenv("MEMORY_EMBEDDING_SEED", "roturbot-memories")
+EMBEDDING_VERSION = 2
+EMBEDDER_TAG = f"hash-v{EMBEDDING_VERSION}/{EMBEDDING_DIM}/{EMBEDDING_SEED}"
 
-def _get_memory_file(guild_id: str) -> str:
-    """Get the memory file path for a specific guild."""
-    return os.path.join(MEMORIES_DIR, f"{guild_id}.json")
+# Weight query terms by their inverse document frequency within the guild.
+USE_TFIDF = True
 
+# BM25 parameters, and how many keyword candidates are fuzzy re-ranked.
+BM25_K1 = 1.2
+BM25_B = 0.75
+KEYWORD_CANDIDATES = 32
 
-def _load_memories(guild_id: str) -> List[Dict[str, Any]]:
-    """Load all memories for a guild."""
-    file_path = _get_memory_file(guild_id)
-    if not os.path.exists(file_path):
-        return []
-    
-    try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            return data.get('memories', [])
-    except (json.JSONDecodeError, IOError):
-        return []
+# Query terms at least this long also match index terms they are a prefix of.
+MIN_PREFIX_LEN = 3
+
+# Near-duplicate detection: character shingles, MinHash signatures split
+# into LSH bands, and the shingle Jaccard similarity at which two memories
+# count as the same fact.
+SHINGLE_SIZE = 4
+MINHASH_PERMUTATIONS = 32
+MINHASH_BANDS = 8
+DUPLICATE_THRESHOLD = 0.7
+
+# Most memories a guild keeps; saving past this evicts the least important.
+MAX_MEMORIES_PER_GUILD = int(os.getenv("MEMORY_MAX_PER_GUILD", "1000"))
+
+# Memories this close to expiring get a small importance boost.
+URGENCY_WINDOW = 2 * 86400
+
+# Seconds between checks of a resident guild's stored version.
+VERSION_CHECK_INTERVAL = 2.0
+
+# Seconds to wait after the first unsaved change before writing dirty guilds.
+FLUSH_DELAY = 10.0
+
+# Waits longer than this for the database write lock count as contended.
+CONTENDED_WAIT = 0.002
+
+
+def _expires_ts(memory: Dict[str, Any]) -> float:
+    """Return a memory's expiry as an epoch, filling it in from the ISO string once."""
+    ts = memory.get('expires_ts')
+    if ts is None:
+        try:
+            ts = datetime.fromisoformat(memory['expires_at']).timestamp()
+        except (KeyError, TypeError, ValueError):
+            ts = math.inf
+        memory['expires_ts'] = ts
+    return ts
+
+
+def _set_expiry(memory: Dict[str, Any], ttl_days: float, now: Optional[float] = None) -> float:
+    ts = (time.time() if now is None else now) + ttl_days * 86400
+    memory['expires_ts'] = ts
+    memory['expires_at'] = datetime.fromtimestamp(ts).isoformat()
+    return ts
+
+
+lock_stats = {
+    "acquired": 0,
+    "contended": 0,
+    "wait_seconds": 0.0,
+    "max_wait_seconds": 0.0,
+    "reloads": 0,
+    "merges": 0,
+}
+_lock_stats_lock = threading.Lock()
+
+
+def _count_lock_event(key: str) -> None:
+    with _lock_stats_lock:
+        lock_stats[key] += 1
+
+
+def storage_stats() -> Dict[str, Any]:
+    """Write lock contention and flush counters for this process."""
+    with _lock_stats_lock:
+        stats = dict(lock_stats)
+    stats["avg_wait_ms"] = round(stats["wait_seconds"] / stats["contended"] * 1000, 2) if stats["contended"] else 0.0
+    stats["wait_seconds"] = round(stats["wait_seconds"], 4)
+    stats["max_wait_seconds"] = round(stats["max_wait_seconds"], 4)
+    stats.update(flush_counters)
+    stats["resident_guilds"] = len(_guilds)
+    stats["dirty_guilds"] = len(_dirty_guilds)
+    return stats
+
+
+# Separate connections for reads and writes, so a flush waiting for
+# another process's write lock never holds up a load.
+_connections: Dict[str, Database] = {}
+_connections_lock = threading.Lock()
+
+
+def _db(role: str) -> Database:
+    with _connections_lock:
+        db = _connections.get(role)
+        if db is None:
+            db = _connections[role] = connect_db()
+        return db
 
 
-def _save_memories(guild_id: str, memories: List[Dict[str, Any]]) -> None:
-    """Save memories for a guild."""
-    file_path = _get_memory_file(guild_id)
+def _encode_rows(memories: List[Dict[str, Any]], matrix) -> List[Tuple[str, str, Optional[bytes]]]:
+    """(id, data, embedding blob) rows; without NumPy the vectors come from the dicts."""
+    rows = []
+    for i, memory in enumerate(memories):
+        if matrix is not None:
+            blob = np.asarray(matrix[i], dtype=np.float32).tobytes()
+        else:
+            vector = memory.get('embedding')
+            blob = array('f', vector).tobytes() if vector else None
+        data = json_codec.dumps({k: v for k, v in memory.items() if k != 'embedding'})
+        rows.append((memory['id'], data, blob))
+    return rows
+
+
+def _decode_rows(rows: List[Tuple[str, Optional[bytes]]], embedder: Optional[str]) -> Tuple[List[Dict[str, Any]], Any]:
+    """Memories and their embedding matrix (None if missing, stale or without NumPy).
+
+    Without NumPy, current vectors are put back into the dicts instead.
+    """
+    memories = [json_codec.loads(data) for data, _ in rows]
+    blobs = [blob for _, blob in rows]
+    size = EMBEDDING_DIM * 4
+    if not memories or embedder != EMBEDDER_TAG or any(blob is None or len(blob) != size for blob in blobs):
+        return memories, None
+    if np is None:
+        for memory, blob in zip(memories, blobs):
+            vector = array('f')
+            vector.frombytes(blob)
+            memory['embedding'] = vector.tolist()
+        return memories, None
+    return memories, np.frombuffer(b"".join(blobs), dtype=np.float32).reshape(len(blobs), EMBEDDING_DIM)
+
+
+def _read_guild(guild_id: str) -> Tuple[int, Optional[str], List[Dict[str, Any]], Any]:
+    """Return (version, embedder tag, memories, embedding matrix) as stored."""
+    version, embedder, rows = _db("read").memories.load(guild_id)
+    memories, matrix = _decode_rows(rows, embedder)
+    return version, embedder, memories, matrix
+
+
+def _stored_version(guild_id: str) -> int:
+    return _db("read").memories.version(guild_id)
+
+
+def _stored_guild_ids() -> List[str]:
+    return _db("read").memories.guild_ids()
+
+
+def _merge_stored(memories: List[Dict[str, Any]], matrix, stored: List[Dict[str, Any]], stored_matrix,
+                  removed: Set[str], added: Set[str]) -> Tuple[List[Dict[str, Any]], Any]:
+    """Reconcile with a newer version written by another process.
+
+    Memories it deleted (present here, gone there, not added here) are
+    dropped; memories it added that this process has not deleted are kept.
+    """
+    stored_ids = {m.get('id') for m in stored}
+    keep = [m['id'] in stored_ids or m['id'] in added for m in memories]
+    if not all(keep):
+        memories = [m for m, kept in zip(memories, keep) if kept]
+        if matrix is not None:
+            matrix = matrix[np.array(keep, dtype=bool)]
+    known = {m['id'] for m in memories} | removed
+    extra = [i for i, m in enumerate(stored) if m.get('id') not in known]
+    if not extra:
+        return memories, matrix
+    new = [stored[i] for i in extra]
+    if np is not None:
+        if stored_matrix is not None:
+            rows = stored_matrix[extra]
+        else:
+            rows = np.array([_simple_embedding(m.get('content', '')) for m in new],
+                            dtype=np.float32).reshape(len(new), EMBEDDING_DIM)
+        matrix = rows if matrix is None else np.vstack([matrix, rows])
+    else:
+        for m in new:
+            if not m.get('embedding'):
+                m['embedding'] = _simple_embedding(m.get('content', ''))
+    return memories + new, matrix
+
+
+def _next_expiry(memories: List[Dict[str, Any]]) -> Optional[float]:
+    earliest = min((_expires_ts(m) for m in memories), default=math.inf)
+    return None if earliest == math.inf else earliest
+
+
+def _write_guild(guild_id: str, memories: List[Dict[str, Any]], matrix,
+                 base_version: int, removed: Set[str], added: Set[str]) -> Optional[Tuple[int, bool, Optional[float]]]:
+    """Write one guild in a single transaction.
+
+    Returns (new version, merged, earliest expiry) or None if the write
+    failed. merged means the stored guild had moved past base_version and
+    other memories were kept.
+    """
+    db = _db("write")
+    start = time.perf_counter()
     try:
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump({'memories': memories}, f)
-    except IOError as e:
+        with db.transaction(immediate=True) as conn:
+            waited = time.perf_counter() - start
+            version = db.memories.version(guild_id, conn)
+            merged = version != base_version
+            if merged:
+                _, embedder, rows = db.memories.load(guild_id, conn)
+                stored, stored_matrix = _decode_rows(rows, embedder)
+                memories, matrix = _merge_stored(memories, matrix, stored, stored_matrix, removed, added)
+            next_expiry = _next_expiry(memories)
+            db.memories.write(conn, guild_id, version + 1, EMBEDDER_TAG, next_expiry,
+                              _encode_rows(memories, matrix), removed)
+    except Exception as e:
         print(f"[memory_system] Error saving memories for {guild_id}: {e}")
+        return None
+    with _lock_stats_lock:
+        lock_stats["acquired"] += 1
+        if waited > CONTENDED_WAIT:
+            lock_stats["contended"] += 1
+            lock_stats["wait_seconds"] += waited
+            lock_stats["max_wait_seconds"] = max(lock_stats["max_wait_seconds"], waited)
+    return version + 1, merged, next_expiry
+
+
+class EmbeddingMatrix:
+    """Embeddings for one guild, row i belonging to memory i.
+
+    With NumPy this is a contiguous float32 matrix (grown by doubling) with
+    precomputed row norms. Without it, a list of Python lists.
+    """
+
+    def __init__(self, dim: int = EMBEDDING_DIM, rows=None):
+        self.dim = dim
+        self.count = 0
+        if np is None:
+            self._rows: List[List[float]] = [list(r) for r in rows] if rows is not None else []
+            self.count = len(self._rows)
+            self._doc_freq = [0] * dim
+            for row in self._rows:
+                self._count_features(row, 1)
+            return
+        if rows is None:
+            rows = np.zeros((0, dim), dtype=np.float32)
+        rows = np.asarray(rows, dtype=np.float32).reshape(-1, dim)
+        self.count = rows.shape[0]
+        self._matrix = np.zeros((max(16, self.count), dim), dtype=np.float32)
+        self._matrix[:self.count] = rows
+        self._norms = np.zeros(self._matrix.shape[0], dtype=np.float32)
+        self._norms[:self.count] = np.linalg.norm(rows, axis=1)
+        self._doc_freq = np.count_nonzero(rows, axis=0).astype(np.float32)
+
+    def append(self, vector: List[float]) -> None:
+        if np is None:
+            self._rows.append(list(vector))
+            self._count_features(vector, 1)
+            self.count += 1
+            return
+        if self.count == self._matrix.shape[0]:
+            grown = np.zeros((self.count * 2, self.dim), dtype=np.float32)
+            grown[:self.count] = self._matrix[:self.count]
+            self._matrix = grown
+            norms = np.zeros(self.count * 2, dtype=np.float32)
+            norms[:self.count] = self._norms[:self.count]
+            self._norms = norms
+        row = np.asarray(vector, dtype=np.float32)
+        self._matrix[self.count] = row
+        self._norms[self.count] = np.linalg.norm(row)
+        self._doc_freq += row != 0
+        self.count += 1
+
+    def replace(self, index: int, vector: List[float]) -> None:
+        """Overwrite row index with a new vector."""
+        if np is None:
+            self._count_features(self._rows[index], -1)
+            self._rows[index] = list(vector)
+            self._count_features(vector, 1)
+            return
+        row = np.asarray(vector, dtype=np.float32)
+        self._doc_freq -= self._matrix[index] != 0
+        self._doc_freq += row != 0
+        self._matrix[index] = row
+        self._norms[index] = np.linalg.norm(row)
+
+    def keep(self, mask: List[bool]) -> None:
+        """Drop the rows whose mask entry is False."""
+        if np is None:
+            for row, kept in zip(self._rows, mask):
+                if not kept:
+                    self._count_features(row, -1)
+            self._rows = [row for row, kept in zip(self._rows, mask) if kept]
+            self.count = len(self._rows)
+            return
+        keep = np.asarray(mask, dtype=bool)
+        rows = self._matrix[:self.count][keep]
+        norms = self._norms[:self.count][keep]
+        self.count = rows.shape[0]
+        self._matrix = np.zeros((max(16, self.count), self.dim), dtype=np.float32)
+        self._matrix[:self.count] = rows
+        self._norms = np.zeros(self._matrix.shape[0], dtype=np.float32)
+        self._norms[:self.count] = norms
+        self._doc_freq = np.count_nonzero(rows, axis=0).astype(np.float32)
+
+    def _count_features(self, row: List[float], delta: int) -> None:
+        for i, value in enumerate(row):
+            if value:
+                self._doc_freq[i] += delta
+
+    def weight_query(self, query: List[float]) -> List[float]:
+        """Scale each query feature by its smoothed IDF over this guild's rows."""
+        n = self.count
+        if np is None:
+            return [q * (math.log((n + 1) / (df + 1)) + 1) for q, df in zip(query, self._doc_freq)]
+        idf = np.log((n + 1) / (self._doc_freq + 1)) + 1
+        return (np.asarray(query, dtype=np.float32) * idf).tolist()
+
+    def array(self):
+        """Return a copy of the rows as an (n, dim) float32 array."""
+        return self._matrix[:self.count].copy()
+
+    def top_k(self, query: List[float], positions: List[int], k: int, threshold: float):
+        """Return [(position, similarity)] for the k most similar candidate rows.
+
+        positions restricts the search to those rows; only similarities above
+        threshold are returned, best first.
+        """
+        if not positions or k <= 0:
+            return []
+        if np is None:
+            scored = []
+            for i in positions:
+                similarity = _cosine_similarity(query, self._rows[i])
+                if similarity > threshold:
+                    scored.append((i, similarity))
+            scored.sort(key=lambda x: x[1], reverse=True)
+            return scored[:k]
+
+        q = np.asarray(query, dtype=np.float32)
+        q_norm = float(np.linalg.norm(q))
+        if q_norm == 0:
+            return []
+        idx = np.asarray(positions, dtype=np.intp)
+        norms = self._norms[idx]
+        dots = self._matrix[idx] @ q
+        with np.errstate(divide='ignore', invalid='ignore'):
+            sims = np.where(norms > 0, dots / (norms * q_norm), 0.0)
+        if k < sims.shape[0]:
+            part = np.argpartition(-sims, k - 1)[:k]
+        else:
+            part = np.arange(sims.shape[0])
+        part = part[np.argsort(-sims[part], kind='stable')]
+        return [(int(idx[j]), float(sims[j])) for j in part if sims[j] > threshold]
+
+
+class KeywordIndex:
+    """Inverted index over memory contents with BM25 scoring.
+
+    Postings map a term to {memory_id: term frequency}; documents are
+    keyed by memory id, so duplicate contents stay distinct.
+    """
+
+    def __init__(self, memories: List[Dict[str, Any]] = ()):
+        self.postings: Dict[str, Dict[str, int]] = {}
+        self.doc_len: Dict[str, int] = {}
+        self.doc_terms: Dict[str, Tuple[str, ...]] = {}
+        self.total_len = 0
+        for memory in memories:
+            self.add(memory)
+
+    @staticmethod
+    def terms(text: str) -> List[str]:
+        return [t for t in _WORD_RE.findall(text.lower()) if t not in _STOPWORDS]
+
+    def add(self, memory: Dict[str, Any]) -> None:
+        memory_id = memory['id']
+        if memory_id in self.doc_len:
+            self.remove(memory_id)
+        counts = Counter(self.terms(memory.get('content', '')))
+        for term, tf in counts.items():
+            self.postings.setdefault(term, {})[memory_id] = tf
+        length = sum(counts.values())
+        self.doc_len[memory_id] = length
+        self.doc_terms[memory_id] = tuple(counts)
+        self.total_len += length
+
+    def remove(self, memory_id: str) -> None:
+        length = self.doc_len.pop(memory_id, None)
+        if length is None:
+            return
+        self.total_len -= length
+        for term in self.doc_terms.pop(memory_id, ()):
+            docs = self.postings[term]
+            del docs[memory_id]
+            if not docs:
+                del self.postings[term]
+
+    def _expand(self, term: str) -> List[str]:
+        if term in self.postings:
+            return [term]
+        if len(term) < MIN_PREFIX_LEN:
+            return []
+        # Partial words ("serv" for "server"), as the fuzzy matcher allowed
+        return [t for t in self.postings if t.startswith(term)]
+
+    def search(self, query: str, k: int, allowed: Optional[Set[str]] = None) -> List[Tuple[str, float]]:
+        """Return up to k (memory_id, score) pairs, best first."""
+        n = len(self.doc_len)
+        if not n:
+            return []
+        avg_len = self.total_len / n or 1.0
+        # norm(doc) = base + per_token * len(doc)
+        base = BM25_K1 * (1 - BM25_B)
+        per_token = BM25_K1 * BM25_B / avg_len
+        doc_len = self.doc_len
+        scores: Dict[str, float] = {}
+        get = scores.get
+        for term in set(self.terms(query)):
+            for expanded in self._expand(term):
+                docs = self.postings[expanded]
+                weight = math.log(1 + (n - len(docs) + 0.5) / (len(docs) + 0.5)) * (BM25_K1 + 1)
+                if allowed is not None:
+                    docs = {memory_id: tf for memory_id, tf in docs.items() if memory_id in allowed}
+                for memory_id, tf in docs.items():
+                    scores[memory_id] = get(memory_id, 0.0) + weight * tf / (tf + base + per_token * doc_len[memory_id])
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+
+_MINHASH_PRIME = 4294967291  # largest prime below 2**32
+_minhash_rng = random.Random("roturbot-minhash")
+_MINHASH_A = [_minhash_rng.randrange(1, _MINHASH_PRIME) for _ in range(MINHASH_PERMUTATIONS)]
+_MINHASH_B = [_minhash_rng.randrange(0, _MINHASH_PRIME) for _ in range(MINHASH_PERMUTATIONS)]
+
+
+def _shingles(text: str) -> Set[str]:
+    normalized = " ".join(_WORD_RE.findall(text.lower()))
+    if len(normalized) <= SHINGLE_SIZE:
+        return {normalized} if normalized else set()
+    return {normalized[i:i + SHINGLE_SIZE] for i in range(len(normalized) - SHINGLE_SIZE + 1)}
+
+
+def _jaccard(a: Set[str], b: Set[str]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def _minhash(shingles: Set[str]) -> List[int]:
+    """MinHash signature: the minimum of (a*h + b) mod p per permutation."""
+    hashes = [
+        int.from_bytes(hashlib.blake2b(s.encode('utf-8'), digest_size=4).digest(), 'little') % _MINHASH_PRIME
+        for s in shingles
+    ]
+    if not hashes:
+        return [_MINHASH_PRIME] * MINHASH_PERMUTATIONS
+    if np is not None:
+        h = np.array(hashes, dtype=np.uint64)[:, None]
+        a = np.array(_MINHASH_A, dtype=np.uint64)[None, :]
+        b = np.array(_MINHASH_B, dtype=np.uint64)[None, :]
+        return ((h * a % _MINHASH_PRIME + b) % _MINHASH_PRIME).min(axis=0).tolist()
+    return [min((a * h % _MINHASH_PRIME + b) % _MINHASH_PRIME for h in hashes)
+            for a, b in zip(_MINHASH_A, _MINHASH_B)]
+
+
+class DuplicateIndex:
+    """MinHash LSH buckets over memory contents.
+
+    Two memories whose signatures agree on a whole band land in the same
+    bucket; candidates are then confirmed with the exact shingle Jaccard.
+    """
+
+    ROWS = MINHASH_PERMUTATIONS // MINHASH_BANDS
+
+    def __init__(self, memories: List[Dict[str, Any]] = ()):
+        self.buckets: Dict[Tuple[int, Tuple[int, ...]], Set[str]] = {}
+        self.keys: Dict[str, List[Tuple[int, Tuple[int, ...]]]] = {}
+        for memory in memories:
+            self.add(memory)
+
+    def _band_keys(self, shingles: Set[str]) -> List[Tuple[int, Tuple[int, ...]]]:
+        signature = _minhash(shingles)
+        rows = self.ROWS
+        return [(band, tuple(signature[band * rows:(band + 1) * rows])) for band in range(MINHASH_BANDS)]
+
+    def add(self, memory: Dict[str, Any]) -> None:
+        keys = self._band_keys(_shingles(memory.get('content', '')))
+        self.keys[memory['id']] = keys
+        for key in keys:
+            self.buckets.setdefault(key, set()).add(memory['id'])
+
+    def remove(self, memory_id: str) -> None:
+        for key in self.keys.pop(memory_id, ()):
+            ids = self.buckets.get(key)
+            if ids is not None:
+                ids.discard(memory_id)
+                if not ids:
+                    del self.buckets[key]
+
+    def find(self, content: str, by_id: Dict[str, Dict[str, Any]],
+             threshold: float = DUPLICATE_THRESHOLD) -> Optional[Tuple[Dict[str, Any], float]]:
+        """Return (memory, similarity) for the closest near-duplicate of content, if any."""
+        shingles = _shingles(content)
+        candidates = set()
+        for key in self._band_keys(shingles):
+            candidates |= self.buckets.get(key, set())
+        best = None
+        for memory_id in candidates:
+            memory = by_id.get(memory_id)
+            if memory is None:
+                continue
+            similarity = _jaccard(shingles, _shingles(memory.get('content', '')))
+            if similarity >= threshold and (best is None or similarity > best[1]):
+                best = (memory, similarity)
+        return best
+
+
+class GuildMemories:
+    """Resident memories for one guild, with an id lookup and embedding matrix."""
+
+    def __init__(self, guild_id: str, memories: List[Dict[str, Any]], matrix=None,
+                 embedder: Optional[str] = EMBEDDER_TAG):
+        self.guild_id = guild_id
+        self.memories = memories
+        self.by_id = {m['id']: m for m in memories}
+        # Stored version this copy was loaded from (or last written as), and
+        # ids added or deleted since, for merging with another process's write.
+        self.version = 0
+        self.version_checked = time.monotonic()
+        self.added: Set[str] = set()
+        self.removed: Set[str] = set()
+        # (expires_ts, id) entries; stale ones (deleted or re-dated memories)
+        # are skipped when they reach the top.
+        self.expiry_heap = [(_expires_ts(m), m['id']) for m in memories]
+        heapq.heapify(self.expiry_heap)
+        self.keywords = KeywordIndex(memories)
+        # Built on the first save, since only saves look for duplicates.
+        self._duplicates: Optional[DuplicateIndex] = None
+        # Vectors from another embedder (or the old per-process hash()) are
+        # useless for this one, so rebuild them from the content.
+        self.reembedded = embedder != EMBEDDER_TAG and bool(memories)
+        if self.reembedded:
+            matrix = None
+            for m in memories:
+                m.pop('embedding', None)
+        if matrix is None:
+            matrix = [m.get('embedding') or _simple_embedding(m.get('content', '')) for m in memories]
+        self.embeddings = EmbeddingMatrix(EMBEDDING_DIM, matrix)
+        if np is not None:
+            # The matrix is the source of truth; keep the dicts small.
+            for m in memories:
+                m.pop('embedding', None)
+        elif self.reembedded:
+            for m, row in zip(memories, matrix):
+                m['embedding'] = row
+
+    def reembed(self) -> None:
+        """Recompute every embedding with the current embedder."""
+        matrix = [_simple_embedding(m.get('content', '')) for m in self.memories]
+        self.embeddings = EmbeddingMatrix(EMBEDDING_DIM, matrix)
+        if np is None:
+            for m, row in zip(self.memories, matrix):
+                m['embedding'] = row
+
+    def add(self, memory: Dict[str, Any], embedding: List[float]) -> None:
+        self.memories.append(memory)
+        self.by_id[memory['id']] = memory
+        self.added.add(memory['id'])
+        self.embeddings.append(embedding)
+        if np is None:
+            memory['embedding'] = embedding
+        self.keywords.add(memory)
+        if self._duplicates is not None:
+            self._duplicates.add(memory)
+        self.push_expiry(memory)
+
+    def update_content(self, memory: Dict[str, Any], content: str) -> None:
+        """Replace a memory's content and re-index its keywords, embedding and signature."""
+        memory['content'] = content
+        embedding = _simple_embedding(content)
+        position = next(i for i, m in enumerate(self.memories) if m is memory)
+        self.embeddings.replace(position, embedding)
+        if np is None:
+            memory['embedding'] = embedding
+        self.keywords.remove(memory['id'])
+        self.keywords.add(memory)
+        if self._duplicates is not None:
+            self._duplicates.remove(memory['id'])
+            self._duplicates.add(memory)
+
+    @property
+    def duplicates(self) -> DuplicateIndex:
+        if self._duplicates is None:
+            self._duplicates = DuplicateIndex(self.memories)
+        return self._duplicates
+
+    def push_expiry(self, memory: Dict[str, Any]) -> None:
+        """Index a memory's (possibly new) expiry."""
+        heapq.heappush(self.expiry_heap, (_expires_ts(memory), memory['id']))
+        if len(self.expiry_heap) > 2 * len(self.memories) + 16:
+            self.expiry_heap = [(_expires_ts(m), m['id']) for m in self.memories]
+            heapq.heapify(self.expiry_heap)
+
+    def _is_current(self, entry: Tuple[float, str]) -> bool:
+        memory = self.by_id.get(entry[1])
+        return memory is not None and memory.get('expires_ts') == entry[0]
+
+    def next_expiry(self) -> Optional[float]:
+        """Earliest expiry among the guild's memories, or None if it has none."""
+        heap = self.expiry_heap
+        while heap and not self._is_current(heap[0]):
+            heapq.heappop(heap)
+        return heap[0][0] if heap else None
+
+    def pop_expired(self, now: float) -> int:
+        """Delete every memory that has expired by now. Returns how many."""
+        expired = set()
+        heap = self.expiry_heap
+        while heap and heap[0][0] <= now:
+            entry = heapq.heappop(heap)
+            if self._is_current(entry):
+                expired.add(entry[1])
+        return self.remove_ids(expired)
 
+    def remove_ids(self, memory_ids: Set[str]) -> int:
+        if not memory_ids:
+            return 0
+        before = len(self.memories)
+        mask = [m['id'] not in memory_ids for m in self.memories]
+        self.memories = [m for m, kept in zip(self.memories, mask) if kept]
+        self.embeddings.keep(mask)
+        for memory_id in memory_ids:
+            self.by_id.pop(memory_id, None)
+            self.removed.add(memory_id)
+            self.keywords.remove(memory_id)
+            if self._duplicates is not None:
+                self._duplicates.remove(memory_id)
+        return before - len(self.memories)
 
-def _calculate_importance_score(memory: Dict[str, Any]) -> float:
+
+_guilds: Dict[str, GuildMemories] = {}
+_dirty_guilds: Set[str] = set()
+_flush_task: Optional[asyncio.Task] = None
+
+flush_counters = {
+    "flushes": 0,
+    "guilds_written": 0,
+    "changes": 0,
+}
+_pending_changes = 0
+
+
+def _needs_load(guild_id: str) -> bool:
+    """True if the guild is not resident, or its clean copy is behind the store.
+
+    The stored version is looked at most every VERSION_CHECK_INTERVAL seconds.
+    """
+    guild = _guilds.get(guild_id)
+    if guild is None:
+        return True
+    if guild_id in _dirty_guilds:
+        return False
+    now = time.monotonic()
+    if now - guild.version_checked < VERSION_CHECK_INTERVAL:
+        return False
+    guild.version_checked = now
+    return _stored_version(guild_id) != guild.version
+
+
+def _install_guild(guild_id: str, loaded: Tuple[int, Optional[str], List[Dict[str, Any]], Any]) -> GuildMemories:
+    version, embedder, memories, matrix = loaded
+    if guild_id in _guilds:
+        _count_lock_event("reloads")
+    guild = _guilds[guild_id] = GuildMemories(guild_id, memories, matrix, embedder)
+    guild.version = version
+    if guild.reembedded:
+        _mark_dirty(guild_id)
+    return guild
+
+
+def _get_guild(guild_id: str) -> GuildMemories:
+    """Return a guild's resident memories, loading them on first use.
+
+    A resident guild without unsaved changes is reloaded when another
+    process has written a newer version. Reads never wait for writers
+    (the database is in WAL mode), but async callers should still await
+    load_guild() first so decoding a large guild happens off the loop.
+    """
+    if not _needs_load(guild_id):
+        return _guilds[guild_id]
+    return _install_guild(guild_id, _read_guild(guild_id))
+
+
+async def load_guild(guild_id: str) -> None:
+    """Load a guild, or reload its stale copy, in a worker thread."""
+    if not _needs_load(guild_id):
+        return
+    loaded = await asyncio.to_thread(_read_guild, guild_id)
+    guild = _guilds.get(guild_id)
+    # Something else loaded (or changed) the guild while the thread ran.
+    if guild is not None and (guild_id in _dirty_guilds or guild.version >= loaded[0]):
+        return
+    _install_guild(guild_id, loaded)
+
+
+def _mark_dirty(guild_id: str) -> None:
+    """Note an unsaved change to a guild and make sure a flush is pending."""
+    global _flush_task, _pending_changes
+    _dirty_guilds.add(guild_id)
+    _pending_changes += 1
+    if _flush_task is not None and not _flush_task.done():
+        return
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        # No event loop (scripts, shutdown): write straight away.
+        flush()
+        return
+    _flush_task = loop.create_task(_flush_later())
+
+
+def _snapshot() -> Dict[str, tuple]:
+    """Copy the dirty guilds' memories (and embeddings) so they can be written off the loop.
+
+    Each entry is (memories, matrix, base version, removed ids, added ids).
+    """
+    global _pending_changes
+    snapshot = {}
+    for gid in _dirty_guilds:
+        guild = _guilds.get(gid)
+        if guild is not None:
+            matrix = guild.embeddings.array() if np is not None else None
+            snapshot[gid] = ([dict(m) for m in guild.memories], matrix, guild.version,
+                             set(guild.removed), set(guild.added))
+    flush_counters["changes"] += _pending_changes
+    _pending_changes = 0
+    _dirty_guilds.clear()
+    return snapshot
+
+
+def _write_snapshot(snapshot: Dict[str, tuple]) -> Dict[str, Any]:
+    """Write a snapshot; returns {gid: _write_guild result}."""
+    return {gid: _write_guild(gid, *payload) for gid, payload in snapshot.items()}
+
+
+def _record_flush(snapshot: Dict[str, tuple], results: Dict[str, Any]) -> None:
+    flush_counters["flushes"] += 1
+    for gid, result in results.items():
+        guild = _guilds.get(gid)
+        if result is None:
+            _dirty_guilds.add(gid)
+            continue
+        flush_counters["guilds_written"] += 1
+        if guild is None:
+            continue
+        version, merged, _ = result
+        guild.removed -= snapshot[gid][3]
+        guild.added -= snapshot[gid][4]
+        if not merged:
+            guild.version = version
+            continue
+        # The stored guild now also holds another process's memories: reload
+        # it on next use, or if it changed again meanwhile, keep the old
+        # version so the next write merges once more.
+        _count_lock_event("merges")
+        if gid not in _dirty_guilds:
+            _guilds.pop(gid, None)
+
+
+async def _flush_later() -> None:
+    while True:
+        await asyncio.sleep(FLUSH_DELAY)
+        if not _dirty_guilds:
+            return
+        snapshot = _snapshot()
+        try:
+            results = await asyncio.to_thread(_write_snapshot, snapshot)
+        except Exception as e:
+            print(f"[memory_system] Error flushing memories: {e}")
+            _dirty_guilds.update(snapshot)
+            continue
+        _record_flush(snapshot, results)
+
+
+def flush() -> bool:
+    """Synchronously write every dirty guild. Call on shutdown.
+
+    Returns True if anything was written.
+    """
+    global _flush_task
+    if _flush_task is not None and not _flush_task.done():
+        try:
+            _flush_task.cancel()
+        except RuntimeError:
+            pass  # loop already closed
+    _flush_task = None
+    if not _dirty_guilds:
+        return False
+    snapshot = _snapshot()
+    try:
+        results = _write_snapshot(snapshot)
+    except Exception as e:
+        print(f"[memory_system] Error flushing memories: {e}")
+        _dirty_guilds.update(snapshot)
+        return False
+    _record_flush(snapshot, results)
+    return all(result is not None for result in results.values())
+
+
+def _calculate_importance_score(memory: Dict[str, Any], now: Optional[float] = None) -> float:
     """Calculate dynamic importance score based on various factors."""
     base_importance = memory.get('importance', 5)
     access_count = memory.get('access_count', 0)
@@ -56,49 +874,84 @@ def _calculate_importance_score(memory: Dict[str, Any]) -> float:
     # Boost score based on access frequency
     access_boost = min(access_count * 0.5, 3)  # Max +3 from access
     
-    # Check if expired
-    expires_at = memory.get('expires_at')
-    if expires_at:
-        expiry = datetime.fromisoformat(expires_at)
-        now = datetime.now()
-        if expiry < now:
-            return 0  # Expired memories have no score
-        # Slight boost for memories nearing expiry (urgency)
-        days_until_expiry = (expiry - now).days
-        if days_until_expiry < 2:
-            urgency_boost = 1
-        else:
-            urgency_boost = 0
-    else:
-        urgency_boost = 0
+    # Check if expired, using the epoch kept by the expiry index
+    remaining = _expires_ts(memory) - (time.time() if now is None else now)
+    if remaining < 0:
+        return 0  # Expired memories have no score
+    # Slight boost for memories nearing expiry (urgency)
+    urgency_boost = 1 if remaining < URGENCY_WINDOW else 0
     
     return base_importance + access_boost + urgency_boost
 
 
-def _simple_embedding(text: str) -> List[float]:
-    """
-    Create a simple embedding for semantic search.
-    Uses word frequency as a simple semantic representation.
+def _evict_over_cap(guild: GuildMemories, keep_id: Optional[str] = None,
+                    cap: Optional[int] = None, now: Optional[float] = None) -> int:
+    """Drop the lowest-scoring memories until the guild is within its cap."""
+    cap = MAX_MEMORIES_PER_GUILD if cap is None else cap
+    excess = len(guild.memories) - cap
+    if excess <= 0:
+        return 0
+    now = time.time() if now is None else now
+    victims = heapq.nsmallest(
+        excess,
+        (m for m in guild.memories if m['id'] != keep_id),
+        key=lambda m: (_calculate_importance_score(m, now), m.get('created_at') or ''),
+    )
+    return guild.remove_ids({m['id'] for m in victims})
+
+
+_WORD_RE = re.compile(r"[^\W_]+")
+_STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have he her his i in is it its "
+    "me my of on or our she so that the their them they this to was we were "
+    "what when which who will with you your".split()
+)
+
+
+class HashingEmbedder:
+    """Signed feature-hashing embedder.
+
+    Tokens are bucketed with a keyed BLAKE2b hash, so a given seed produces
+    the same vectors in every process (unlike the built-in hash(), which is
+    randomized per run). Term counts are dampened with 1 + log(tf) and the
+    result is L2-normalized.
     """
-    # Simple bag-of-words embedding
-    words = text.lower().split()
-    # Create a simple vector based on word presence
-    # This is a very basic approach - in production you'd use sentence-transformers
-    embedding = {}
-    for word in words:
-        # Simple hash to get a consistent dimension
-        dim = hash(word) % 100
-        embedding[dim] = embedding.get(dim, 0) + 1
-    
-    # Convert to fixed-size vector
-    vector = [embedding.get(i, 0) for i in range(100)]
-    
-    # Normalize
-    magnitude = sum(x**2 for x in vector) ** 0.5
-    if magnitude > 0:
-        vector = [x / magnitude for x in vector]
-    
-    return vector
+
+    def __init__(self, dim: int = EMBEDDING_DIM, seed: str = EMBEDDING_SEED):
+        self.dim = dim
+        self._key = hashlib.blake2b(seed.encode('utf-8'), digest_size=16).digest()
+        self._features: Dict[str, Tuple[int, float]] = {}
+
+    def tokenize(self, text: str) -> List[str]:
+        return [t for t in _WORD_RE.findall(text.lower()) if t not in _STOPWORDS]
+
+    def _feature(self, token: str) -> Tuple[int, float]:
+        feature = self._features.get(token)
+        if feature is None:
+            digest = hashlib.blake2b(token.encode('utf-8'), digest_size=8, key=self._key).digest()
+            h = int.from_bytes(digest, 'little')
+            feature = (h % self.dim, 1.0 if h >> 63 else -1.0)
+            if len(self._features) < 200_000:
+                self._features[token] = feature
+        return feature
+
+    def embed(self, text: str) -> List[float]:
+        vector = [0.0] * self.dim
+        for token, tf in Counter(self.tokenize(text)).items():
+            bucket, sign = self._feature(token)
+            vector[bucket] += sign * (1.0 + math.log(tf))
+        magnitude = sum(x * x for x in vector) ** 0.5
+        if magnitude > 0:
+            vector = [x / magnitude for x in vector]
+        return vector
+
+
+_embedder = HashingEmbedder()
+
+
+def _simple_embedding(text: str) -> List[float]:
+    """Create the embedding used for semantic search."""
+    return _embedder.embed(text)
 
 
 def _cosine_similarity(vec1: List[float], vec2: List[float]) -> float:
@@ -113,9 +966,27 @@ def _cosine_similarity(vec1: List[float], vec2: List[float]) -> float:
     return dot_product / (magnitude1 * magnitude2)
 
 
+def _expiry_candidates(guild_id: Optional[str], now: float, index: Dict[str, Optional[float]]) -> List[str]:
+    """Guilds cleanup_expired() has to look at, given {guild_id: earliest expiry or None}."""
+    if guild_id:
+        return [guild_id]
+    # Resident guilds check their heap; stored ones are loaded only when
+    # their earliest expiry is due (None: nothing in them expires).
+    guild_ids = set(_guilds)
+    for gid, next_expiry in index.items():
+        if gid not in _guilds and next_expiry is not None and next_expiry <= now:
+            guild_ids.add(gid)
+    return sorted(guild_ids)
+
+
 class MemorySystem:
     """Main memory system class."""
     
+    @staticmethod
+    async def load_guild(guild_id: str) -> None:
+        """Make sure a guild is loaded and current without blocking the event loop."""
+        await load_guild(guild_id)
+    
     @staticmethod
     def save_memory(
         guild_id: str,
@@ -136,26 +1007,50 @@ class MemorySystem:
             ttl_days: How many days to keep this memory
             source_message_id: Original Discord message ID
         
+        If the content nearly duplicates an existing memory, that memory
+        is updated instead: it takes the new content (a correction usually
+        differs only in a detail), its importance goes up by one (or to the
+        new importance, if higher), its TTL is extended and the tags are
+        merged.
+        
         Returns:
-            The created memory object
+            The created memory object, or the existing one it was merged into
         """
-        memories = _load_memories(guild_id)
+        guild = _get_guild(guild_id)
+        now = time.time()
+        if guild.pop_expired(now):
+            _mark_dirty(guild_id)
+        importance = max(1, min(10, importance))
+        
+        duplicate = guild.duplicates.find(content, guild.by_id)
+        if duplicate is not None:
+            memory = duplicate[0]
+            if memory.get('content') != content:
+                guild.update_content(memory, content)
+            memory['importance'] = min(10, max(memory.get('importance', 5) + 1, importance))
+            memory['tags'] = list(dict.fromkeys((memory.get('tags') or []) + (tags or [])))
+            memory['merge_count'] = memory.get('merge_count', 0) + 1
+            if now + ttl_days * 86400 > _expires_ts(memory):
+                _set_expiry(memory, ttl_days, now)
+                guild.push_expiry(memory)
+            _mark_dirty(guild_id)
+            return memory
         
         memory = {
             'id': str(uuid.uuid4()),
             'content': content,
             'tags': tags or [],
-            'importance': max(1, min(10, importance)),
+            'importance': importance,
             'created_at': datetime.now().isoformat(),
-            'expires_at': (datetime.now() + timedelta(days=ttl_days)).isoformat(),
             'access_count': 0,
             'last_accessed': None,
-            'embedding': _simple_embedding(content),
             'source_message_id': source_message_id
         }
+        _set_expiry(memory, ttl_days, now)
         
-        memories.append(memory)
-        _save_memories(guild_id, memories)
+        guild.add(memory, _simple_embedding(content))
+        _evict_over_cap(guild, keep_id=memory['id'], now=now)
+        _mark_dirty(guild_id)
         
         return memory
     
@@ -171,8 +1066,9 @@ class MemorySystem:
         """
         Search for relevant memories.
         
-        First tries fuzzy search. If no good results and use_semantic=True,
-        falls back to semantic search.
+        First tries keyword search (BM25 candidates re-ranked by fuzzy
+        matching). If no good results and use_semantic=True, falls back to
+        semantic search.
         
         Args:
             guild_id: Discord server ID
@@ -185,67 +1081,71 @@ class MemorySystem:
         Returns:
             List of matching memories sorted by relevance
         """
-        memories = _load_memories(guild_id)
-        
-        # Filter out expired memories
-        now = datetime.now()
-        active_memories = [
-            m for m in memories 
-            if datetime.fromisoformat(m['expires_at']) > now
-        ]
+        guild = _get_guild(guild_id)
         
-        # Filter by tags if specified
-        if tags_filter:
-            active_memories = [
-                m for m in active_memories
-                if any(tag in m['tags'] for tag in tags_filter)
-            ]
+        # Expire lazily: only memories at the top of the expiry heap are looked at
+        if guild.pop_expired(time.time()):
+            _mark_dirty(guild_id)
         
-        # Filter by minimum importance
-        active_memories = [
-            m for m in active_memories
-            if m['importance'] >= min_importance
+        # Positions of memories that pass the tag and importance filters
+        positions = [
+            i for i, m in enumerate(guild.memories)
+            if (not tags_filter or any(tag in m['tags'] for tag in tags_filter))
+            and m['importance'] >= min_importance
         ]
+        active_memories = [guild.memories[i] for i in positions]
         
         if not active_memories:
             return []
         
-        # Try fuzzy search first
+        # Try keyword search first: BM25 picks the candidates, fuzzy matching ranks them
         results = []
         
-        # Use rapidfuzz for fast fuzzy matching
-        memory_contents = [m['content'] for m in active_memories]
-        if not process or not memory_contents:
+        if len(active_memories) <= KEYWORD_CANDIDATES:
+            candidates = active_memories
+        else:
+            allowed = None
+            if len(active_memories) < len(guild.memories):
+                allowed = {m['id'] for m in active_memories}
+            candidates = [
+                guild.by_id[memory_id]
+                for memory_id, _ in guild.keywords.search(query, KEYWORD_CANDIDATES, allowed)
+            ]
+        
+        if not process:
             return []
-    
-        matches = process.extract(
-            query, 
-            memory_contents, 
-            scorer=fuzz.partial_ratio,
-            limit=limit * 2
-        )
-        
-        for match, score, _ in matches:
-            if score >= 60:  # Minimum fuzzy match threshold
-                memory = next((m for m in active_memories if m['content'] == match), None)
-                if memory:
-                    results.append((memory, score / 100))
+        
+        if candidates:
+            matches = process.extract(
+                query,
+                [m['content'] for m in candidates],
+                scorer=fuzz.partial_ratio,
+                limit=limit * 2
+            )
+            
+            for _, score, index in matches:
+                if score >= 60:  # Minimum fuzzy match threshold
+                    results.append((candidates[index], score / 100))
         
         # If fuzzy search didn't find enough results, try semantic search
         if len(results) < 3 and use_semantic:
             query_embedding = _simple_embedding(query)
+            if USE_TFIDF:
+                query_embedding = guild.embeddings.weight_query(query_embedding)
+            existing_ids = {r[0]['id'] for r in results}
             
-            semantic_results = []
-            for memory in active_memories:
-                memory_embedding = memory.get('embedding', [])
-                if memory_embedding:
-                    similarity = _cosine_similarity(query_embedding, memory_embedding)
-                    if similarity > 0.3:  # Minimum semantic similarity threshold
-                        semantic_results.append((memory, similarity))
+            # Only the best `limit` semantic hits can make the final cut, plus
+            # room for ones that duplicate a fuzzy hit.
+            semantic_results = guild.embeddings.top_k(
+                query_embedding,
+                positions,
+                limit + len(existing_ids),
+                0.3,  # Minimum semantic similarity threshold
+            )
             
             # Combine results, avoiding duplicates
-            existing_ids = {r[0]['id'] for r in results}
-            for memory, score in semantic_results:
+            for i, score in semantic_results:
+                memory = guild.memories[i]
                 if memory['id'] not in existing_ids:
                     results.append((memory, score))
         
@@ -253,19 +1153,13 @@ class MemorySystem:
         results.sort(key=lambda x: x[1], reverse=True)
         top_results = results[:limit]
         
-        # Update access statistics
-        memories_to_update = []
-        for memory, _ in top_results:
-            memory['access_count'] = memory.get('access_count', 0) + 1
-            memory['last_accessed'] = datetime.now().isoformat()
-            memories_to_update.append(memory)
-        
-        if memories_to_update:
-            # Update the memories in the full list
-            memory_dict = {m['id']: m for m in memories}
-            for memory in memories_to_update:
-                memory_dict[memory['id']] = memory
-            _save_memories(guild_id, list(memory_dict.values()))
+        # Update access statistics in memory; the next flush persists them
+        if top_results:
+            accessed_at = datetime.now().isoformat()
+            for memory, _ in top_results:
+                memory['access_count'] = memory.get('access_count', 0) + 1
+                memory['last_accessed'] = accessed_at
+            _mark_dirty(guild_id)
         
         # Return just the memory objects
         return [r[0] for r in top_results]
@@ -291,31 +1185,27 @@ class MemorySystem:
         Returns:
             Updated memory or None if not found
         """
-        memories = _load_memories(guild_id)
-        
-        memory = None
-        for m in memories:
-            if m['id'] == memory_id:
-                memory = m
-                break
+        guild = _get_guild(guild_id)
+        memory = guild.by_id.get(memory_id)
         
         if not memory:
             return None
         
         if action == 'delete':
-            memories = [m for m in memories if m['id'] != memory_id]
-            _save_memories(guild_id, memories)
+            guild.remove_ids({memory_id})
+            _mark_dirty(guild_id)
             return None
         
         elif action == 'extend':
             if new_ttl_days:
-                memory['expires_at'] = (datetime.now() + timedelta(days=new_ttl_days)).isoformat()
+                _set_expiry(memory, new_ttl_days)
+                guild.push_expiry(memory)
         
         elif action == 'increase_importance':
             if importance_boost:
                 memory['importance'] = min(10, memory.get('importance', 5) + importance_boost)
         
-        _save_memories(guild_id, memories)
+        _mark_dirty(guild_id)
         return memory
     
     @staticmethod
@@ -329,47 +1219,35 @@ class MemorySystem:
         Returns:
             Number of memories deleted
         """
-        now = datetime.now()
+        now = time.time()
         deleted_count = 0
+        index = _db("read").memories.expiry_index()
         
-        if guild_id:
-            guild_ids = [guild_id]
-        else:
-            # Get all guild memory files
-            if os.path.exists(MEMORIES_DIR):
-                guild_ids = [
-                    f.replace('.json', '') 
-                    for f in os.listdir(MEMORIES_DIR) 
-                    if f.endswith('.json')
-                ]
-            else:
-                guild_ids = []
-        
-        for gid in guild_ids:
-            memories = _load_memories(gid)
-            original_count = len(memories)
-            
-            # Keep only non-expired memories
-            active_memories = [
-                m for m in memories 
-                if datetime.fromisoformat(m['expires_at']) > now
-            ]
-            
-            deleted = original_count - len(active_memories)
+        for gid in _expiry_candidates(guild_id, now, index):
+            guild = _get_guild(gid)
+            deleted = guild.pop_expired(now)
             if deleted > 0:
-                _save_memories(gid, active_memories)
+                _mark_dirty(gid)
                 deleted_count += deleted
         
         return deleted_count
     
+    @staticmethod
+    async def cleanup_expired_async(guild_id: Optional[str] = None) -> int:
+        """cleanup_expired() with the guilds it visits loaded off the event loop."""
+        index = await asyncio.to_thread(lambda: _db("read").memories.expiry_index())
+        for gid in _expiry_candidates(guild_id, time.time(), index):
+            await load_guild(gid)
+        return MemorySystem.cleanup_expired(guild_id)
+    
     @staticmethod
     def get_stats(guild_id: str) -> Dict[str, Any]:
         """Get memory statistics for a guild."""
-        memories = _load_memories(guild_id)
-        now = datetime.now()
+        memories = _get_guild(guild_id).memories
+        now = time.time()
         
         total = len(memories)
-        expired = sum(1 for m in memories if datetime.fromisoformat(m['expires_at']) <= now)
+        expired = sum(1 for m in memories if _expires_ts(m) <= now)
         active = total - expired
         
         # Calculate average importance
@@ -390,5 +1268,142 @@ class MemorySystem:
         }
 
 
+def migrate_embeddings(guild_id: Optional[str] = None, force: bool = False) -> int:
+    """Re-embed stored memories with the current embedder and write them out.
+
+    Guilds saved by an older embedder are re-embedded automatically when
+    loaded; force=True re-embeds guilds that are already current too.
+    Returns the number of memories re-embedded.
+    """
+    count = 0
+    for gid in [guild_id] if guild_id else _stored_guild_ids():
+        guild = _get_guild(gid)
+        if force and not guild.reembedded:
+            guild.reembed()
+            _mark_dirty(gid)
+        elif not guild.reembedded:
+            continue
+        count += len(guild.memories)
+    flush()
+    return count
+
+
+def _legacy_embedding(text: str, salt: int) -> List[float]:
+    """The old hash()-based embedding; salt stands in for the per-process hash seed."""
+    embedding: Dict[int, int] = {}
+    for word in text.lower().split():
+        dim = hash((salt, word)) % 100
+        embedding[dim] = embedding.get(dim, 0) + 1
+    vector = [embedding.get(i, 0) for i in range(100)]
+    magnitude = sum(x ** 2 for x in vector) ** 0.5
+    return [x / magnitude for x in vector] if magnitude > 0 else vector
+
+
+def benchmark_recall(memories: int = 2000, queries: int = 500, k: int = 5) -> Dict[str, float]:
+    """Recall@k of semantic search on a synthetic corpus, old embedder vs new.
+
+    Each query is a few words of one target memory plus common filler
+    words; a hit means the target is among the top k results.
+    "legacy_restart" embeds memories and queries under different hash
+    seeds, which is what happened to saved memories after every restart.
+    """
+    rng = random.Random(7)
+    syllables = ["ka", "lo", "mi", "ru", "te", "sa", "no", "vi", "da", "pe", "zu", "ho"]
+    vocab = sorted({"".join(rng.choice(syllables) for _ in range(rng.randint(2, 4))) for _ in range(4000)})
+    # Zipf-like weights so some words are common across many memories
+    weights = [1 / (rank + 1) for rank in range(len(vocab))]
+    docs = [" ".join(rng.choices(vocab, weights, k=12)) for _ in range(memories)]
+    common = vocab[:20]
+    tests = []
+    for _ in range(queries):
+        target = rng.randrange(memories)
+        words = rng.sample(docs[target].split(), 4) + rng.sample(common, 2)
+        rng.shuffle(words)
+        tests.append((target, " ".join(words)))
+
+    def recall(doc_embed, query_embed, dim, tfidf=False):
+        matrix = EmbeddingMatrix(dim, [doc_embed(d) for d in docs])
+        positions = list(range(memories))
+        hits = 0
+        for target, query in tests:
+            q = query_embed(query)
+            if tfidf:
+                q = matrix.weight_query(q)
+            if target in {i for i, _ in matrix.top_k(q, positions, k, -1.0)}:
+                hits += 1
+        return round(hits / len(tests), 3)
+
+    embedder = HashingEmbedder(EMBEDDING_DIM, EMBEDDING_SEED)
+    return {
+        "memories": memories,
+        "queries": queries,
+        "legacy_same_process": recall(lambda t: _legacy_embedding(t, 0), lambda t: _legacy_embedding(t, 0), 100),
+        "legacy_restart": recall(lambda t: _legacy_embedding(t, 0), lambda t: _legacy_embedding(t, 1), 100),
+        "hashed": recall(embedder.embed, embedder.embed, EMBEDDING_DIM),
+        "hashed_tfidf": recall(embedder.embed, embedder.embed, EMBEDDING_DIM, tfidf=True),
+    }
+
+
+def _keyword_corpus(memories: int, rng: random.Random) -> List[Dict[str, Any]]:
+    syllables = ["ka", "lo", "mi", "ru", "te", "sa", "no", "vi", "da", "pe", "zu", "ho"]
+    vocab = sorted({"".join(rng.choice(syllables) for _ in range(rng.randint(2, 4))) for _ in range(8000)})
+    weights = [1 / (rank + 1) for rank in range(len(vocab))]
+    return [
+        {'id': str(i), 'content': " ".join(rng.choices(vocab, weights, k=rng.randint(6, 18)))}
+        for i in range(memories)
+    ]
+
+
+def benchmark_keyword_search(sizes=(10_000, 100_000), queries: int = 200, limit: int = 5) -> List[Dict[str, float]]:
+    """Per-query latency of keyword search: full fuzzy scan vs BM25 candidates.
+
+    The full scan is timed on a tenth of the queries since it is linear in
+    the guild size. Queries are a few words taken from one memory.
+    """
+    results = []
+    for size in sizes:
+        rng = random.Random(size)
+        memories = _keyword_corpus(size, rng)
+        contents = [m['content'] for m in memories]
+        tests = [" ".join(rng.sample(m['content'].split(), 3)) for m in rng.sample(memories, queries)]
+
+        start = time.perf_counter()
+        index = KeywordIndex(memories)
+        build_ms = (time.perf_counter() - start) * 1000
+
+        scan = tests[:max(1, queries // 10)]
+        start = time.perf_counter()
+        for query in scan:
+            matches = process.extract(query, contents, scorer=fuzz.partial_ratio, limit=limit * 2)
+            for match, score, _ in matches:
+                next(m for m in memories if m['content'] == match)
+        scan_ms = (time.perf_counter() - start) / len(scan) * 1000
+
+        by_id = {m['id']: m for m in memories}
+        start = time.perf_counter()
+        for query in tests:
+            candidates = [by_id[memory_id] for memory_id, _ in index.search(query, KEYWORD_CANDIDATES)]
+            process.extract(query, [m['content'] for m in candidates], scorer=fuzz.partial_ratio, limit=limit * 2)
+        bm25_ms = (time.perf_counter() - start) / len(tests) * 1000
+
+        results.append({
+            "memories": size,
+            "index_build_ms": round(build_ms, 1),
+            "full_scan_ms_per_query": round(scan_ms, 2),
+            "bm25_ms_per_query": round(bm25_ms, 3),
+        })
+    return results
+
+
 # Global instance for easy access
 memory_system = MemorySystem()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "migrate-embeddings":
+        print(f"Re-embedded {migrate_embeddings(force='--force' in sys.argv)} memories")
+    elif len(sys.argv) > 1 and sys.argv[1] == "benchmark-keywords":
+        for row in benchmark_keyword_search():
+            print(row)
+    else:
+        print(benchmark_recall())
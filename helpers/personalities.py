@@ -0,0 +1,95 @@
+"""
+Personality registry for roturbot
+Parses personalities/*.md once and keeps the prompts and their metadata
+(such as GIF_PREFIX) in memory. The directory is re-checked at most every
+CHECK_INTERVAL seconds and only files whose mtime changed are re-read.
+"""
+
+import os
+import time
+import threading
+from typing import Dict, Optional
+
+# Seconds between checks of the personalities directory for changes.
+CHECK_INTERVAL = 5.0
+
+
+class Personality:
+    """A parsed personality file."""
+
+    __slots__ = ("name", "prompt", "gif_prefix", "mtime")
+
+    def __init__(self, name: str, prompt: str, mtime: float):
+        self.name = name
+        self.prompt = prompt
+        self.mtime = mtime
+        self.gif_prefix = ""
+        for line in prompt.split('\n'):
+            if line.startswith('GIF_PREFIX:'):
+                self.gif_prefix = line.split(':', 1)[1].strip()
+                break
+
+
+class PersonalityRegistry:
+    def __init__(self, directory: str, check_interval: float = CHECK_INTERVAL):
+        self.directory = directory
+        self.check_interval = check_interval
+        self._personalities: Dict[str, Personality] = {}
+        self._prompts: Dict[str, str] = {}
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+
+    def _scan(self) -> None:
+        """Re-read added or modified files and drop removed ones."""
+        try:
+            filenames = [f for f in os.listdir(self.directory) if f.endswith(".md")]
+        except FileNotFoundError:
+            filenames = []
+
+        updated: Dict[str, Personality] = {}
+        for filename in filenames:
+            name = filename[:-3]
+            filepath = os.path.join(self.directory, filename)
+            try:
+                mtime = os.stat(filepath).st_mtime
+            except OSError:
+                continue
+            cached = self._personalities.get(name)
+            if cached is not None and cached.mtime == mtime:
+                updated[name] = cached
+                continue
+            try:
+                with open(filepath, "r", encoding="utf-8") as f:
+                    updated[name] = Personality(name, f.read(), mtime)
+            except Exception as e:
+                print(f"Error loading personality {name}: {e}")
+
+        self._personalities = updated
+        self._prompts = {name: p.prompt for name, p in updated.items()}
+
+    def _refresh(self) -> None:
+        now = time.monotonic()
+        if now < self._next_check:
+            return
+        with self._lock:
+            if now >= self._next_check:
+                self._scan()
+                self._next_check = now + self.check_interval
+
+    def invalidate(self) -> None:
+        """Force a rescan on the next lookup."""
+        self._next_check = 0.0
+
+    def prompts(self) -> Dict[str, str]:
+        """Return {name: prompt} for every personality. Do not mutate the result."""
+        self._refresh()
+        return self._prompts
+
+    def get(self, name: str) -> Optional[Personality]:
+        self._refresh()
+        return self._personalities.get(name)
+
+    def __contains__(self, name: str) -> bool:
+        self._refresh()
+        return name in self._personalities
+
@@ -0,0 +1,101 @@
+"""
+User preferences for roturbot
+Keeps per-user opt-ins, opt-outs, exclusions and personality choices in
+memory as sets and dicts. Lookups never touch the disk; each change is
+written to the database as a single-row delta.
+"""
+
+import threading
+from typing import Dict, Iterable, Optional, Set
+
+try:
+    from .storage import (
+        get_db,
+        FLAG_DAILY_CREDIT_DM,
+        FLAG_ACTIVITY_EXCLUDED,
+        FLAG_LEVELUP_OPTOUT,
+    )
+except ImportError:  # imported by a helper run as a script
+    from storage import (
+        get_db,
+        FLAG_DAILY_CREDIT_DM,
+        FLAG_ACTIVITY_EXCLUDED,
+        FLAG_LEVELUP_OPTOUT,
+    )
+
+
+class UserPreferences:
+    FLAGS = (FLAG_DAILY_CREDIT_DM, FLAG_ACTIVITY_EXCLUDED, FLAG_LEVELUP_OPTOUT)
+
+    def __init__(self):
+        self._flags: Optional[Dict[str, Set[str]]] = None
+        self._personalities: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def _load(self) -> Dict[str, Set[str]]:
+        if self._flags is None:
+            with self._lock:
+                if self._flags is None:
+                    db = get_db()
+                    flags = {}
+                    try:
+                        for flag in self.FLAGS:
+                            flags[flag] = db.flags.members(flag)
+                        self._personalities = db.personalities.load_all()
+                    except Exception as e:
+                        print(f"Error loading user preferences: {e}")
+                        flags = {flag: flags.get(flag, set()) for flag in self.FLAGS}
+                    self._flags = flags
+        return self._flags
+
+    def has(self, flag: str, user_id) -> bool:
+        return str(user_id) in self._load()[flag]
+
+    def set(self, flag: str, user_id, enabled: bool) -> None:
+        uid = str(user_id)
+        members = self._load()[flag]
+        if (uid in members) == enabled:
+            return
+        if enabled:
+            members.add(uid)
+        else:
+            members.discard(uid)
+        try:
+            get_db().flags.set(flag, uid, enabled)
+        except Exception as e:
+            print(f"Error saving user preference {flag}: {e}")
+
+    def toggle(self, flag: str, user_id) -> bool:
+        """Flip a flag for a user and return its new value."""
+        enabled = not self.has(flag, user_id)
+        self.set(flag, user_id, enabled)
+        return enabled
+
+    def members(self, flag: str) -> Set[str]:
+        """Return a copy of every user id with the flag set."""
+        return set(self._load()[flag])
+
+    def filter(self, flag: str, user_ids: Iterable, enabled: bool = True) -> Set[str]:
+        """Return the ids from user_ids whose flag equals enabled."""
+        members = self._load()[flag]
+        ids = {str(uid) for uid in user_ids}
+        return ids & members if enabled else ids - members
+
+    def get_personality(self, user_id) -> Optional[str]:
+        self._load()
+        return self._personalities.get(str(user_id))
+
+    def set_personality(self, user_id, personality: str) -> None:
+        self._load()
+        uid = str(user_id)
+        if self._personalities.get(uid) == personality:
+            return
+        self._personalities[uid] = personality
+        try:
+            get_db().personalities.set(uid, personality)
+        except Exception as e:
+            print(f"Error saving personality preference: {e}")
+
+
+# Global instance for easy access
+user_preferences = UserPreferences()
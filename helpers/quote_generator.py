@@ -1,10 +1,11 @@
 import io
-import aiohttp
 from PIL import Image, ImageDraw, ImageFont, ImageFilter
 from pilmoji import Pilmoji
 import textwrap
 from datetime import datetime
 
+from .http_clients import http_clients
+
 class QuoteGenerator:
     def __init__(self):
         self.width = 600
@@ -21,11 +22,10 @@ class QuoteGenerator:
     async def download_avatar(self, avatar_url):
         """Download avatar image from URL"""
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(avatar_url) as response:
-                    if response.status == 200:
-                        avatar_data = await response.read()
-                        return Image.open(io.BytesIO(avatar_data))
+            async with http_clients.session("discord_cdn").get(avatar_url) as response:
+                if response.status == 200:
+                    avatar_data = await response.read()
+                    return Image.open(io.BytesIO(avatar_data))
         except Exception as e:
             print(f"Error downloading avatar: {e}")
         return None
@@ -1,32 +1,293 @@
-import os
-import json
-from typing import Dict, Any
+import asyncio
+from bisect import bisect_left, insort
+from concurrent.futures import CancelledError, Future, ThreadPoolExecutor
+from typing import Dict, Any, Optional, List, Set, Tuple
 
+from .storage import get_db
 
-_BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-_STORE_DIR = os.path.join(_BASE_DIR, "store")
-_REACTION_FILE = os.path.join(_STORE_DIR, "reaction_stats.json")
 
+# Seconds to wait after the first unsaved change before writing to the
+# database. Every reaction event that arrives inside this window is
+# coalesced into a single transaction covering only the changed messages.
+FLUSH_DELAY = 5.0
 
-def _ensure_store_dir():
-    os.makedirs(_STORE_DIR, exist_ok=True)
+# Leaderboards kept up to date as reactions change: name -> (emoji, opposing emoji).
+# The score of a message is count(emoji) - count(opposing emoji).
+SCORE_INDEXES: Dict[str, Tuple[str, Optional[str]]] = {
+    "true": ("✅", "❌"),
+    "false": ("❌", "✅"),
+    "fire": ("🔥", None),
+}
+
+_stats: Optional[Dict[str, Any]] = None
+_indexes: Optional[Dict[str, "ScoreIndex"]] = None
+_pending_events = 0
+_dirty_links: Set[str] = set()
+_replace_all = False
+_flush_task: Optional[asyncio.Task] = None
+# Background writes run on one thread, in snapshot order. The write still
+# running (future, entries, replace, coalesced) is kept so flush() can wait
+# for it: cancelling _flush_task does not stop its thread.
+_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="reaction-stats")
+_write_in_flight: Optional[Tuple[Future, Dict[str, Dict[str, Any]], bool, int]] = None
+
+flush_counters = {
+    "flushes": 0,
+    "events": 0,
+    "last_coalesced": 0,
+    "max_coalesced": 0,
+}
+
+
+def _read_rows() -> Dict[str, Any]:
+    try:
+        return get_db().reactions.load_all()
+    except Exception as e:
+        print(f"Error loading reaction stats: {e}")
+        return {}
+
+def _write_rows(entries: Dict[str, Dict[str, Any]], replace: bool) -> None:
+    repo = get_db().reactions
+    if replace:
+        repo.replace_all(entries)
+    else:
+        repo.upsert_many(entries)
+
+def _count(entry: Dict[str, Any], emoji: Optional[str]) -> int:
+    if emoji is None:
+        return 0
+    try:
+        return int(entry.get(emoji, 0) or 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+class ScoreIndex:
+    """Ordered index of messages by net reaction score.
+
+    Only messages with a positive score are kept. The order list holds
+    (-score, link) pairs so the best messages are always at the front and
+    a top-k read is a slice.
+    """
+
+    def __init__(self, emoji: str, opposing: Optional[str] = None):
+        self.emoji = emoji
+        self.opposing = opposing
+        self._scores: Dict[str, int] = {}
+        self._order: List[Tuple[int, str]] = []
+
+    def score_of(self, entry: Dict[str, Any]) -> int:
+        return _count(entry, self.emoji) - _count(entry, self.opposing)
+
+    def tracks(self, emoji: str) -> bool:
+        return emoji == self.emoji or emoji == self.opposing
+
+    def update(self, link: str, entry: Dict[str, Any]) -> None:
+        score = self.score_of(entry)
+        old = self._scores.get(link)
+        if old == score or (old is None and score <= 0):
+            return
+        if old is not None:
+            i = bisect_left(self._order, (-old, link))
+            if i < len(self._order) and self._order[i] == (-old, link):
+                del self._order[i]
+            del self._scores[link]
+        if score > 0:
+            self._scores[link] = score
+            insort(self._order, (-score, link))
+
+    def top(self, limit: int = 10, offset: int = 0) -> List[Tuple[str, int]]:
+        return [(link, -neg) for neg, link in self._order[offset:offset + limit]]
+
+    def __len__(self) -> int:
+        return len(self._order)
+
+
+def _get_indexes() -> Dict[str, ScoreIndex]:
+    global _indexes
+    if _indexes is None:
+        _indexes = {name: ScoreIndex(emoji, opposing) for name, (emoji, opposing) in SCORE_INDEXES.items()}
+        for link, entry in load_reaction_stats().items():
+            if isinstance(entry, dict):
+                for index in _indexes.values():
+                    index.update(link, entry)
+    return _indexes
+
+def top_messages(index_name: str, limit: int = 10, offset: int = 0) -> List[Tuple[str, int, Dict[str, Any]]]:
+    """Return (link, score, entry) for the highest scoring messages of an index.
+
+    index_name is a key of SCORE_INDEXES. Only messages with a positive score
+    are returned.
+    """
+    stats = load_reaction_stats()
+    index = _get_indexes()[index_name]
+    return [(link, score, stats.get(link, {})) for link, score in index.top(limit, offset)]
 
 def load_reaction_stats() -> Dict[str, Any]:
-    """Load reaction stats from the store directory.
+    """Return the resident reaction stats, loading them from the database on first use.
 
     Returns an object mapping message links to {"tick": int, "x": int}.
-    If the file is missing or malformed, returns an empty dict.
+    If the rows cannot be read, starts from an empty dict.
+    The returned dict is the live store; prefer record_reaction() for changes
+    so the score indexes stay current.
     """
-    _ensure_store_dir()
-    path = _REACTION_FILE
-    try:
-        with open(path, "r") as f:
-            return json.load(f) or {}
-    except (FileNotFoundError, json.JSONDecodeError):
-        return {}
+    global _stats
+    if _stats is None:
+        _stats = _read_rows()
+    return _stats
 
 def save_reaction_stats(stats: Dict[str, Any]) -> None:
-    """Persist reaction stats to the canonical reaction_stats.json file."""
-    _ensure_store_dir()
-    with open(_REACTION_FILE, "w") as f:
-        json.dump(stats, f)
+    """Replace the resident reaction stats and schedule a write."""
+    global _stats, _indexes, _replace_all
+    _stats = stats
+    _indexes = None
+    _replace_all = True
+    mark_dirty()
+
+def record_reaction(message_link: str, emoji: str, count: int,
+                    author: Optional[str] = None, content: Optional[str] = None,
+                    create: bool = True) -> Optional[Dict[str, Any]]:
+    """Update the reaction count for a message in memory.
+
+    If the message has no entry yet it is only created when create is True.
+    Returns the updated entry, or None if nothing was changed.
+    """
+    stats = load_reaction_stats()
+    entry = stats.get(message_link)
+    if entry is None:
+        if not create:
+            return None
+        entry = stats[message_link] = {}
+    entry[emoji] = count
+    if _indexes is not None:
+        for index in _indexes.values():
+            if index.tracks(emoji):
+                index.update(message_link, entry)
+    if author is not None:
+        entry["author"] = author
+    if content is not None:
+        entry["content"] = content
+    mark_dirty(message_link)
+    return entry
+
+def mark_dirty(message_link: Optional[str] = None) -> None:
+    """Note one unsaved change and make sure a debounced flush is pending.
+
+    Pass the link of the changed message; without one, every message is
+    rewritten on the next flush.
+    """
+    global _pending_events, _flush_task, _replace_all
+    _pending_events += 1
+    if message_link is None:
+        _replace_all = True
+    else:
+        _dirty_links.add(message_link)
+    if _flush_task is not None and not _flush_task.done():
+        return
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        # No event loop (scripts, shutdown): write straight away.
+        flush()
+        return
+    _flush_task = loop.create_task(_flush_later())
+
+async def _flush_later() -> None:
+    # Keeps going while events land during a write, so nothing is left behind.
+    global _write_in_flight
+    while True:
+        await asyncio.sleep(FLUSH_DELAY)
+        if _stats is None or _pending_events == 0:
+            return
+        entries, replace, coalesced = _snapshot()
+        future = _writer.submit(_write_rows, entries, replace)
+        _write_in_flight = (future, entries, replace, coalesced)
+        try:
+            await asyncio.wrap_future(future)
+        except Exception as e:
+            _write_in_flight = None
+            print(f"Error saving reaction stats: {e}")
+            _requeue(entries, replace, coalesced)
+            continue
+        _write_in_flight = None
+        _record_flush(coalesced)
+
+def _finish_write_in_flight() -> None:
+    """Wait for a background write left running by a cancelled flush task.
+
+    If it never ran or failed, its changes are queued again instead.
+    """
+    global _write_in_flight
+    if _write_in_flight is None:
+        return
+    future, entries, replace, coalesced = _write_in_flight
+    _write_in_flight = None
+    try:
+        future.result()
+    except CancelledError:
+        _requeue(entries, replace, coalesced)
+        return
+    except Exception as e:
+        print(f"Error saving reaction stats: {e}")
+        _requeue(entries, replace, coalesced)
+        return
+    _record_flush(coalesced)
+
+def _snapshot() -> Tuple[Dict[str, Dict[str, Any]], bool, int]:
+    """Copy the changed entries so the write can run off the event loop."""
+    global _pending_events, _replace_all
+    replace = _replace_all
+    links = _stats.keys() if replace else _dirty_links
+    entries = {link: dict(_stats[link]) for link in links if link in _stats}
+    coalesced = _pending_events
+    _pending_events = 0
+    _replace_all = False
+    _dirty_links.clear()
+    return entries, replace, coalesced
+
+def _requeue(entries: Dict[str, Dict[str, Any]], replace: bool, coalesced: int) -> None:
+    global _pending_events, _replace_all
+    _pending_events += coalesced
+    _replace_all = _replace_all or replace
+    _dirty_links.update(entries)
+
+def _record_flush(coalesced: int) -> None:
+    flush_counters["flushes"] += 1
+    flush_counters["events"] += coalesced
+    flush_counters["last_coalesced"] = coalesced
+    if coalesced > flush_counters["max_coalesced"]:
+        flush_counters["max_coalesced"] = coalesced
+
+def flush() -> bool:
+    """Synchronously write pending changes. Call on shutdown.
+
+    Returns True if anything was written.
+    """
+    global _flush_task
+    if _flush_task is not None and not _flush_task.done():
+        try:
+            _flush_task.cancel()
+        except RuntimeError:
+            pass  # loop already closed
+    _flush_task = None
+    # The older snapshot must land before this one, not after it.
+    _finish_write_in_flight()
+    if _stats is None or _pending_events == 0:
+        return False
+    entries, replace, coalesced = _snapshot()
+    try:
+        _write_rows(entries, replace)
+    except Exception as e:
+        print(f"Error saving reaction stats: {e}")
+        _requeue(entries, replace, coalesced)
+        return False
+    _record_flush(coalesced)
+    return True
+
+def get_flush_counters() -> Dict[str, Any]:
+    """Return write-behind counters, including average events per flush."""
+    counters = dict(flush_counters)
+    counters["pending"] = _pending_events
+    flushes = counters["flushes"]
+    counters["avg_coalesced"] = round(counters["events"] / flushes, 2) if flushes else 0.0
+    return counters
@@ -1,8 +1,17 @@
 import os
+import math
+import time
+import random
+import asyncio
 import aiohttp
 import urllib.parse
 from typing import Any
 
+try:
+    from . import json_codec
+except ImportError:  # run as a script
+    import json_codec
+
 server = os.getenv("CENTRAL_SERVER", "https://api.rotur.dev")
 ADMIN_HEADERS = {
     "Authorization": os.getenv("ADMIN_TOKEN"),
@@ -11,16 +20,102 @@ ADMIN_HEADERS = {
 
 TIMEOUT = aiohttp.ClientTimeout(total=5)
 
+# Connection pool of the shared session: total and per-host connection
+# limits, seconds an idle keep-alive connection is kept, and DNS cache TTL.
+POOL_LIMIT = int(os.getenv("ROTUR_POOL_LIMIT", "100"))
+POOL_LIMIT_PER_HOST = int(os.getenv("ROTUR_POOL_LIMIT_PER_HOST", "30"))
+POOL_KEEPALIVE = float(os.getenv("ROTUR_POOL_KEEPALIVE", "30"))
+POOL_DNS_TTL = int(os.getenv("ROTUR_POOL_DNS_TTL", "300"))
+
 _session: aiohttp.ClientSession | None = None
 
+pool_stats = {
+    "requests_in_flight": 0,
+    "queued": 0,
+    "max_queued": 0,
+    "queue_waits": 0,
+    "queue_wait_seconds": 0.0,
+    "max_queue_wait_seconds": 0.0,
+    "connections_created": 0,
+    "connections_reused": 0,
+}
+
+
+def _pool_trace_config() -> aiohttp.TraceConfig:
+    """Trace hooks that feed pool_stats."""
+    trace = aiohttp.TraceConfig()
+
+    async def on_request_start(session, ctx, params):
+        pool_stats["requests_in_flight"] += 1
+
+    async def on_request_done(session, ctx, params):
+        pool_stats["requests_in_flight"] -= 1
+
+    async def on_queued_start(session, ctx, params):
+        ctx.queued_at = time.monotonic()
+        pool_stats["queued"] += 1
+        pool_stats["max_queued"] = max(pool_stats["max_queued"], pool_stats["queued"])
+
+    async def on_queued_end(session, ctx, params):
+        waited = time.monotonic() - getattr(ctx, "queued_at", time.monotonic())
+        pool_stats["queued"] -= 1
+        pool_stats["queue_waits"] += 1
+        pool_stats["queue_wait_seconds"] += waited
+        pool_stats["max_queue_wait_seconds"] = max(pool_stats["max_queue_wait_seconds"], waited)
+
+    async def on_connection_created(session, ctx, params):
+        pool_stats["connections_created"] += 1
+
+    async def on_connection_reused(session, ctx, params):
+        pool_stats["connections_reused"] += 1
+
+    trace.on_request_start.append(on_request_start)
+    trace.on_request_end.append(on_request_done)
+    trace.on_request_exception.append(on_request_done)
+    trace.on_connection_queued_start.append(on_queued_start)
+    trace.on_connection_queued_end.append(on_queued_end)
+    trace.on_connection_create_end.append(on_connection_created)
+    trace.on_connection_reuseconn.append(on_connection_reused)
+    return trace
+
 
 async def get_session():
     global _session
     if _session is None or _session.closed:
-        _session = aiohttp.ClientSession(timeout=TIMEOUT)
+        connector = aiohttp.TCPConnector(
+            limit=POOL_LIMIT,
+            limit_per_host=POOL_LIMIT_PER_HOST,
+            keepalive_timeout=POOL_KEEPALIVE,
+            ttl_dns_cache=POOL_DNS_TTL,
+            use_dns_cache=True,
+        )
+        _session = aiohttp.ClientSession(
+            timeout=TIMEOUT,
+            connector=connector,
+            trace_configs=[_pool_trace_config()],
+            json_serialize=json_codec.dumps,
+        )
     return _session
 
 
+def pool_metrics() -> dict[str, Any]:
+    """Pool configuration, live usage and counters of the shared session."""
+    stats = dict(pool_stats)
+    waits = stats["queue_waits"]
+    stats["avg_queue_wait_ms"] = round(stats["queue_wait_seconds"] / waits * 1000, 2) if waits else 0.0
+    stats["queue_wait_seconds"] = round(stats["queue_wait_seconds"], 4)
+    stats["max_queue_wait_seconds"] = round(stats["max_queue_wait_seconds"], 4)
+    stats.update(limit=POOL_LIMIT, limit_per_host=POOL_LIMIT_PER_HOST,
+                 keepalive=POOL_KEEPALIVE, dns_ttl=POOL_DNS_TTL)
+    connector = _session.connector if _session is not None and not _session.closed else None
+    # aiohttp has no public accessors for these; best effort.
+    acquired = getattr(connector, "_acquired", None)
+    idle = getattr(connector, "_conns", None)
+    stats["connections_in_use"] = len(acquired) if acquired is not None else None
+    stats["connections_idle"] = sum(len(c) for c in idle.values()) if isinstance(idle, dict) else None
+    return stats
+
+
 def get_base_url() -> str:
     """Return the Rotur API base URL."""
     return os.getenv("CENTRAL_SERVER", "https://api.rotur.dev").rstrip("/")
@@ -43,9 +138,413 @@ def build_url(path: str) -> str:
     return get_base_url() + path
 
 
+# Retries for idempotent requests: attempts in total, and the cap of the
+# jittered exponential backoff between them.
+RETRY_ATTEMPTS = 3
+RETRY_BASE_DELAY = 0.2
+RETRY_MAX_DELAY = 2.0
+RETRY_STATUSES = {429, 502, 503, 504}
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+# Consecutive failures (errors, timeouts, 5xx) that open an endpoint's
+# circuit, and how long it stays open before one trial request.
+BREAKER_THRESHOLD = 5
+BREAKER_COOLDOWN = 30.0
+
+# Latency-aware timeouts never go below MIN_TIMEOUT, and an attempt is not
+# started with less than MIN_ATTEMPT_TIME left of the caller's budget.
+MIN_TIMEOUT = 1.0
+MIN_ATTEMPT_TIME = 0.25
+LATENCY_SAMPLES_BEFORE_ADAPTING = 5
+
+
+class CircuitOpenError(aiohttp.ClientConnectionError):
+    """Raised without making a request while an endpoint's circuit is open."""
+
+
+# First path segments whose second segment is part of the endpoint name
+_NAMED_SUBPATHS = {"admin", "me", "stats", "friends", "marriage", "keys", "files", "system"}
+_GROUP_ACTIONS = {"create", "search", "mine"}
+
+
+def endpoint_name(method: str, url: str) -> str:
+    """Name a request by its logical endpoint, e.g. "GET /groups/*/roles".
+
+    Usernames, tags and ids in the path are collapsed so they group together.
+    """
+    path = urllib.parse.urlsplit(url).path
+    parts = [p for p in path.split("/") if p]
+    if not parts:
+        return f"{method} /"
+    name = [parts[0]]
+    if parts[0] in _NAMED_SUBPATHS and len(parts) > 1:
+        name.append(parts[1] if parts[0] != "keys" or len(parts) < 3 else f"{parts[1]}/*")
+    elif parts[0] == "groups" and len(parts) > 1:
+        if parts[1] in _GROUP_ACTIONS:
+            name.append(parts[1])
+        else:
+            name.append("*")
+            if len(parts) > 2:
+                name.append(parts[2])
+    elif len(parts) > 1:
+        name.append("*")
+    return f"{method} /{'/'.join(name)}"
+
+
+class EndpointHealth:
+    """Circuit breaker and smoothed latency (RFC 6298 style) for one endpoint."""
+
+    __slots__ = ("name", "state", "failures", "opened_at", "trial", "srtt", "rttvar", "samples")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trial = False
+        self.srtt = 0.0
+        self.rttvar = 0.0
+        self.samples = 0
+
+    def allow(self, now: float) -> bool:
+        if self.state == "closed":
+            return True
+        if self.state == "open":
+            if now - self.opened_at < BREAKER_COOLDOWN:
+                return False
+            self.state = "half_open"
+            self.trial = False
+        if self.trial:
+            return False  # one trial request at a time while half open
+        self.trial = True
+        return True
+
+    def success(self, elapsed: float) -> None:
+        self.state = "closed"
+        self.failures = 0
+        self.trial = False
+        if self.samples == 0:
+            self.srtt, self.rttvar = elapsed, elapsed / 2
+        else:
+            self.rttvar = 0.75 * self.rttvar + 0.25 * abs(self.srtt - elapsed)
+            self.srtt = 0.875 * self.srtt + 0.125 * elapsed
+        self.samples += 1
+
+    def failure(self, now: float) -> None:
+        self.failures += 1
+        self.trial = False
+        if self.state == "half_open" or self.failures >= BREAKER_THRESHOLD:
+            self.state = "open"
+            self.opened_at = now
+
+    def timeout(self, ceiling: float) -> float:
+        """Per-attempt timeout: twice the usual worst case, within [MIN_TIMEOUT, ceiling]."""
+        if self.samples < LATENCY_SAMPLES_BEFORE_ADAPTING:
+            return ceiling
+        return min(ceiling, max(MIN_TIMEOUT, 2 * (self.srtt + 4 * self.rttvar)))
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            "state": self.state,
+            "failures": self.failures,
+            "srtt_ms": round(self.srtt * 1000, 1),
+            "timeout_s": round(self.timeout(TIMEOUT.total), 2),
+        }
+
+
+_endpoint_health: dict[str, EndpointHealth] = {}
+resilience_stats = {"retries": 0, "short_circuited": 0, "timeouts": 0}
+
+
+def _health(endpoint: str) -> EndpointHealth:
+    health = _endpoint_health.get(endpoint)
+    if health is None:
+        health = _endpoint_health[endpoint] = EndpointHealth(endpoint)
+    return health
+
+
+def breaker_states() -> dict[str, dict[str, Any]]:
+    return {name: health.snapshot() for name, health in sorted(_endpoint_health.items())}
+
+
+def _backoff(attempt: int) -> float:
+    return random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt))
+
+
+# Latency histogram buckets: upper bounds start at HISTOGRAM_MIN_MS and grow
+# by HISTOGRAM_GROWTH (about 19%), so a percentile read from a bucket is at
+# most that far above the true value. The last bucket catches everything
+# past ~2 minutes.
+HISTOGRAM_MIN_MS = 1.0
+HISTOGRAM_GROWTH = 2 ** 0.25
+HISTOGRAM_BUCKETS = 70
+_LOG_GROWTH = math.log(HISTOGRAM_GROWTH)
+
+# Outcomes counted per endpoint besides the HTTP status classes
+OUTCOMES = ("2xx", "3xx", "4xx", "5xx", "error", "timeout", "short_circuit", "cancelled")
+
+
+class LatencyHistogram:
+    """Fixed log-spaced buckets of request latencies in milliseconds."""
+
+    __slots__ = ("counts", "count", "total_ms", "max_ms")
+
+    def __init__(self):
+        self.counts = [0] * HISTOGRAM_BUCKETS
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    @staticmethod
+    def bucket(ms: float) -> int:
+        if ms <= HISTOGRAM_MIN_MS:
+            return 0
+        return min(HISTOGRAM_BUCKETS - 1, math.ceil(math.log(ms / HISTOGRAM_MIN_MS) / _LOG_GROWTH))
+
+    def record(self, ms: float) -> None:
+        self.counts[self.bucket(ms)] += 1
+        self.count += 1
+        self.total_ms += ms
+        if ms > self.max_ms:
+            self.max_ms = ms
+
+    def percentile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-th percentile (0 < q <= 100)."""
+        if not self.count:
+            return 0.0
+        rank = math.ceil(self.count * q / 100)
+        seen = 0
+        for index, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank:
+                return min(self.max_ms, HISTOGRAM_MIN_MS * HISTOGRAM_GROWTH ** index)
+        return self.max_ms
+
+
+class EndpointStats:
+    """Outcome counters and latency histogram of one logical endpoint."""
+
+    __slots__ = ("outcomes", "latency")
+
+    def __init__(self):
+        self.outcomes = dict.fromkeys(OUTCOMES, 0)
+        self.latency = LatencyHistogram()
+
+    def snapshot(self) -> dict[str, Any]:
+        latency = self.latency
+        return {
+            "requests": sum(self.outcomes.values()),
+            **{k: v for k, v in self.outcomes.items() if v},
+            "p50_ms": round(latency.percentile(50), 1),
+            "p95_ms": round(latency.percentile(95), 1),
+            "p99_ms": round(latency.percentile(99), 1),
+            "avg_ms": round(latency.total_ms / latency.count, 1) if latency.count else 0.0,
+            "max_ms": round(latency.max_ms, 1),
+        }
+
+
+_api_stats: dict[str, EndpointStats] = {}
+_api_stats_since = time.time()
+
+
+def _outcome(status: int) -> str:
+    return "5xx" if status >= 500 else "4xx" if status >= 400 else "3xx" if status >= 300 else "2xx"
+
+
+def _record_request(endpoint: str, outcome: str, elapsed: float) -> None:
+    stats = _api_stats.get(endpoint)
+    if stats is None:
+        stats = _api_stats[endpoint] = EndpointStats()
+    stats.outcomes[outcome] += 1
+    # Short-circuited and cancelled calls never got an answer; leave them out
+    # of the latencies so they do not drag the percentiles down.
+    if outcome not in ("short_circuit", "cancelled"):
+        stats.latency.record(elapsed * 1000)
+
+
+def api_stats() -> dict[str, dict[str, Any]]:
+    """Per-endpoint request counts, outcomes and latency percentiles, slowest p95 first."""
+    snapshots = {name: stats.snapshot() for name, stats in _api_stats.items()}
+    return dict(sorted(snapshots.items(), key=lambda item: item[1]["p95_ms"], reverse=True))
+
+
+def api_stats_text() -> str:
+    """api_stats() as a fixed-width text table, for logs and exports."""
+    since = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(_api_stats_since))
+    stats = api_stats()
+    columns = ("endpoint", "requests", *OUTCOMES, "p50_ms", "p95_ms", "p99_ms", "avg_ms", "max_ms")
+    rows = [columns] + [(name, *(str(row.get(c, 0)) for c in columns[1:])) for name, row in stats.items()]
+    widths = [max(len(row[i]) for row in rows) for i in range(len(columns))]
+    lines = [f"rotur API stats since {since}"]
+    for row in rows:
+        lines.append(row[0].ljust(widths[0]) + "".join(f"  {v:>{w}}" for v, w in zip(row[1:], widths[1:])))
+    lines += [
+        "",
+        _stats_line("connection pool", pool_metrics()),
+        _stats_line("user cache", get_user_cache_stats()),
+        _stats_line("shared requests", request_stats),
+        _stats_line("resilience", resilience_stats),
+    ]
+    lines += [_stats_line(f"breaker {name}", health) for name, health in breaker_states().items()]
+    return "\n".join(lines)
+
+
+def _stats_line(title: str, stats: dict[str, Any]) -> str:
+    return f"{title}: " + ", ".join(f"{key}={value}" for key, value in stats.items())
+
+
+def reset_api_stats() -> None:
+    global _api_stats_since
+    _api_stats.clear()
+    _api_stats_since = time.time()
+
+
+async def _request(
+    method: str,
+    url: str,
+    read,
+    *,
+    endpoint: str | None = None,
+    idempotent: bool | None = None,
+    timeout_total: float | None = None,
+    **kwargs,
+):
+    """Send one logical request through the endpoint's breaker and return await read(resp).
+
+    Idempotent requests (GET/HEAD by default) get latency-aware per-attempt
+    timeouts and are retried with jittered backoff on connection errors,
+    timeouts and RETRY_STATUSES, all within timeout_total. Other requests
+    are sent once with the full timeout.
+    """
+    method = method.upper()
+    endpoint = endpoint or endpoint_name(method, url)
+    health = _health(endpoint)
+    if idempotent is None:
+        idempotent = method in IDEMPOTENT_METHODS
+    budget = timeout_total or TIMEOUT.total
+    deadline = time.monotonic() + budget
+    session = await get_session()
+
+    started = time.monotonic()
+    outcome = "error"
+    try:
+        attempt = 0
+        while True:
+            now = time.monotonic()
+            if not health.allow(now):
+                resilience_stats["short_circuited"] += 1
+                outcome = "short_circuit"
+                raise CircuitOpenError(f"{endpoint} is failing; not calling it for now")
+            remaining = deadline - now
+            attempt_timeout = min(health.timeout(budget), remaining) if idempotent else remaining
+            can_retry = idempotent and attempt + 1 < RETRY_ATTEMPTS
+            try:
+                resp = await session.request(method, url, timeout=aiohttp.ClientTimeout(total=attempt_timeout), **kwargs)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if isinstance(e, asyncio.TimeoutError):
+                    resilience_stats["timeouts"] += 1
+                    outcome = "timeout"
+                else:
+                    outcome = "error"
+                health.failure(time.monotonic())
+                delay = _backoff(attempt)
+                if not can_retry or deadline - time.monotonic() - delay < MIN_ATTEMPT_TIME:
+                    raise
+            except BaseException:
+                health.trial = False  # cancelled: let another request be the trial
+                raise
+            else:
+                async with resp:
+                    elapsed = time.monotonic() - now
+                    if resp.status >= 500:
+                        health.failure(time.monotonic())
+                    else:
+                        health.success(elapsed)
+                    delay = _backoff(attempt)
+                    retry = (
+                        can_retry
+                        and resp.status in RETRY_STATUSES
+                        and deadline - time.monotonic() - delay >= MIN_ATTEMPT_TIME
+                    )
+                    if not retry:
+                        outcome = _outcome(resp.status)
+                        return await read(resp)
+            resilience_stats["retries"] += 1
+            attempt += 1
+            await asyncio.sleep(delay)
+    except asyncio.CancelledError:
+        outcome = "cancelled"
+        raise
+    finally:
+        _record_request(endpoint, outcome, time.monotonic() - started)
+
+
+async def _read_json_status(resp: aiohttp.ClientResponse) -> tuple[int, Any]:
+    return resp.status, await _safe_json_from_aiohttp(resp)
+
+
+async def _read_text_status(resp: aiohttp.ClientResponse) -> tuple[int, str]:
+    return resp.status, await resp.text()
+
+
+async def _read_json(resp: aiohttp.ClientResponse) -> Any:
+    return await resp.json(loads=json_codec.loads)
+
+
+async def _read_json_status_strict(resp: aiohttp.ClientResponse) -> tuple[int, Any]:
+    return resp.status, await resp.json(loads=json_codec.loads)
+
+
+# Seconds the public stats endpoints are cached for.
+STATS_CACHE_TTL = float(os.getenv("ROTUR_STATS_CACHE_TTL", "60"))
+
+_request_inflight: dict[tuple, asyncio.Task] = {}
+_response_cache: dict[tuple, tuple[float, tuple[int, Any]]] = {}
+request_stats = {"requests": 0, "coalesced": 0, "cache_hits": 0}
+
+
+def _join_inflight(inflight: dict, key, factory) -> tuple[asyncio.Task, bool]:
+    """Return the in-flight task for key, starting factory() if there is none.
+
+    The bool says whether this call started it. Await the task through
+    asyncio.shield so one caller's cancellation does not reach the others.
+    """
+    task = inflight.get(key)
+    if task is not None:
+        return task, False
+    task = asyncio.ensure_future(factory())
+    inflight[key] = task
+
+    def _done(t):
+        if inflight.get(key) is t:
+            del inflight[key]
+
+    task.add_done_callback(_done)
+    return task, True
+
+
+def _request_key(method: str, url: str, params: dict[str, Any] | None, headers: dict[str, str] | None) -> tuple:
+    return (
+        method,
+        url,
+        tuple(sorted((str(k), str(v)) for k, v in (params or {}).items())),
+        tuple(sorted((headers or {}).items())),
+    )
+
+
+def _share(result: tuple[int, Any]) -> tuple[int, Any]:
+    """Give each caller of a shared response its own top-level payload object."""
+    status, payload = result
+    if isinstance(payload, dict):
+        payload = dict(payload)
+    elif isinstance(payload, list):
+        payload = list(payload)
+    return status, payload
+
+
 async def _safe_json_from_aiohttp(resp: aiohttp.ClientResponse) -> Any:
     try:
-        return await resp.json(content_type=None)
+        return await resp.json(content_type=None, loads=json_codec.loads)
     except Exception:
         return {}
 
@@ -59,25 +558,66 @@ async def api_json(
     data: Any | None = None,
     headers: dict[str, str] | None = None,
     timeout_total: float | None = None,
+    coalesce: bool = False,
+    cache_ttl: float | None = None,
+    idempotent: bool | None = None,
 ) -> tuple[int, Any]:
-    """Make a request to the Rotur API and return (status, json-like payload)."""
-    session = await get_session()
+    """Make a request to the Rotur API and return (status, json-like payload).
+
+    For bodiless GETs, coalesce=True lets concurrent identical calls (same
+    URL, params and headers) share one request, and cache_ttl additionally
+    reuses a 200 response for that many seconds. Pass idempotent=False for
+    GETs that change state, so they are never retried (see _request).
+    """
+    method = method.upper()
+    if (coalesce or cache_ttl) and idempotent is not False and method == "GET" and json_body is None and data is None:
+        key = _request_key(method, build_url(path), params, headers)
+        if cache_ttl:
+            cached = _response_cache.get(key)
+            if cached is not None and cached[0] > time.monotonic():
+                request_stats["cache_hits"] += 1
+                return _share(cached[1])
+
+        async def fetch():
+            result = await _api_json(method, path, params=params, headers=headers, timeout_total=timeout_total)
+            if cache_ttl and result[0] == 200:
+                _response_cache[key] = (time.monotonic() + cache_ttl, result)
+            return result
+
+        task, started = _join_inflight(_request_inflight, key, fetch)
+        if not started:
+            request_stats["coalesced"] += 1
+        return _share(await asyncio.shield(task))
+
+    return await _api_json(
+        method, path, params=params, json_body=json_body, data=data, headers=headers,
+        timeout_total=timeout_total, idempotent=idempotent,
+    )
 
-    request_timeout: aiohttp.ClientTimeout | None = None
-    if timeout_total is not None:
-        request_timeout = aiohttp.ClientTimeout(total=timeout_total)
 
-    async with session.request(
-        method.upper(),
+async def _api_json(
+    method: str,
+    path: str,
+    *,
+    params: dict[str, Any] | None = None,
+    json_body: Any | None = None,
+    data: Any | None = None,
+    headers: dict[str, str] | None = None,
+    timeout_total: float | None = None,
+    idempotent: bool | None = None,
+) -> tuple[int, Any]:
+    request_stats["requests"] += 1
+    return await _request(
+        method,
         build_url(path),
+        _read_json_status,
+        idempotent=idempotent,
+        timeout_total=timeout_total,
         params=params,
         json=json_body,
         data=data,
         headers=headers,
-        timeout=request_timeout,
-    ) as resp:
-        payload = await _safe_json_from_aiohttp(resp)
-        return resp.status, payload
+    )
 
 
 async def api_text(
@@ -90,22 +630,16 @@ async def api_text(
     headers: dict[str, str] | None = None,
     timeout_total: float | None = None,
 ) -> tuple[int, str]:
-    session = await get_session()
-
-    request_timeout: aiohttp.ClientTimeout | None = None
-    if timeout_total is not None:
-        request_timeout = aiohttp.ClientTimeout(total=timeout_total)
-
-    async with session.request(
-        method.upper(),
+    return await _request(
+        method,
         build_url(path),
+        _read_text_status,
+        timeout_total=timeout_total,
         params=params,
         json=json_body,
         data=data,
         headers=headers,
-        timeout=request_timeout,
-    ) as resp:
-        return resp.status, await resp.text()
+    )
 
 async def friends_request(auth: str, username: str) -> tuple[int, Any]:
     return await api_json("POST", f"/friends/request/{username}", params={"auth": auth}, timeout_total=10)
@@ -132,6 +666,7 @@ async def profile_by_discord_id(discord_id: int | str) -> tuple[int, Any]:
         "GET",
         "/profile",
         params={"include_posts": 0, "discord_id": str(discord_id)},
+        coalesce=True,
     )
 
 
@@ -140,6 +675,7 @@ async def profile_by_name(username: str) -> tuple[int, Any]:
         "GET",
         "/profile",
         params={"include_posts": 0, "name": username},
+        coalesce=True,
     )
 
 
@@ -148,35 +684,37 @@ async def profile_by_username(username: str, include_posts: int = 0) -> tuple[in
         "GET",
         "/profile",
         params={"include_posts": int(include_posts), "username": username},
+        coalesce=True,
     )
 
 
 async def stats_users() -> tuple[int, Any]:
-    return await api_json("GET", "/stats/users")
+    return await api_json("GET", "/stats/users", cache_ttl=STATS_CACHE_TTL)
 
 
 async def stats_followers() -> tuple[int, Any]:
-    return await api_json("GET", "/stats/followers")
+    return await api_json("GET", "/stats/followers", cache_ttl=STATS_CACHE_TTL)
 
 
 async def stats_systems() -> tuple[int, Any]:
-    return await api_json("GET", "/stats/systems")
+    return await api_json("GET", "/stats/systems", cache_ttl=STATS_CACHE_TTL)
 
 
 async def follow_user(auth: str, username: str) -> tuple[int, Any]:
-    return await api_json("GET", "/follow", params={"auth": auth, "name": username})
+    return await api_json("GET", "/follow", params={"auth": auth, "name": username}, idempotent=False)
 
 
 async def unfollow_user(auth: str, username: str) -> tuple[int, Any]:
-    return await api_json("GET", "/unfollow", params={"auth": auth, "name": username})
+    return await api_json("GET", "/unfollow", params={"auth": auth, "name": username}, idempotent=False)
 
 
 async def following(username: str) -> tuple[int, Any]:
-    return await api_json("GET", "/following", params={"name": username})
+    return await api_json("GET", "/following", params={"name": username}, coalesce=True)
 
 
 async def keys_buy(key_id: str, auth: str) -> tuple[int, Any]:
-    return await api_json("GET", f"/keys/buy/{key_id}", params={"auth": auth})
+    # A purchase despite the GET: never retry it.
+    return await api_json("GET", f"/keys/buy/{key_id}", params={"auth": auth}, idempotent=False)
 
 
 async def keys_cancel(key_id: str, auth: str) -> tuple[int, Any]:
@@ -207,17 +745,24 @@ async def get_user_login(username: str, password_hash: str) -> tuple[int, Any]:
 
 
 async def refresh_token(auth: str) -> tuple[int, Any]:
-    return await api_json("POST", "/me/refresh_token", params={"auth": auth})
+    try:
+        return await api_json("POST", "/me/refresh_token", params={"auth": auth})
+    finally:
+        invalidate_user(token=auth)
 
 
 async def transfer(auth: str, to: str, amount: float, note: str = "") -> tuple[int, Any]:
-    return await api_json(
-        "POST",
-        "/me/transfer",
-        params={"auth": auth},
-        json_body={"to": to, "amount": amount, "note": note},
-        headers={"Content-Type": "application/json"},
-    )
+    try:
+        return await api_json(
+            "POST",
+            "/me/transfer",
+            params={"auth": auth},
+            json_body={"to": to, "amount": amount, "note": note},
+            headers={"Content-Type": "application/json"},
+        )
+    finally:
+        invalidate_user(token=auth)
+        invalidate_user(username=to)
 
 
 async def marriage_propose(auth: str, username: str) -> tuple[int, Any]:
@@ -262,15 +807,114 @@ def bio_from_obj(obj):
     string += f'\n{obj.get("bio", "")}\n'
     return string
 
+# Seconds a get_user_by result is reused; "User not found" is kept for less
+# so a fresh link shows up quickly even without an explicit invalidation.
+USER_CACHE_TTL = float(os.getenv("ROTUR_USER_CACHE_TTL", "15"))
+USER_CACHE_NEGATIVE_TTL = 5.0
+
+_user_cache: dict[tuple[str, str], tuple[float, Any]] = {}
+_user_inflight: dict[tuple[str, str], asyncio.Task] = {}
+# Invalidations seen by each lookup still in flight, so it does not cache
+# what it read before a change to that user (and only that user).
+_user_pending: dict[tuple[str, str], list[list[dict]]] = {}
+user_cache_stats = {"hits": 0, "misses": 0, "coalesced": 0, "invalidations": 0}
+
+
+def _copy_user(payload):
+    return dict(payload) if isinstance(payload, dict) else payload
+
+
+def _user_matches(wanted: dict, cache_key: tuple[str, str], payload) -> bool:
+    field, value = cache_key
+    if wanted.get(field) is not None and (value.lower() if field == "username" else value) == wanted[field]:
+        return True
+    if not isinstance(payload, dict):
+        return False
+    if wanted["username"] and str(payload.get("username", "")).lower() == wanted["username"]:
+        return True
+    if wanted["discord_id"] and str(payload.get("discord_id", "")) == wanted["discord_id"]:
+        return True
+    return bool(wanted["key"] and payload.get("key") == wanted["key"])
+
+
+async def _fetch_user_by(cache_key: tuple[str, str], key, value):
+    invalidations: list[dict] = []
+    _user_pending.setdefault(cache_key, []).append(invalidations)
+    try:
+        payload = await _request(
+            "GET",
+            f"{get_base_url()}/admin/get_user_by",
+            _read_json,
+            params={"key": key},
+            json={"value": value},
+            headers=ADMIN_HEADERS,
+        )
+    finally:
+        waiting = _user_pending.get(cache_key, [])
+        waiting.remove(invalidations)
+        if not waiting:
+            _user_pending.pop(cache_key, None)
+    stale = any(_user_matches(wanted, cache_key, payload) for wanted in invalidations)
+    if not stale and isinstance(payload, dict):
+        if not payload.get("error"):
+            _user_cache[cache_key] = (time.monotonic() + USER_CACHE_TTL, payload)
+        elif payload.get("error") == "User not found":
+            _user_cache[cache_key] = (time.monotonic() + USER_CACHE_NEGATIVE_TTL, payload)
+    return payload
+
+
 async def get_user_by(key, value):
-    session = await get_session()
-    async with session.get(
-        f"{get_base_url()}/admin/get_user_by",
-        params={"key": key},
-        json={"value": value},
-        headers=ADMIN_HEADERS,
-    ) as resp:
-        return await resp.json()
+    """Look a user up by an account field (admin API).
+
+    Results are cached for USER_CACHE_TTL seconds and concurrent lookups of
+    the same user share one request. Anything that changes a user should
+    call invalidate_user().
+    """
+    cache_key = (str(key), str(value))
+    cached = _user_cache.get(cache_key)
+    if cached is not None:
+        if cached[0] > time.monotonic():
+            user_cache_stats["hits"] += 1
+            return _copy_user(cached[1])
+        del _user_cache[cache_key]
+
+    task, started = _join_inflight(_user_inflight, cache_key, lambda: _fetch_user_by(cache_key, key, value))
+    user_cache_stats["misses" if started else "coalesced"] += 1
+    return _copy_user(await asyncio.shield(task))
+
+
+def invalidate_user(*, username: str | None = None, discord_id: str | int | None = None, token: str | None = None) -> int:
+    """Drop cached get_user_by results for a user.
+
+    Matches on the lookup key as well as the cached account's username,
+    discord_id or auth token. Returns how many entries were dropped.
+    """
+    user_cache_stats["invalidations"] += 1
+    wanted = {
+        "username": str(username).lower() if username else None,
+        "discord_id": str(discord_id) if discord_id else None,
+        "key": token or None,
+    }
+    # Lookups in flight check this against what they read once they finish.
+    for waiting in _user_pending.values():
+        for invalidations in waiting:
+            invalidations.append(wanted)
+
+    stale = [k for k, (_, payload) in _user_cache.items() if _user_matches(wanted, k, payload)]
+    for k in stale:
+        del _user_cache[k]
+    for k in [k for k in _user_inflight if _user_matches(wanted, k, None)]:
+        _user_inflight.pop(k, None)
+    return len(stale)
+
+
+def get_user_cache_stats() -> dict[str, Any]:
+    stats = dict(user_cache_stats)
+    lookups = stats["hits"] + stats["misses"] + stats["coalesced"]
+    stats["hit_rate"] = round((stats["hits"] + stats["coalesced"]) / lookups, 3) if lookups else 0.0
+    stats["size"] = len(_user_cache)
+    return stats
+
     
     # Group API wrappers
     
@@ -421,153 +1065,285 @@ async def groups_remove_role(auth: str, grouptag: str, user_id: str, role_id: st
 
 
 async def update_user(type, username, key=None, value=None):
-    session = await get_session()
     payload = {
         "type": type,
         "username": username,
         "key": key,
         "value": value,
     }
-    async with session.post(
-        f"{get_base_url()}/admin/update_user",
-        json=payload,
-        headers=ADMIN_HEADERS,
-    ) as resp:
-        return await resp.json()
+    try:
+        return await _request(
+            "POST",
+            f"{get_base_url()}/admin/update_user",
+            _read_json,
+            json=payload,
+            headers=ADMIN_HEADERS,
+        )
+    finally:
+        invalidate_user(username=username)
 
 
 async def add_subscription(username, tier):
-    session = await get_session()
-    async with session.post(
-        f"{get_base_url()}/admin/set_sub",
-        json={"username": username, "tier": tier},
-        headers=ADMIN_HEADERS,
-    ) as resp:
-        return await resp.json()
+    try:
+        return await _request(
+            "POST",
+            f"{get_base_url()}/admin/set_sub",
+            _read_json,
+            json={"username": username, "tier": tier},
+            headers=ADMIN_HEADERS,
+        )
+    finally:
+        invalidate_user(username=username)
 
 
 async def delete_user(username):
-    session = await get_session()
-    async with session.post(
-        f"{get_base_url()}/admin/delete_user",
-        json={"username": username},
-        headers=ADMIN_HEADERS,
-    ) as resp:
-        return await resp.json()
+    try:
+        return await _request(
+            "POST",
+            f"{get_base_url()}/admin/delete_user",
+            _read_json,
+            json={"username": username},
+            headers=ADMIN_HEADERS,
+        )
+    finally:
+        invalidate_user(username=username)
 
 async def ban_user(username):
-    session = await get_session()
-    async with session.post(
-        f"{get_base_url()}/admin/ban_user",
-        json={"username": username},
-        headers=ADMIN_HEADERS,
-    ) as resp:
-        return await resp.json()
+    try:
+        return await _request(
+            "POST",
+            f"{get_base_url()}/admin/ban_user",
+            _read_json,
+            json={"username": username},
+            headers=ADMIN_HEADERS,
+        )
+    finally:
+        invalidate_user(username=username)
 
 async def transfer_credits(from_username, to_username, amount, note=""):
-    session = await get_session()
     query = urllib.parse.urlencode({
         "to": to_username,
         "amount": str(amount),
         "from": from_username,
         "note": note,
     })
-    async with session.post(
-        f"{get_base_url()}/admin/transfer_credits?{query}",
-        headers=ADMIN_HEADERS,
-    ) as resp:
-        return await resp.json()
+    try:
+        return await _request(
+            "POST",
+            f"{get_base_url()}/admin/transfer_credits?{query}",
+            _read_json,
+            headers=ADMIN_HEADERS,
+        )
+    finally:
+        invalidate_user(username=from_username)
+        invalidate_user(username=to_username)
 
 async def block_user(token, username):
-    session = await get_session()
-    async with session.post(
-        f"{get_base_url()}/me/block/{username}?auth={token}"
-    ) as resp:
+    async def read(resp):
         if resp.status == 200:
             return f"You are now blocking {username}."
-        return (await resp.json()).get("error", "Unknown error occurred.")
+        return (await resp.json(loads=json_codec.loads)).get("error", "Unknown error occurred.")
+
+    return await _request("POST", f"{get_base_url()}/me/block/{username}?auth={token}", read)
 
 
 async def unblock_user(token, username):
-    session = await get_session()
-    async with session.post(
-        f"{get_base_url()}/me/unblock/{username}?auth={token}"
-    ) as resp:
+    async def read(resp):
         if resp.status == 200:
             return f"You are no longer blocking {username}."
-        return (await resp.json()).get("error", "Unknown error occurred.")
+        return (await resp.json(loads=json_codec.loads)).get("error", "Unknown error occurred.")
+
+    return await _request("POST", f"{get_base_url()}/me/unblock/{username}?auth={token}", read)
 
 
 async def get_users(system, token):
-    session = await get_session()
-    async with session.get(
+    return await _request(
+        "GET",
         f"{get_base_url()}/system/users",
+        _read_json,
         params={"auth": token, "system": system},
-    ) as resp:
-        return await resp.json()
+    )
 
 
 async def get_user(token):
-    session = await get_session()
-    async with session.get(
+    return await _request(
+        "GET",
         f"{get_base_url()}/me",
+        _read_json,
         params={"auth": token},
-    ) as resp:
-        return await resp.json()
+    )
 
 async def get_user_file_size(token, username):
-    session = await get_session()
-    async with session.get(
+    return await _request(
+        "GET",
         f"{get_base_url()}/files/usage?auth={token}",
+        _read_json,
         params={"username": username},
-    ) as resp:
-        return await resp.json()
+    )
 
 async def close():
+    """Close the shared session and its pooled connections. Call on shutdown."""
     global _session
-    if _session:
-        await _session.close()
+    session, _session = _session, None
+    if session is not None and not session.closed:
+        try:
+            await session.close()
+        except Exception as e:
+            print(f"Error closing rotur session: {e}")
 
 
 async def set_standing(username: str, level: str, reason: str) -> tuple[int, Any]:
-    session = await get_session()
     payload = {
         "username": username,
         "level": level,
         "reason": reason,
     }
-    async with session.post(
+    return await _request(
+        "POST",
         f"{get_base_url()}/admin/set_standing",
+        _read_json_status_strict,
         json=payload,
         headers=ADMIN_HEADERS,
-    ) as resp:
-        return resp.status, await resp.json()
+    )
 
 
 async def get_standing_history(username: str) -> tuple[int, Any]:
-    session = await get_session()
     payload = {"username": username}
-    async with session.post(
+    # A read, even though the endpoint takes POST
+    return await _request(
+        "POST",
         f"{get_base_url()}/admin/get_standing_history",
+        _read_json_status_strict,
+        idempotent=True,
         json=payload,
         headers=ADMIN_HEADERS,
-    ) as resp:
-        return resp.status, await resp.json()
+    )
 
 
 async def recover_standing(username: str, reason: str) -> tuple[int, Any]:
-    session = await get_session()
     payload = {
         "username": username,
         "reason": reason,
     }
-    async with session.post(
+    return await _request(
+        "POST",
         f"{get_base_url()}/admin/recover_standing",
+        _read_json_status_strict,
         json=payload,
         headers=ADMIN_HEADERS,
-    ) as resp:
-        return resp.status, await resp.json()
+    )
 
 
 async def get_user_standing(username: str) -> tuple[int, Any]:
-    return await api_json("GET", "/get_standing", params={"username": username})
+    return await api_json("GET", "/get_standing", params={"username": username}, coalesce=True)
+
+
+async def self_test() -> dict[str, bool]:
+    """Exercise retries, the circuit breaker and adaptive timeouts against a local fault-injecting server.
+
+    Breaker and latency state, counters and the shared session are restored
+    afterwards. Returns {check: passed}.
+    """
+    from aiohttp import web
+
+    global BREAKER_COOLDOWN, _endpoint_health, resilience_stats, _session
+    hits: dict[str, int] = {}
+    faults = {"flaky": 1, "down": True, "slow": False}
+    release = asyncio.Event()  # ends a stalled /slow response
+
+    async def handle(request: web.Request) -> web.Response:
+        name = request.match_info["name"]
+        hits[name] = hits.get(name, 0) + 1
+        if name == "flaky" and hits[name] <= faults["flaky"]:
+            return web.json_response({"error": "unavailable"}, status=503)
+        if name == "down":
+            await asyncio.sleep(0.1)
+            if faults["down"]:
+                return web.json_response({"error": "broken"}, status=500)
+        if name == "slow" and faults["slow"]:
+            await release.wait()
+        if name == "buy":
+            return web.json_response({"error": "unavailable"}, status=503)
+        return web.json_response({"ok": True})
+
+    async def status_of(resp: aiohttp.ClientResponse) -> int:
+        return resp.status
+
+    app = web.Application()
+    app.router.add_route("*", "/{name}", handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    base = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}"
+
+    saved = BREAKER_COOLDOWN, _endpoint_health, resilience_stats, _session
+    BREAKER_COOLDOWN = 0.3
+    _endpoint_health, resilience_stats, _session = {}, dict.fromkeys(resilience_stats, 0), None
+    results: dict[str, bool] = {}
+    try:
+        # A 503 is retried and the second attempt succeeds.
+        status = await _request("GET", f"{base}/flaky", status_of)
+        results["503 recovers on retry"] = status == 200 and hits["flaky"] == 2 and resilience_stats["retries"] == 1
+
+        # BREAKER_THRESHOLD failures open the circuit; calls then fail without a request.
+        for _ in range(BREAKER_THRESHOLD):
+            await _request("GET", f"{base}/down", status_of)
+        health = _endpoint_health[endpoint_name("GET", f"{base}/down")]
+        try:
+            await _request("GET", f"{base}/down", status_of)
+            short_circuited = False
+        except CircuitOpenError:
+            short_circuited = True
+        results["breaker opens"] = health.state == "open" and short_circuited and hits["down"] == BREAKER_THRESHOLD
+
+        # After the cooldown one trial goes through (others are refused) and closes it.
+        await asyncio.sleep(BREAKER_COOLDOWN)
+        faults["down"] = False
+        trial = asyncio.ensure_future(_request("GET", f"{base}/down", status_of))
+        await asyncio.sleep(0.02)
+        half_open = health.state == "half_open"
+        try:
+            await _request("GET", f"{base}/down", status_of)
+            refused = False
+        except CircuitOpenError:
+            refused = True
+        results["breaker half-opens and closes"] = (
+            half_open and refused and await trial == 200 and health.state == "closed"
+        )
+
+        # Once the endpoint has a latency history, a stall is cut off at the
+        # adaptive per-attempt timeout rather than the whole budget.
+        for _ in range(LATENCY_SAMPLES_BEFORE_ADAPTING):
+            await _request("GET", f"{base}/slow", status_of)
+        faults["slow"] = True
+        budget = 2.5
+        started = time.monotonic()
+        try:
+            await _request("GET", f"{base}/slow", status_of, timeout_total=budget)
+            timed_out = False
+        except asyncio.TimeoutError:
+            timed_out = True
+        elapsed = time.monotonic() - started
+        results["slow endpoint hits adaptive timeout"] = (
+            timed_out and elapsed < budget and resilience_stats["timeouts"] >= 2
+        )
+
+        # State-changing calls are sent once, even when the answer is retryable.
+        await _request("POST", f"{base}/buy", status_of)
+        await _request("GET", f"{base}/buy", status_of, idempotent=False)
+        results["non-idempotent sent once"] = hits["buy"] == 2
+    finally:
+        release.set()
+        if _session is not None:
+            await _session.close()
+        await runner.cleanup()
+        BREAKER_COOLDOWN, _endpoint_health, resilience_stats, _session = saved
+    return results
+
+
+if __name__ == "__main__":
+    checks = asyncio.run(self_test())
+    for check, passed in checks.items():
+        print(f"{'ok  ' if passed else 'FAIL'} {check}")
+    raise SystemExit(0 if all(checks.values()) else 1)
@@ -0,0 +1,356 @@
+"""
+Skills catalog for roturbot
+Keeps every skills/*.md file parsed in memory with an inverted index of
+its tokens, so listing, searching and automatic matching never reopen
+the files. A change to the directory mtime triggers a rescan that only
+re-reads files whose own mtime changed; create/edit go through write().
+"""
+
+import os
+import re
+import time
+import random
+import threading
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+_TOKEN_RE = re.compile(r"[^\W_]+")
+
+
+def tokenize(text: str) -> Set[str]:
+    return set(_TOKEN_RE.findall(text.lower()))
+
+
+def name_variants(name: str) -> Set[str]:
+    """Prompt substrings that pull a skill in automatically.
+
+    The name itself, the name with _ and - as spaces, and its first word
+    when that is at least 4 characters. (The plural "<name>s" used to be
+    checked too, but any prompt containing it also contains the name.)
+    """
+    lowered = name.lower()
+    variants = {lowered, lowered.replace("_", " ").replace("-", " ")}
+    first_word = lowered.split("_")[0].split("-")[0]
+    if len(first_word) >= 4:
+        variants.add(first_word)
+    variants.discard("")
+    return variants
+
+
+class AhoCorasick:
+    """Multi-pattern substring matcher.
+
+    Built once from (pattern, value) pairs; find() walks the text a single
+    time and returns the values of every pattern that occurs in it.
+    """
+
+    def __init__(self, patterns: Iterable[Tuple[str, str]]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._out: List[Set[str]] = [set()]
+        for pattern, value in patterns:
+            node = 0
+            for ch in pattern:
+                nxt = self._goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[node][ch] = nxt
+                    self._goto.append({})
+                    self._out.append(set())
+                node = nxt
+            self._out[node].add(value)
+        self._fail = [0] * len(self._goto)
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self._goto[node].items():
+                queue.append(child)
+                fallback = self._fail[node]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(ch, 0)
+                self._fail[child] = target if target != child else 0
+                self._out[child] |= self._out[self._fail[child]]
+
+    def find(self, text: str) -> Set[str]:
+        goto, fail, out = self._goto, self._fail, self._out
+        found: Set[str] = set()
+        node = 0
+        for ch in text:
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if out[node]:
+                found |= out[node]
+        return found
+
+
+class Skill:
+    """A parsed skill file."""
+
+    __slots__ = ("name", "content", "lower", "description", "sections", "mtime")
+
+    def __init__(self, name: str, content: str, mtime: float = 0.0):
+        self.name = name
+        self.content = content
+        self.lower = content.lower()
+        self.mtime = mtime
+        first_line = content.split("\n")[0] if content else ""
+        self.description = first_line.replace("#", "").strip()
+        self.sections = parse_sections(content)
+
+    def summary(self) -> Dict[str, str]:
+        return {"name": self.name, "description": self.description}
+
+
+def parse_sections(content: str) -> Dict[str, str]:
+    """Split a skill file into {"title", "authentication", "endpoints", "notes", ...}."""
+    sections: Dict[str, List[str]] = {}
+    current = None
+    for line in content.split("\n"):
+        if line.startswith("# ") and "title" not in sections:
+            sections["title"] = [line[2:].strip()]
+            current = None
+        elif line.startswith("## "):
+            current = line[3:].strip().lower()
+            sections[current] = []
+        elif line.startswith("---"):
+            current = None
+        elif current is not None:
+            sections[current].append(line)
+    return {name: "\n".join(lines).strip() for name, lines in sections.items()}
+
+
+class SkillCatalog:
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._skills: Dict[str, Skill] = {}
+        self._index: Dict[str, Set[str]] = {}
+        # -1 means "never scanned"; None means the directory does not exist.
+        self._dir_mtime: Optional[float] = -1
+        self._matcher: Optional[AhoCorasick] = None
+        self._lock = threading.RLock()
+
+    def _index_add(self, skill: Skill) -> None:
+        for token in tokenize(skill.content) | tokenize(f"{skill.name}.md"):
+            self._index.setdefault(token, set()).add(skill.name)
+
+    def _index_remove(self, skill: Skill) -> None:
+        for token in tokenize(skill.content) | tokenize(f"{skill.name}.md"):
+            names = self._index.get(token)
+            if names is not None:
+                names.discard(skill.name)
+                if not names:
+                    del self._index[token]
+
+    def _put(self, skill: Skill) -> None:
+        old = self._skills.get(skill.name)
+        if old is not None:
+            self._index_remove(old)
+        self._skills[skill.name] = skill
+        self._index_add(skill)
+
+    def _drop(self, name: str) -> None:
+        old = self._skills.pop(name, None)
+        if old is not None:
+            self._index_remove(old)
+
+    def _refresh(self) -> None:
+        try:
+            dir_mtime = os.stat(self.directory).st_mtime
+        except FileNotFoundError:
+            dir_mtime = None
+        if dir_mtime == self._dir_mtime:
+            return
+        with self._lock:
+            self._dir_mtime = dir_mtime
+            self._scan()
+
+    def _scan(self) -> None:
+        try:
+            filenames = [f for f in os.listdir(self.directory) if f.endswith(".md")]
+        except FileNotFoundError:
+            filenames = []
+        seen = set()
+        for filename in filenames:
+            name = filename[:-3]
+            seen.add(name)
+            path = os.path.join(self.directory, filename)
+            try:
+                mtime = os.stat(path).st_mtime
+                cached = self._skills.get(name)
+                if cached is not None and cached.mtime == mtime:
+                    continue
+                with open(path, "r") as f:
+                    self._put(Skill(name, f.read(), mtime))
+            except Exception as e:
+                print(f"Error loading skill {name}: {e}")
+        for name in list(self._skills):
+            if name not in seen:
+                self._drop(name)
+        self._on_change()
+
+    def _on_change(self) -> None:
+        """Drop structures that depend on the set of skill names."""
+        self._matcher = None
+
+    def rescan(self) -> None:
+        """Force a rescan, e.g. after an in-place edit that did not touch the directory."""
+        with self._lock:
+            self._dir_mtime = -1
+            self._refresh()
+
+    def path_for(self, name: str) -> str:
+        return os.path.join(self.directory, f"{name}.md")
+
+    def write(self, name: str, content: str) -> Skill:
+        """Write a skill file and update the catalog with it."""
+        with self._lock:
+            self._refresh()
+            os.makedirs(self.directory, exist_ok=True)
+            path = self.path_for(name)
+            with open(path, "w") as f:
+                f.write(content)
+            skill = Skill(name, content, os.stat(path).st_mtime)
+            added = name not in self._skills
+            self._put(skill)
+            try:
+                self._dir_mtime = os.stat(self.directory).st_mtime
+            except OSError:
+                self._dir_mtime = None
+            if added:
+                self._on_change()
+            return skill
+
+    def get(self, name: str) -> Optional[Skill]:
+        self._refresh()
+        return self._skills.get(name)
+
+    def __contains__(self, name: str) -> bool:
+        self._refresh()
+        return name in self._skills
+
+    def all(self) -> List[Skill]:
+        self._refresh()
+        return [self._skills[name] for name in sorted(self._skills)]
+
+    def list(self) -> List[Dict[str, str]]:
+        return [skill.summary() for skill in self.all()]
+
+    def _term_matches(self, term: str) -> Set[str]:
+        if _TOKEN_RE.fullmatch(term):
+            # A term without separators occurs in the text only inside a
+            # single token, so the vocabulary is enough to find it.
+            exact = self._index.get(term)
+            names: Set[str] = set(exact) if exact else set()
+            for token, postings in self._index.items():
+                if term in token and token != term:
+                    names |= postings
+            return names
+        return {name for name, skill in self._skills.items() if term in skill.lower or term in f"{name.lower()}.md"}
+
+    def search(self, query: str) -> List[Dict[str, str]]:
+        """Return skills whose content or name contains every query term."""
+        self._refresh()
+        terms = query.lower().strip().split()
+        if not terms:
+            return []
+        with self._lock:
+            names: Optional[Set[str]] = None
+            for term in sorted(terms, key=len, reverse=True):
+                matched = self._term_matches(term)
+                names = matched if names is None else names & matched
+                if not names:
+                    return []
+            return [self._skills[name].summary() for name in sorted(names)]
+
+    def match_prompt(self, prompt: str) -> List[Skill]:
+        """Return the skills whose name (or a variant of it) appears in prompt."""
+        self._refresh()
+        with self._lock:
+            if self._matcher is None:
+                self._matcher = AhoCorasick(
+                    (variant, name) for name in self._skills for variant in name_variants(name)
+                )
+            matcher = self._matcher
+            names = matcher.find(prompt.lower())
+            return [self._skills[name] for name in sorted(names) if name in self._skills]
+
+
+_WORDS = (
+    "weather time price crypto token stock music spotify github discord server user profile "
+    "credits balance image search wiki translate reminder timer calendar news score game "
+    "minecraft steam twitch youtube video anime manga recipe movie book quote joke meme "
+    "rotur account badge friend post feed market item shop gift"
+).split()
+
+_PROMPTS = (
+    "hey roturbot can you check the weather in london for tomorrow",
+    "whats the price of bitcoin rn lol",
+    "@roturbot play something on spotify pls",
+    "how many credits do i have, and can you send 5 to my friend",
+    "look up the github repo for rotur and tell me the latest commit",
+    "can u translate 'good morning' into japanese",
+    "remind me in 10 minutes to check the minecraft server",
+    "who has the most badges on rotur right now?",
+    "tell me a joke about cats and then search youtube for lofi",
+    "what's trending on the market today, any good items in the shop",
+)
+
+
+def _synthetic_skill_names(count: int, rng: random.Random) -> List[str]:
+    names = set()
+    while len(names) < count:
+        parts = rng.sample(_WORDS, rng.choice((1, 2, 2, 3)))
+        names.add(rng.choice(("_", "-")).join(parts) + ("" if rng.random() < 0.7 else str(rng.randrange(100))))
+    return sorted(names)
+
+
+def _naive_match(names: List[str], prompt: str) -> Set[str]:
+    """The per-skill substring checks the automaton replaced."""
+    prompt_lower = prompt.lower()
+    matched = set()
+    for name in names:
+        skill_name = name.lower()
+        spaced = skill_name.replace("_", " ").replace("-", " ")
+        first_word = skill_name.split("_")[0].split("-")[0]
+        if (skill_name in prompt_lower or skill_name + "s" in prompt_lower or spaced in prompt_lower
+                or (len(first_word) >= 4 and first_word in prompt_lower)):
+            matched.add(name)
+    return matched
+
+
+def benchmark(skills: int = 1000, rounds: int = 200) -> Dict[str, float]:
+    """Compare the automaton against per-skill substring checks on Discord-style prompts."""
+    rng = random.Random(0)
+    names = _synthetic_skill_names(skills, rng)
+    prompts = list(_PROMPTS)
+
+    start = time.perf_counter()
+    matcher = AhoCorasick((variant, name) for name in names for variant in name_variants(name))
+    build_ms = (time.perf_counter() - start) * 1000
+
+    for prompt in prompts:
+        assert matcher.find(prompt.lower()) == _naive_match(names, prompt), prompt
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for prompt in prompts:
+            _naive_match(names, prompt)
+    naive_us = (time.perf_counter() - start) / (rounds * len(prompts)) * 1e6
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for prompt in prompts:
+            matcher.find(prompt.lower())
+    automaton_us = (time.perf_counter() - start) / (rounds * len(prompts)) * 1e6
+
+    return {
+        "skills": skills,
+        "build_ms": round(build_ms, 2),
+        "naive_us_per_prompt": round(naive_us, 1),
+        "automaton_us_per_prompt": round(automaton_us, 1),
+    }
+
+
+if __name__ == "__main__":
+    print(benchmark())
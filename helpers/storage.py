@@ -0,0 +1,752 @@
+"""
+SQLite storage layer for roturbot
+One WAL-mode database (store/roturbot.db) replaces the loose store/*.json
+files and the per-guild memory files. Each kind of state gets a small
+repository so updates are row-level writes.
+
+Run `python helpers/storage.py migrate` to import the legacy JSON files;
+this also happens automatically the first time the database is opened.
+"""
+
+import os
+import sys
+import time
+import sqlite3
+import threading
+from array import array
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    from . import json_codec
+except ImportError:  # run as a script
+    import json_codec
+
+_MODULE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STORE_DIR = os.path.join(_MODULE_DIR, "store")
+DB_FILE = os.path.join(STORE_DIR, "roturbot.db")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS reaction_stats (
+    link TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS daily_credits (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    date TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    amount REAL NOT NULL,
+    voided INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS daily_credits_date ON daily_credits (date);
+CREATE TABLE IF NOT EXISTS user_xp (
+    user_id TEXT PRIMARY KEY,
+    xp INTEGER NOT NULL,
+    total_messages INTEGER NOT NULL,
+    last_xp_time REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS user_flags (
+    flag TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    PRIMARY KEY (flag, user_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS user_personalities (
+    user_id TEXT PRIMARY KEY,
+    personality TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS message_markers (
+    kind TEXT NOT NULL,
+    marker TEXT NOT NULL,
+    PRIMARY KEY (kind, marker)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS counting_channels (
+    channel_id TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS counting_users (
+    channel_id TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    counts INTEGER NOT NULL,
+    fails INTEGER NOT NULL,
+    wrong_attempts INTEGER NOT NULL,
+    last_seen INTEGER NOT NULL,
+    PRIMARY KEY (channel_id, user_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS counting_events (
+    seq INTEGER PRIMARY KEY,
+    event TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS icon_cache (
+    icon_hash TEXT PRIMARY KEY,
+    emoji_id TEXT NOT NULL,
+    last_used INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS memory_guilds (
+    guild_id TEXT PRIMARY KEY,
+    version INTEGER NOT NULL,
+    embedder TEXT,
+    next_expiry REAL
+);
+CREATE TABLE IF NOT EXISTS memories (
+    guild_id TEXT NOT NULL,
+    id TEXT NOT NULL,
+    data TEXT NOT NULL,
+    embedding BLOB,
+    PRIMARY KEY (guild_id, id)
+);
+"""
+
+# user_flags.flag values
+FLAG_DAILY_CREDIT_DM = "daily_credit_dm_optin"
+FLAG_ACTIVITY_EXCLUDED = "activity_exclusion"
+FLAG_LEVELUP_OPTOUT = "levelup_message_optout"
+
+# message_markers.kind values
+MARKER_ROTURBOARDED = "roturboarded"
+MARKER_SHUSHED = "shushed"
+
+
+class Database:
+    """Thread-safe wrapper around a single SQLite connection in WAL mode."""
+
+    def __init__(self, path: str = DB_FILE):
+        self.path = path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+        self.reactions = ReactionStatsRepo(self)
+        self.daily_credits = DailyCreditsRepo(self)
+        self.xp = UserXPRepo(self)
+        self.flags = UserFlagsRepo(self)
+        self.personalities = UserPersonalitiesRepo(self)
+        self.markers = MessageMarkersRepo(self)
+        self.counting = CountingRepo(self)
+        self.icons = IconCacheRepo(self)
+        self.memories = MemoriesRepo(self)
+
+    def execute(self, sql: str, params: Iterable[Any] = ()) -> List[tuple]:
+        with self._lock:
+            return self._conn.execute(sql, tuple(params)).fetchall()
+
+    def executemany(self, sql: str, rows: Iterable[Iterable[Any]]) -> None:
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(sql, rows)
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def transaction(self, immediate: bool = False):
+        """Context manager yielding the connection inside BEGIN/COMMIT.
+
+        immediate=True takes the write lock up front (waiting for other
+        processes' writers), so reads inside see the state being replaced.
+        """
+        return _Transaction(self, immediate)
+
+    def get_meta(self, key: str) -> Optional[str]:
+        rows = self.execute("SELECT value FROM meta WHERE key = ?", (key,))
+        return rows[0][0] if rows else None
+
+    def set_meta(self, key: str, value: str) -> None:
+        self.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class _Transaction:
+    def __init__(self, db: Database, immediate: bool = False):
+        self.db = db
+        self.immediate = immediate
+
+    def __enter__(self) -> sqlite3.Connection:
+        self.db._lock.acquire()
+        try:
+            self.db._conn.execute("BEGIN IMMEDIATE" if self.immediate else "BEGIN")
+        except BaseException:
+            self.db._lock.release()
+            raise
+        return self.db._conn
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            self.db._conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        finally:
+            self.db._lock.release()
+        return False
+
+
+class ReactionStatsRepo:
+    """Per-message reaction counts keyed by "<channel_id>/<message_id>"."""
+
+    def __init__(self, db: Database):
+        self.db = db
+
+    def load_all(self) -> Dict[str, Dict[str, Any]]:
+        return {link: json_codec.loads(data) for link, data in self.db.execute("SELECT link, data FROM reaction_stats")}
+
+    def upsert_many(self, entries: Dict[str, Dict[str, Any]]) -> None:
+        self.db.executemany(
+            "INSERT OR REPLACE INTO reaction_stats (link, data) VALUES (?, ?)",
+            ((link, json_codec.dumps(entry)) for link, entry in entries.items()),
+        )
+
+    def replace_all(self, entries: Dict[str, Dict[str, Any]]) -> None:
+        with self.db.transaction() as conn:
+            conn.execute("DELETE FROM reaction_stats")
+            conn.executemany(
+                "INSERT INTO reaction_stats (link, data) VALUES (?, ?)",
+                ((link, json_codec.dumps(entry)) for link, entry in entries.items()),
+            )
+
+
+class DailyCreditsRepo:
+    """One row per daily credit award. A same-day reset voids earlier rows."""
+
+    def __init__(self, db: Database):
+        self.db = db
+
+    def record(self, date: str, user_id: str, amount: float) -> None:
+        self.db.execute(
+            "INSERT INTO daily_credits (date, user_id, amount) VALUES (?, ?, ?)",
+            (date, user_id, float(amount)),
+        )
+
+    def void_day(self, date: str) -> None:
+        self.db.execute("UPDATE daily_credits SET voided = 1 WHERE date = ?", (date,))
+
+    def active_for_day(self, date: str) -> Dict[str, float]:
+        rows = self.db.execute(
+            "SELECT user_id, amount FROM daily_credits WHERE date = ? AND voided = 0 ORDER BY id",
+            (date,),
+        )
+        return {user_id: amount for user_id, amount in rows}
+
+    def summary(self, date: str) -> Optional[Tuple[int, float]]:
+        """Return (distinct users, total credits) for a day, leaving out voided awards."""
+        rows = self.db.execute(
+            "SELECT COUNT(DISTINCT user_id), COALESCE(SUM(amount), 0), COUNT(*) FROM daily_credits "
+            "WHERE date = ? AND voided = 0",
+            (date,),
+        )
+        users, total, count = rows[0]
+        if count == 0:
+            return None
+        return users, total
+
+    def recent_dates(self, limit: int) -> List[str]:
+        rows = self.db.execute(
+            "SELECT DISTINCT date FROM daily_credits WHERE voided = 0 ORDER BY date DESC LIMIT ?",
+            (limit,),
+        )
+        return [row[0] for row in rows]
+
+
+class UserXPRepo:
+    def __init__(self, db: Database):
+        self.db = db
+
+    def load_all(self) -> List[Tuple[str, int, int, float]]:
+        return self.db.execute("SELECT user_id, xp, total_messages, last_xp_time FROM user_xp")
+
+    def upsert_many(self, rows: Iterable[Tuple[str, int, int, float]]) -> None:
+        self.db.executemany(
+            "INSERT OR REPLACE INTO user_xp (user_id, xp, total_messages, last_xp_time) VALUES (?, ?, ?, ?)",
+            rows,
+        )
+
+    def replace_all(self, rows: Iterable[Tuple[str, int, int, float]]) -> None:
+        with self.db.transaction() as conn:
+            conn.execute("DELETE FROM user_xp")
+            conn.executemany(
+                "INSERT INTO user_xp (user_id, xp, total_messages, last_xp_time) VALUES (?, ?, ?, ?)",
+                rows,
+            )
+
+
+class UserFlagsRepo:
+    """Named per-user boolean preferences (opt-ins, opt-outs, exclusions)."""
+
+    def __init__(self, db: Database):
+        self.db = db
+
+    def members(self, flag: str) -> Set[str]:
+        return {row[0] for row in self.db.execute("SELECT user_id FROM user_flags WHERE flag = ?", (flag,))}
+
+    def has(self, flag: str, user_id: str) -> bool:
+        return bool(self.db.execute(
+            "SELECT 1 FROM user_flags WHERE flag = ? AND user_id = ?", (flag, user_id)
+        ))
+
+    def set(self, flag: str, user_id: str, enabled: bool) -> None:
+        if enabled:
+            self.db.execute("INSERT OR IGNORE INTO user_flags (flag, user_id) VALUES (?, ?)", (flag, user_id))
+        else:
+            self.db.execute("DELETE FROM user_flags WHERE flag = ? AND user_id = ?", (flag, user_id))
+
+    def toggle(self, flag: str, user_id: str) -> bool:
+        """Flip a flag and return its new value."""
+        with self.db.transaction() as conn:
+            deleted = conn.execute(
+                "DELETE FROM user_flags WHERE flag = ? AND user_id = ?", (flag, user_id)
+            ).rowcount
+            if deleted:
+                return False
+            conn.execute("INSERT INTO user_flags (flag, user_id) VALUES (?, ?)", (flag, user_id))
+            return True
+
+
+class UserPersonalitiesRepo:
+    def __init__(self, db: Database):
+        self.db = db
+
+    def load_all(self) -> Dict[str, str]:
+        return dict(self.db.execute("SELECT user_id, personality FROM user_personalities"))
+
+    def get(self, user_id: str) -> Optional[str]:
+        rows = self.db.execute("SELECT personality FROM user_personalities WHERE user_id = ?", (user_id,))
+        return rows[0][0] if rows else None
+
+    def set(self, user_id: str, personality: str) -> None:
+        self.db.execute(
+            "INSERT OR REPLACE INTO user_personalities (user_id, personality) VALUES (?, ?)",
+            (user_id, personality),
+        )
+
+
+class MessageMarkersRepo:
+    """Sets of message ids that have already been handled (roturboard, shush)."""
+
+    def __init__(self, db: Database):
+        self.db = db
+
+    def add(self, kind: str, marker: str) -> bool:
+        """Record a marker. Returns False if it was already present."""
+        with self.db.transaction() as conn:
+            return conn.execute(
+                "INSERT OR IGNORE INTO message_markers (kind, marker) VALUES (?, ?)", (kind, marker)
+            ).rowcount == 1
+
+    def has(self, kind: str, marker: str) -> bool:
+        return bool(self.db.execute(
+            "SELECT 1 FROM message_markers WHERE kind = ? AND marker = ?", (kind, marker)
+        ))
+
+
+class CountingRepo:
+    """Counting game snapshot rows plus the append-only event log."""
+
+    def __init__(self, db: Database):
+        self.db = db
+
+    def load_snapshot(self) -> Tuple[Dict[str, Dict[str, Any]], int]:
+        channels: Dict[str, Dict[str, Any]] = {}
+        for channel_id, data in self.db.execute("SELECT channel_id, data FROM counting_channels"):
+            state = json_codec.loads(data)
+            state["users"] = {}
+            channels[channel_id] = state
+        for channel_id, user_id, counts, fails, wrong, last_seen in self.db.execute(
+            "SELECT channel_id, user_id, counts, fails, wrong_attempts, last_seen FROM counting_users"
+        ):
+            channels.setdefault(channel_id, {"users": {}})["users"][user_id] = {
+                "counts": counts,
+                "fails": fails,
+                "wrong_attempts": wrong,
+                "last_seen": last_seen,
+            }
+        seq = int(self.db.get_meta("counting_seq") or 0)
+        return channels, seq
+
+    def events_after(self, seq: int) -> List[Tuple[int, Dict[str, Any]]]:
+        rows = self.db.execute("SELECT seq, event FROM counting_events WHERE seq > ? ORDER BY seq", (seq,))
+        return [(row_seq, json_codec.loads(event)) for row_seq, event in rows]
+
+    def append_event(self, seq: int, event: Dict[str, Any]) -> None:
+        self.db.execute(
+            "INSERT OR REPLACE INTO counting_events (seq, event) VALUES (?, ?)",
+            (seq, json_codec.dumps(event)),
+        )
+
+    def compact(self, channels: Dict[str, Dict[str, Any]], dirty_users: Iterable[Tuple[str, str]], seq: int) -> None:
+        """Write channel rows and changed user rows, then drop events up to seq, atomically."""
+        with self.db.transaction() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO counting_channels (channel_id, data) VALUES (?, ?)",
+                (
+                    (channel_id, json_codec.dumps({k: v for k, v in state.items() if k != "users"}))
+                    for channel_id, state in channels.items()
+                ),
+            )
+            user_rows = []
+            for channel_id, user_id in dirty_users:
+                stats = channels.get(channel_id, {}).get("users", {}).get(user_id)
+                if stats is not None:
+                    user_rows.append((
+                        channel_id, user_id,
+                        stats.get("counts", 0), stats.get("fails", 0),
+                        stats.get("wrong_attempts", 0), stats.get("last_seen", 0),
+                    ))
+            conn.executemany(
+                "INSERT OR REPLACE INTO counting_users "
+                "(channel_id, user_id, counts, fails, wrong_attempts, last_seen) VALUES (?, ?, ?, ?, ?, ?)",
+                user_rows,
+            )
+            conn.execute("DELETE FROM counting_events WHERE seq <= ?", (seq,))
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('counting_seq', ?)", (str(seq),))
+
+
+class IconCacheRepo:
+    def __init__(self, db: Database):
+        self.db = db
+
+    def load_all(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            icon_hash: {"id": emoji_id, "last_used": last_used}
+            for icon_hash, emoji_id, last_used in self.db.execute(
+                "SELECT icon_hash, emoji_id, last_used FROM icon_cache"
+            )
+        }
+
+    def upsert_many(self, entries: Dict[str, Dict[str, Any]]) -> None:
+        self.db.executemany(
+            "INSERT OR REPLACE INTO icon_cache (icon_hash, emoji_id, last_used) VALUES (?, ?, ?)",
+            (
+                (icon_hash, str(entry.get("id")), int(entry.get("last_used", 0)))
+                for icon_hash, entry in entries.items()
+            ),
+        )
+
+    def delete(self, icon_hash: str) -> None:
+        self.db.execute("DELETE FROM icon_cache WHERE icon_hash = ?", (icon_hash,))
+
+
+class MemoriesRepo:
+    """Per-guild AI memories (see memory_system).
+
+    One row per memory, its embedding stored as a float32 blob, plus a
+    per-guild version that every write bumps and the guild's earliest
+    expiry. Write methods take the connection of an open transaction.
+    """
+
+    def __init__(self, db: Database):
+        self.db = db
+
+    def guild_ids(self) -> List[str]:
+        return [row[0] for row in self.db.execute("SELECT guild_id FROM memory_guilds")]
+
+    def expiry_index(self) -> Dict[str, Optional[float]]:
+        """{guild_id: earliest expiry} for every stored guild; None when nothing in it expires."""
+        return dict(self.db.execute("SELECT guild_id, next_expiry FROM memory_guilds"))
+
+    def version(self, guild_id: str, conn: Optional[sqlite3.Connection] = None) -> int:
+        sql, params = "SELECT version FROM memory_guilds WHERE guild_id = ?", (guild_id,)
+        rows = conn.execute(sql, params).fetchall() if conn is not None else self.db.execute(sql, params)
+        return rows[0][0] if rows else 0
+
+    def load(self, guild_id: str, conn: Optional[sqlite3.Connection] = None
+             ) -> Tuple[int, Optional[str], List[Tuple[str, Optional[bytes]]]]:
+        """Return (version, embedder tag, [(data, embedding blob)]) as of one moment."""
+        if conn is None:
+            with self.db.transaction() as conn:
+                return self.load(guild_id, conn)
+        meta = conn.execute(
+            "SELECT version, embedder FROM memory_guilds WHERE guild_id = ?", (guild_id,)
+        ).fetchall()
+        rows = conn.execute(
+            "SELECT data, embedding FROM memories WHERE guild_id = ? ORDER BY rowid", (guild_id,)
+        ).fetchall()
+        version, embedder = meta[0] if meta else (0, None)
+        return version, embedder, rows
+
+    def write(self, conn: sqlite3.Connection, guild_id: str, version: int, embedder: str,
+              next_expiry: Optional[float], rows: Iterable[Tuple[str, str, Optional[bytes]]],
+              removed: Iterable[str]) -> None:
+        """Store (id, data, embedding) rows and drop removed ids. Unchanged rows are not rewritten."""
+        conn.executemany(
+            "DELETE FROM memories WHERE guild_id = ? AND id = ?",
+            ((guild_id, memory_id) for memory_id in removed),
+        )
+        conn.executemany(
+            "INSERT INTO memories (guild_id, id, data, embedding) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (guild_id, id) DO UPDATE SET data = excluded.data, embedding = excluded.embedding "
+            "WHERE data IS NOT excluded.data OR embedding IS NOT excluded.embedding",
+            ((guild_id, memory_id, data, blob) for memory_id, data, blob in rows),
+        )
+        conn.execute(
+            "INSERT OR REPLACE INTO memory_guilds (guild_id, version, embedder, next_expiry) VALUES (?, ?, ?, ?)",
+            (guild_id, version, embedder, next_expiry),
+        )
+
+
+def _read_json(path: str, default: Any) -> Any:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json_codec.load(f)
+    except (FileNotFoundError, json_codec.JSONDecodeError):
+        return default
+    return data if isinstance(data, type(default)) else default
+
+
+def _legacy_embeddings(npy_path: str, memories: List[Dict[str, Any]]) -> List[Optional[bytes]]:
+    """float32 blobs for a legacy guild: its .npy sidecar, else the inline vectors."""
+    if np is not None and os.path.exists(npy_path):
+        try:
+            matrix = np.load(npy_path, allow_pickle=False)
+            if matrix.ndim == 2 and matrix.shape[0] == len(memories):
+                return [row.astype(np.float32).tobytes() for row in matrix]
+        except (OSError, ValueError):
+            pass
+    blobs = []
+    for memory in memories:
+        vector = memory.get("embedding")
+        blobs.append(array("f", vector).tobytes() if isinstance(vector, list) and vector else None)
+    return blobs
+
+
+def _legacy_next_expiry(memories: List[Dict[str, Any]]) -> Optional[float]:
+    """Earliest expiry among legacy memories ('expires_ts', else the ISO 'expires_at'), or None."""
+    earliest = None
+    for memory in memories:
+        ts = memory.get("expires_ts")
+        if ts is None:
+            try:
+                ts = datetime.fromisoformat(memory["expires_at"]).timestamp()
+            except (KeyError, TypeError, ValueError):
+                continue
+        if earliest is None or ts < earliest:
+            earliest = ts
+    return earliest
+
+
+def migrate_memories(db: Database, memories_dir: str) -> int:
+    """Import legacy store/memories/<guild>.json (+ .npy) files; guilds already stored are skipped."""
+    known = set(db.memories.guild_ids())
+    imported = 0
+    filenames = sorted(os.listdir(memories_dir)) if os.path.isdir(memories_dir) else []
+    for filename in filenames:
+        if not filename.endswith(".json") or filename.startswith("_"):
+            continue
+        guild_id = filename[:-5]
+        if guild_id in known:
+            continue
+        data = _read_json(os.path.join(memories_dir, filename), {})
+        memories = [m for m in data.get("memories") or [] if isinstance(m, dict) and m.get("id")]
+        blobs = _legacy_embeddings(os.path.join(memories_dir, f"{guild_id}.npy"), memories)
+        rows = [
+            (m["id"], json_codec.dumps({k: v for k, v in m.items() if k != "embedding"}), blob)
+            for m, blob in zip(memories, blobs)
+        ]
+        with db.transaction() as conn:
+            db.memories.write(conn, guild_id, 1, data.get("embedder"), _legacy_next_expiry(memories), rows, ())
+        imported += len(rows)
+    db.set_meta("memories_migrated_at", str(int(time.time())))
+    return imported
+
+
+def migrate_json_store(db: Database, store_dir: Optional[str] = None) -> Dict[str, int]:
+    """Import the legacy store/*.json files into the database.
+
+    The JSON files are left in place as a backup. Returns the number of
+    rows imported per source. Memories come from store/memories/.
+
+    Safe to run again (migrate --force): rows already in the database are
+    never overwritten, days that already have daily credit rows are
+    skipped, and the counting state is only imported into an empty table.
+    """
+    store_dir = store_dir or STORE_DIR
+    counts: Dict[str, int] = {}
+
+    reactions = _read_json(os.path.join(store_dir, "reaction_stats.json"), {})
+    reactions = {link: entry for link, entry in reactions.items() if isinstance(entry, dict)}
+    db.executemany(
+        "INSERT OR IGNORE INTO reaction_stats (link, data) VALUES (?, ?)",
+        ((link, json_codec.dumps(entry)) for link, entry in reactions.items()),
+    )
+    counts["reaction_stats"] = len(reactions)
+
+    credits = 0
+    known_dates = {row[0] for row in db.execute("SELECT DISTINCT date FROM daily_credits")}
+    activity = _read_json(os.path.join(store_dir, "daily_activity.json"), {})
+    if activity.get("date") and activity["date"] not in known_dates:
+        for user_id, amount in (activity.get("users") or {}).items():
+            db.daily_credits.record(activity["date"], str(user_id), float(amount or 0))
+            credits += 1
+    journal_dir = os.path.join(store_dir, "daily_activity")
+    if os.path.isdir(journal_dir):
+        for filename in sorted(os.listdir(journal_dir)):
+            if not filename.endswith(".jsonl"):
+                continue
+            date = filename[:-6]
+            if date in known_dates:
+                continue
+            if date == activity.get("date"):
+                db.daily_credits.void_day(date)
+            with open(os.path.join(journal_dir, filename), "r") as f:
+                for line in f:
+                    try:
+                        record = json_codec.loads(line)
+                    except json_codec.JSONDecodeError:
+                        continue
+                    if record.get("reset"):
+                        db.daily_credits.void_day(date)
+                    elif record.get("user"):
+                        db.daily_credits.record(date, str(record["user"]), float(record.get("amount", 0) or 0))
+                        credits += 1
+    counts["daily_credits"] = credits
+
+    xp = _read_json(os.path.join(store_dir, "user_xp.json"), {})
+    xp_rows = [
+        (str(uid), int(entry.get("xp", 0)), int(entry.get("total_messages", 0)), float(entry.get("last_xp_time", 0)))
+        for uid, entry in xp.items() if isinstance(entry, dict)
+    ]
+    db.executemany(
+        "INSERT OR IGNORE INTO user_xp (user_id, xp, total_messages, last_xp_time) VALUES (?, ?, ?, ?)",
+        xp_rows,
+    )
+    counts["user_xp"] = len(xp_rows)
+
+    for flag, filename in (
+        (FLAG_DAILY_CREDIT_DM, "daily_credit_dm_optins.json"),
+        (FLAG_ACTIVITY_EXCLUDED, "activity_exclusions.json"),
+        (FLAG_LEVELUP_OPTOUT, "levelup_message_optouts.json"),
+    ):
+        users = _read_json(os.path.join(store_dir, filename), [])
+        db.executemany(
+            "INSERT OR IGNORE INTO user_flags (flag, user_id) VALUES (?, ?)",
+            ((flag, str(uid)) for uid in users),
+        )
+        counts[flag] = len(users)
+
+    personalities = _read_json(os.path.join(store_dir, "user_personalities.json"), {})
+    db.executemany(
+        "INSERT OR IGNORE INTO user_personalities (user_id, personality) VALUES (?, ?)",
+        ((str(uid), str(name)) for uid, name in personalities.items()),
+    )
+    counts["user_personalities"] = len(personalities)
+
+    for kind, filename in ((MARKER_ROTURBOARDED, "roturboarded.json"), (MARKER_SHUSHED, "shushes.json")):
+        markers = _read_json(os.path.join(store_dir, filename), [])
+        db.executemany(
+            "INSERT OR IGNORE INTO message_markers (kind, marker) VALUES (?, ?)",
+            ((kind, str(marker)) for marker in markers),
+        )
+        counts[kind] = len(markers)
+
+    # The snapshot and its log only make sense together, and the live
+    # state must not be rolled back to them.
+    counting_started = bool(
+        db.execute("SELECT 1 FROM counting_channels LIMIT 1")
+        or db.execute("SELECT 1 FROM counting_events LIMIT 1")
+    )
+    counting = {} if counting_started else _read_json(os.path.join(store_dir, "counting_state.json"), {})
+    seq = 0
+    if isinstance(counting.get("channels"), dict):
+        seq = int(counting.get("seq", 0))
+        counting = counting["channels"]
+    channels = {cid: state for cid, state in counting.items() if isinstance(state, dict)}
+    if not counting_started:
+        dirty_users = [(cid, uid) for cid, state in channels.items() for uid in (state.get("users") or {})]
+        db.counting.compact(channels, dirty_users, seq)
+    events = 0
+    log_path = os.path.join(store_dir, "counting_state.log")
+    if not counting_started and os.path.exists(log_path):
+        with open(log_path, "r") as f:
+            for line in f:
+                try:
+                    event = json_codec.loads(line)
+                except json_codec.JSONDecodeError:
+                    continue
+                if event.get("seq", 0) > seq:
+                    db.counting.append_event(event["seq"], event)
+                    events += 1
+    counts["counting_channels"] = len(channels)
+    counts["counting_events"] = events
+
+    icons = _read_json(os.path.join(store_dir, "icon_cache.json"), {})
+    icon_entries = {}
+    for icon_hash, entry in icons.items():
+        if isinstance(entry, str):
+            icon_entries[icon_hash] = {"id": entry, "last_used": 0}
+        elif isinstance(entry, dict) and entry.get("id"):
+            icon_entries[icon_hash] = entry
+    db.executemany(
+        "INSERT OR IGNORE INTO icon_cache (icon_hash, emoji_id, last_used) VALUES (?, ?, ?)",
+        (
+            (icon_hash, str(entry.get("id")), int(entry.get("last_used", 0)))
+            for icon_hash, entry in icon_entries.items()
+        ),
+    )
+    counts["icon_cache"] = len(icon_entries)
+
+    counts["memories"] = migrate_memories(db, os.path.join(store_dir, "memories"))
+
+    db.set_meta("json_migrated_at", str(int(time.time())))
+    return counts
+
+
+_db: Optional[Database] = None
+_db_lock = threading.Lock()
+
+
+def get_db() -> Database:
+    """Return the shared database, importing legacy JSON files on first open."""
+    global _db
+    with _db_lock:
+        if _db is None:
+            db = Database(DB_FILE)
+            if db.get_meta("json_migrated_at") is None:
+                counts = migrate_json_store(db)
+                print(f"[storage] Imported legacy JSON store: {counts}")
+            elif db.get_meta("memories_migrated_at") is None:
+                # Databases created before memories moved here
+                count = migrate_memories(db, os.path.join(STORE_DIR, "memories"))
+                print(f"[storage] Imported legacy memories: {count}")
+            _db = db
+        return _db
+
+
+def connect() -> Database:
+    """Open another connection to the shared database (after the legacy import).
+
+    For callers that write from worker threads and must not hold the
+    shared connection's lock while they wait for other processes.
+    """
+    get_db()
+    return Database(DB_FILE)
+
+
+def close_db() -> None:
+    global _db
+    with _db_lock:
+        if _db is not None:
+            _db.close()
+            _db = None
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "migrate":
+        print("Usage: python storage.py migrate [--force]")
+        sys.exit(1)
+    database = Database(DB_FILE)
+    if database.get_meta("json_migrated_at") is not None and "--force" not in sys.argv:
+        print("Legacy JSON store already imported; pass --force to import again.")
+        sys.exit(0)
+    print(migrate_json_store(database))
+    database.close()
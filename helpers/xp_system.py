@@ -1,26 +1,294 @@
 """
 XP and Leveling System for roturbot
 This module handles all XP tracking, level calculations, and related functionality.
+
+XP records live in memory once loaded. Awards only touch the in-memory
+record; the changed rows are written to the user_xp table in batches by a
+background flush (see FLUSH_INTERVAL) and on shutdown via flush().
 """
 
-import os
-import json
 import math
+import time
+import asyncio
+import tempfile
+from bisect import bisect_left, insort
 
-_MODULE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+try:
+    from .storage import Database, get_db
+    from .preferences import user_preferences, FLAG_LEVELUP_OPTOUT
+except ImportError:  # run as a script
+    from storage import Database, get_db
+    from preferences import user_preferences, FLAG_LEVELUP_OPTOUT
 
-def load_user_xp_data():
-    """Load user XP data from the store"""
+XP_COOLDOWN = 20
+# Seconds between batched writes of changed XP rows while there are unsaved changes.
+FLUSH_INTERVAL = 30.0
+
+
+class XPRecord:
+    """Compact per-user XP record. The level is derived from xp."""
+
+    __slots__ = ("xp", "total_messages", "last_xp_time")
+
+    def __init__(self, xp=0, total_messages=0, last_xp_time=0.0):
+        self.xp = xp
+        self.total_messages = total_messages
+        self.last_xp_time = last_xp_time
+
+    @property
+    def level(self):
+        return calculate_level(self.xp)
+
+    def to_dict(self):
+        return {
+            "xp": self.xp,
+            "level": self.level,
+            "total_messages": self.total_messages,
+            "last_xp_time": self.last_xp_time,
+        }
+
+
+class RankIndex:
+    """Sorted multiset of (-xp, user_id) keys split into bounded chunks.
+
+    Inserts and removals only shift one chunk, so they stay cheap with a
+    million users. A Fenwick tree over the chunk sizes turns "how many keys
+    come before this chunk" into an O(log n) query, which gives rank lookups
+    and deep leaderboard pages without walking every chunk.
+    """
+
+    LOAD = 1000
+
+    def __init__(self, keys=()):
+        self._lists = []
+        self._maxes = []
+        keys = sorted(keys)
+        for i in range(0, len(keys), self.LOAD):
+            chunk = keys[i:i + self.LOAD]
+            self._lists.append(chunk)
+            self._maxes.append(chunk[-1])
+        self._len = len(keys)
+        self._rebuild_tree()
+
+    def __len__(self):
+        return self._len
+
+    def _rebuild_tree(self):
+        tree = [0] + [len(chunk) for chunk in self._lists]
+        for i in range(1, len(tree)):
+            parent = i + (i & -i)
+            if parent < len(tree):
+                tree[parent] += tree[i]
+        self._tree = tree
+
+    def _tree_add(self, pos, delta):
+        i = pos + 1
+        while i < len(self._tree):
+            self._tree[i] += delta
+            i += i & -i
+
+    def _tree_prefix(self, pos):
+        """Number of keys in the chunks before pos."""
+        total = 0
+        i = pos
+        while i > 0:
+            total += self._tree[i]
+            i -= i & -i
+        return total
+
+    def _tree_locate(self, offset):
+        """Return (chunk, index within chunk) for a 0-based offset."""
+        pos = 0
+        step = 1 << (len(self._tree).bit_length())
+        while step:
+            nxt = pos + step
+            if nxt < len(self._tree) and self._tree[nxt] <= offset:
+                pos = nxt
+                offset -= self._tree[nxt]
+            step >>= 1
+        return pos, offset
+
+    def add(self, key):
+        self._len += 1
+        if not self._lists:
+            self._lists.append([key])
+            self._maxes.append(key)
+            self._rebuild_tree()
+            return
+        pos = bisect_left(self._maxes, key)
+        if pos == len(self._maxes):
+            pos -= 1
+            self._lists[pos].append(key)
+            self._maxes[pos] = key
+        else:
+            insort(self._lists[pos], key)
+        if len(self._lists[pos]) > self.LOAD * 2:
+            chunk = self._lists[pos]
+            half = len(chunk) // 2
+            self._lists[pos:pos + 1] = [chunk[:half], chunk[half:]]
+            self._maxes[pos:pos + 1] = [chunk[half - 1], chunk[-1]]
+            self._rebuild_tree()
+        else:
+            self._tree_add(pos, 1)
+
+    def remove(self, key):
+        pos = bisect_left(self._maxes, key)
+        if pos == len(self._maxes):
+            return False
+        chunk = self._lists[pos]
+        i = bisect_left(chunk, key)
+        if i == len(chunk) or chunk[i] != key:
+            return False
+        del chunk[i]
+        self._len -= 1
+        if chunk:
+            self._maxes[pos] = chunk[-1]
+            self._tree_add(pos, -1)
+        else:
+            del self._lists[pos]
+            del self._maxes[pos]
+            self._rebuild_tree()
+        return True
+
+    def rank(self, key):
+        """Return the 0-based position of key, or None if it is absent."""
+        pos = bisect_left(self._maxes, key)
+        if pos == len(self._maxes):
+            return None
+        chunk = self._lists[pos]
+        i = bisect_left(chunk, key)
+        if i == len(chunk) or chunk[i] != key:
+            return None
+        return self._tree_prefix(pos) + i
+
+    def slice(self, offset, limit):
+        """Return up to limit keys starting at the 0-based offset."""
+        if offset >= self._len or limit <= 0:
+            return []
+        pos, i = self._tree_locate(offset)
+        result = []
+        while pos < len(self._lists) and len(result) < limit:
+            result.extend(self._lists[pos][i:i + limit - len(result)])
+            pos += 1
+            i = 0
+        return result
+
+
+_records = None
+_rank_index = None
+_dirty_ids = set()
+_replace_all = False
+_flush_task = None
+_repo = None
+
+
+def _get_repo():
+    global _repo
+    if _repo is None:
+        _repo = get_db().xp
+    return _repo
+
+def _get_records():
+    """Return the resident XP records, loading them on first use."""
+    global _records
+    if _records is None:
+        try:
+            rows = _get_repo().load_all()
+        except Exception as e:
+            print(f"Error loading XP data: {e}")
+            rows = []
+        _records = {
+            uid: XPRecord(xp, total_messages, last_xp_time)
+            for uid, xp, total_messages, last_xp_time in rows
+        }
+    return _records
+
+def _write_rows(rows, replace):
+    if replace:
+        _get_repo().replace_all(rows)
+    else:
+        _get_repo().upsert_many(rows)
+
+def _snapshot():
+    """Take the changed records as row tuples and clear the dirty set."""
+    global _replace_all
+    replace = _replace_all
+    ids = _records.keys() if replace else _dirty_ids
+    rows = [
+        (uid, record.xp, record.total_messages, record.last_xp_time)
+        for uid, record in ((uid, _records.get(uid)) for uid in ids)
+        if record is not None
+    ]
+    _dirty_ids.clear()
+    _replace_all = False
+    return rows, replace
+
+def _requeue(rows, replace):
+    global _replace_all
+    _replace_all = _replace_all or replace
+    _dirty_ids.update(row[0] for row in rows)
+
+def _mark_dirty(user_id=None):
+    global _flush_task, _replace_all
+    if user_id is None:
+        _replace_all = True
+    else:
+        _dirty_ids.add(user_id)
+    if _flush_task is not None and not _flush_task.done():
+        return
     try:
-        with open(os.path.join(_MODULE_DIR, "store", "user_xp.json"), "r") as f:
-            return json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        return {}
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        # Outside the bot's event loop there is nothing to batch with.
+        flush()
+        return
+    _flush_task = loop.create_task(_flush_later())
+
+async def _flush_later():
+    while True:
+        await asyncio.sleep(FLUSH_INTERVAL)
+        if _records is None or not (_dirty_ids or _replace_all):
+            return
+        rows, replace = _snapshot()
+        try:
+            await asyncio.to_thread(_write_rows, rows, replace)
+        except Exception as e:
+            print(f"Error saving XP data: {e}")
+            _requeue(rows, replace)
+
+def flush():
+    """Write any unsaved XP changes now. Returns True if a write happened."""
+    global _flush_task
+    if _flush_task is not None and not _flush_task.done():
+        try:
+            _flush_task.cancel()
+        except RuntimeError:
+            pass  # loop already closed
+    _flush_task = None
+    if _records is None or not (_dirty_ids or _replace_all):
+        return False
+    rows, replace = _snapshot()
+    try:
+        _write_rows(rows, replace)
+    except Exception as e:
+        print(f"Error saving XP data: {e}")
+        _requeue(rows, replace)
+        return False
+    return True
+
+def load_user_xp_data():
+    """Return a snapshot of all user XP data as plain dicts"""
+    return {uid: record.to_dict() for uid, record in _get_records().items()}
 
 def save_user_xp_data(data):
-    """Save user XP data to the store"""
-    with open(os.path.join(_MODULE_DIR, "store", "user_xp.json"), "w") as f:
-        json.dump(data, f, indent=2)
+    """Replace all user XP data and schedule a write"""
+    global _records, _rank_index
+    _rank_index = None
+    _records = {
+        uid: XPRecord(entry.get("xp", 0), entry.get("total_messages", 0), entry.get("last_xp_time", 0))
+        for uid, entry in data.items()
+    }
+    _mark_dirty()
 
 def calculate_level(xp):
     """Calculate level from total XP"""
@@ -32,79 +300,168 @@ def calculate_xp_for_level(level):
 
 def get_user_xp_stats(discord_id):
     """Get XP statistics for a user"""
-    data = load_user_xp_data()
-    user_id = str(discord_id)
-    
-    if user_id not in data:
+    record = _get_records().get(str(discord_id))
+    if record is None:
         return {"xp": 0, "level": 0, "total_messages": 0, "last_xp_time": 0}
-    
-    return data[user_id]
+    return record.to_dict()
 
-def award_xp(discord_id, xp_amount=15):
+def award_xp(discord_id, xp_amount=15, now=None):
     """
     Award XP to a user
     Returns None if on cooldown, or (old_level, new_level, new_xp, total_messages) if XP was awarded
     """
-    from datetime import datetime, timezone
-    
-    data = load_user_xp_data()
+    records = _get_records()
     user_id = str(discord_id)
-    
-    if user_id not in data:
-        data[user_id] = {"xp": 0, "level": 0, "total_messages": 0, "last_xp_time": 0}
-    
-    current_time = datetime.now(timezone.utc).timestamp()
-    if current_time - data[user_id].get("last_xp_time", 0) < 20:
-        data[user_id]["total_messages"] = data[user_id].get("total_messages", 0) + 1
-        save_user_xp_data(data)
+
+    record = records.get(user_id)
+    if record is None:
+        record = records[user_id] = XPRecord()
+
+    current_time = time.time() if now is None else now
+    record.total_messages += 1
+    if current_time - record.last_xp_time < XP_COOLDOWN:
+        _mark_dirty(user_id)
         return None
-    
-    old_xp = data[user_id].get("xp", 0)
-    old_level = calculate_level(old_xp)
-    
-    new_xp = old_xp + xp_amount
-    new_level = calculate_level(new_xp)
-    
-    data[user_id]["xp"] = new_xp
-    data[user_id]["level"] = new_level
-    data[user_id]["total_messages"] = data[user_id].get("total_messages", 0) + 1
-    data[user_id]["last_xp_time"] = current_time
-    
-    save_user_xp_data(data)
-    
-    return (old_level, new_level, new_xp, data[user_id]["total_messages"])
 
-def load_levelup_message_optouts():
-    """Load list of users who opted out of level-up messages"""
-    try:
-        with open(os.path.join(_MODULE_DIR, "store", "levelup_message_optouts.json"), "r") as f:
-            data = json.load(f)
-            if isinstance(data, list):
-                return data
-            return []
-    except (FileNotFoundError, json.JSONDecodeError):
-        return []
+    old_level = calculate_level(record.xp)
+    if _rank_index is not None:
+        _rank_index.remove((-record.xp, user_id))
+    record.xp += xp_amount
+    record.last_xp_time = current_time
+    if _rank_index is not None:
+        _rank_index.add((-record.xp, user_id))
+    _mark_dirty(user_id)
+
+    return (old_level, calculate_level(record.xp), record.xp, record.total_messages)
+
+def _get_rank_index():
+    global _rank_index
+    if _rank_index is None:
+        _rank_index = RankIndex((-record.xp, uid) for uid, record in _get_records().items())
+    return _rank_index
+
+def get_leaderboard(offset=0, limit=10):
+    """Return [(user_id, stats), ...] for a page of the XP leaderboard"""
+    records = _get_records()
+    return [(uid, records[uid].to_dict()) for _, uid in _get_rank_index().slice(offset, limit)]
+
+def get_user_rank(discord_id):
+    """Return the user's 1-based leaderboard position, or None if they have no XP record"""
+    user_id = str(discord_id)
+    record = _get_records().get(user_id)
+    if record is None:
+        return None
+    position = _get_rank_index().rank((-record.xp, user_id))
+    return None if position is None else position + 1
+
+def get_ranked_user_count():
+    return len(_get_rank_index())
 
-def save_levelup_message_optouts(optouts):
-    """Save list of users who opted out of level-up messages"""
-    with open(os.path.join(_MODULE_DIR, "store", "levelup_message_optouts.json"), "w") as f:
-        json.dump(optouts, f)
+def load_levelup_message_optouts():
+    """Return the ids of users who opted out of level-up messages"""
+    return sorted(user_preferences.members(FLAG_LEVELUP_OPTOUT))
 
 def toggle_levelup_message(user_id) -> bool:
     """
     Toggle a user's level-up message preference
     Returns True if messages are now enabled, False if disabled
     """
-    uid = str(user_id)
-    optouts = load_levelup_message_optouts()
-    if uid in optouts:
-        optouts.remove(uid)
-        save_levelup_message_optouts(optouts)
-        return True
-    optouts.append(uid)
-    save_levelup_message_optouts(optouts)
-    return False
+    return not user_preferences.toggle(FLAG_LEVELUP_OPTOUT, user_id)
 
 def is_levelup_message_enabled(user_id: int) -> bool:
     """Check if a user has level-up messages enabled"""
-    return str(user_id) not in load_levelup_message_optouts()
+    return not user_preferences.has(FLAG_LEVELUP_OPTOUT, user_id)
+
+def benchmark_rank(users=1_000_000, lookups=10_000):
+    """Time building the rank index and top-10 / rank lookups on synthetic users."""
+    import random
+    rng = random.Random(0)
+    xp = {str(i): rng.randrange(0, 5_000_000) for i in range(users)}
+
+    start = time.perf_counter()
+    index = RankIndex((-value, uid) for uid, value in xp.items())
+    build_s = time.perf_counter() - start
+
+    sample = [str(rng.randrange(users)) for _ in range(lookups)]
+    start = time.perf_counter()
+    for uid in sample:
+        index.rank((-xp[uid], uid))
+    rank_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(lookups):
+        index.slice(0, 10)
+    top_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for uid in sample:
+        index.remove((-xp[uid], uid))
+        xp[uid] += 15
+        index.add((-xp[uid], uid))
+    update_s = time.perf_counter() - start
+
+    return {
+        "users": users,
+        "build_s": round(build_s, 3),
+        "rank_us": round(rank_s / lookups * 1e6, 2),
+        "top10_us": round(top_s / lookups * 1e6, 2),
+        "update_us": round(update_s / lookups * 1e6, 2),
+    }
+
+def benchmark(users=100_000):
+    """Time loading, awarding and flushing XP for a synthetic user base.
+
+    Runs against a temporary database so the real store is left untouched.
+    """
+    global _repo, _records, _rank_index, _replace_all
+    real_repo, real_records, real_rank_index = _repo, _records, _rank_index
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(f"{tmp}/bench.db")
+        _repo = db.xp
+        _rank_index = None
+        try:
+            _records = {str(i): XPRecord(i * 15, i, 0.0) for i in range(users)}
+            _replace_all = True
+            start = time.perf_counter()
+            flush()
+            flush_s = time.perf_counter() - start
+
+            _records = None
+            start = time.perf_counter()
+            _get_records()
+            load_s = time.perf_counter() - start
+
+            async def award_all():
+                start = time.perf_counter()
+                for i in range(users):
+                    award_xp(i, now=float(XP_COOLDOWN))
+                elapsed = time.perf_counter() - start
+                start = time.perf_counter()
+                flush()
+                batch_s = time.perf_counter() - start
+
+                for i in range(0, users, 100):
+                    award_xp(i, now=float(XP_COOLDOWN * 2))
+                start = time.perf_counter()
+                flush()
+                return elapsed, batch_s, time.perf_counter() - start
+
+            award_s, batch_s, partial_s = asyncio.run(award_all())
+        finally:
+            db.close()
+            _repo, _records, _rank_index = real_repo, real_records, real_rank_index
+            _dirty_ids.clear()
+            _replace_all = False
+    return {
+        "users": users,
+        "load_s": round(load_s, 4),
+        "full_flush_s": round(flush_s, 4),
+        "award_us": round(award_s / users * 1e6, 3),
+        "batch_flush_s": round(batch_s, 4),
+        "flush_1pct_s": round(partial_s, 4),
+    }
+
+
+if __name__ == "__main__":
+    print(benchmark())
+    print(benchmark_rank())
@@ -3,6 +3,8 @@ from discord import app_commands, ui
 from dotenv import load_dotenv
 from .commands import stats, roturacc, counting, group
 from .helpers import rotur
+from .helpers import json_codec
+from .helpers.http_clients import http_clients
 from .helpers.quote_generator import quote_generator
 from .helpers import icn
 from .helpers.icon_cache import IconCache
@@ -15,13 +17,18 @@ if XP_SYSTEM_ENABLED:
     from .helpers import xp_system
 else:
     xp_system = None
-import requests, json, os, random, string, re, sys
+import os, random, string, re, sys
 import aiohttp
 from io import BytesIO
 import asyncio, psutil, threading
 
 from .helpers import reactionStorage
-from .helpers.memory_system import MemorySystem
+from .helpers.daily_activity import daily_ledger
+from .helpers.storage import get_db, close_db, MARKER_ROTURBOARDED, MARKER_SHUSHED
+from .helpers.preferences import user_preferences, FLAG_DAILY_CREDIT_DM, FLAG_ACTIVITY_EXCLUDED
+from .helpers.memory_system import MemorySystem, flush as flush_memories, storage_stats as memory_storage_stats
+from .helpers.personalities import PersonalityRegistry
+from .helpers.skills import SkillCatalog
 from .helpers.python_sandbox import run_sandbox
 
 from sympy import sympify
@@ -53,14 +60,17 @@ avatars_api_base = str(os.getenv('AVATARS_BASE_URL', 'https://avatars.rotur.dev'
 BOT_OWNER_ID = int(os.getenv('BOT_OWNER_ID', 603952506330021898))
 
 tools = open(os.path.join(_MODULE_DIR, "static", "tools.json"), "r")
-tools = json.load(tools)
+tools = json_codec.load(tools)
 
 with open(os.path.join(_MODULE_DIR, "static", "history.json"), "r") as history_file:
-    history = json.load(history_file)
+    history = json_codec.load(history_file)
 
 import textwrap
 
 PERSONALITIES_DIR = os.path.join(_MODULE_DIR, "personalities")
+personality_registry = PersonalityRegistry(PERSONALITIES_DIR)
+SKILLS_DIR = os.path.join(_MODULE_DIR, "skills")
+skill_catalog = SkillCatalog(SKILLS_DIR)
 
 CHANNEL_MESSAGE_CACHE: dict[int, list[dict]] = {}
 MAX_CACHE_SIZE = 40
@@ -193,43 +203,21 @@ def get_tier_requirements(personality_name: str) -> list[str]:
     return SUBSCRIPTION_TIER_ORDER[tier_index:]
 
 def load_personalities():
-    """Load all personalities from the personalities directory."""
-    personalities = {}
-    if not os.path.exists(PERSONALITIES_DIR):
-        return personalities
-    
-    for filename in os.listdir(PERSONALITIES_DIR):
-        if filename.endswith(".md"):
-            name = filename[:-3]
-            filepath = os.path.join(PERSONALITIES_DIR, filename)
-            try:
-                with open(filepath, "r", encoding="utf-8") as f:
-                    personalities[name] = f.read()
-            except Exception as e:
-                print(f"Error loading personality {name}: {e}")
-    
-    return personalities
+    """Return {name: prompt} for all personalities in the personalities directory."""
+    return personality_registry.prompts()
 
 def get_personality_prompt(personality_name: str = "roturbot") -> str:
     """Get the system prompt for a specific personality."""
-    personalities = load_personalities()
-    if personality_name in personalities:
-        return personalities[personality_name]
-
-    if "roturbot" in personalities:
-        return personalities["roturbot"]
+    personality = personality_registry.get(personality_name) or personality_registry.get("roturbot")
+    if personality is not None:
+        return personality.prompt
 
     return "Hey there! I'm here to help."
 
 def get_personality_gif_prefix(personality_name: str) -> str:
-    """Extract the GIF_PREFIX from a personality file."""
-    personalities = load_personalities()
-    if personality_name in personalities:
-        content = personalities[personality_name]
-        for line in content.split('\n'):
-            if line.startswith('GIF_PREFIX:'):
-                return line.split(':', 1)[1].strip()
-    return ""
+    """Get the GIF_PREFIX declared in a personality file."""
+    personality = personality_registry.get(personality_name)
+    return personality.gif_prefix if personality is not None else ""
 
 def load_tool_instructions():
     """Load tool usage instructions."""
@@ -239,123 +227,41 @@ def load_tool_instructions():
     except FileNotFoundError:
         return "Use tools proactively to help with tasks and information retrieval."
 
-def load_user_personalities():
-    """Load user personality preferences from JSON file."""
-    try:
-        with open(os.path.join(_MODULE_DIR, "store", "user_personalities.json"), "r") as f:
-            return json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        return {}
-
-def save_user_personalities(personalities):
-    """Save user personality preferences to JSON file."""
-    with open(os.path.join(_MODULE_DIR, "store", "user_personalities.json"), "w") as f:
-        json.dump(personalities, f)
-
 def get_user_personality(user_id: int) -> str:
     """Get the personality preference for a user, defaults to 'roturbot'."""
-    user_personalities = load_user_personalities()
-    uid = str(user_id)
-    
-    if uid in user_personalities:
-        personalities = load_personalities()
-        personality = user_personalities[uid]
-        if personality in personalities:
-            return personality
+    personality = user_preferences.get_personality(user_id)
+    if personality and personality in personality_registry:
+        return personality
     
     return "roturbot"
 
 def set_user_personality(user_id: int, personality_name: str) -> bool:
     """Set the personality preference for a user."""
-    personalities = load_personalities()
-    if personality_name not in personalities:
+    if personality_name not in personality_registry:
         return False
     
-    user_personalities = load_user_personalities()
-    user_personalities[str(user_id)] = personality_name
-    save_user_personalities(user_personalities)
+    user_preferences.set_personality(user_id, personality_name)
     
     return True
 
 SYSTEM_PROMPT = load_personalities()["roturbot"]
 
-def load_activity_exclusions():
-    """Load the list of users excluded from activity alerts"""
-    try:
-        with open(os.path.join(_MODULE_DIR, "store", "activity_exclusions.json"), "r") as f:
-            return json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        return []
-
-def save_activity_exclusions(exclusions):
-    """Save the list of users excluded from activity alerts"""
-    with open(os.path.join(_MODULE_DIR, "store", "activity_exclusions.json"), "w") as f:
-        json.dump(exclusions, f)
-
 # ---------------- Daily Credit DM Opt-in Handling ---------------- #
-def load_daily_credit_dm_optins():
-    """Load list of users who opted in to receive daily credit DM notifications."""
-    try:
-        with open(os.path.join(_MODULE_DIR, "store", "daily_credit_dm_optins.json"), "r") as f:
-            data = json.load(f)
-            if isinstance(data, list):
-                return data
-            return []
-    except (FileNotFoundError, json.JSONDecodeError):
-        return []
-
-def save_daily_credit_dm_optins(optins):
-    """Persist the daily credit DM opt-in list."""
-    with open(os.path.join(_MODULE_DIR, "store", "daily_credit_dm_optins.json"), "w") as f:
-        json.dump(optins, f)
-
 def toggle_daily_credit_dm_optin(user_id) -> bool:
     """Toggle a user's opt-in status. Returns True if now enabled, False if disabled."""
-    uid = str(user_id)
-    optins = load_daily_credit_dm_optins()
-    if uid in optins:
-        optins.remove(uid)
-        save_daily_credit_dm_optins(optins)
-        return False
-    optins.append(uid)
-    save_daily_credit_dm_optins(optins)
-    return True
+    return user_preferences.toggle(FLAG_DAILY_CREDIT_DM, user_id)
 
 def is_daily_credit_dm_enabled(user_id: int) -> bool:
     """Check if a user has opted in to daily credit DM notifications."""
-    return str(user_id) in load_daily_credit_dm_optins()
+    return user_preferences.has(FLAG_DAILY_CREDIT_DM, user_id)
 
 def is_user_excluded(user_id):
     """Check if a user is excluded from activity alerts"""
-    exclusions = load_activity_exclusions()
-    return str(user_id) in exclusions
+    return user_preferences.has(FLAG_ACTIVITY_EXCLUDED, user_id)
 
 def toggle_user_exclusion(user_id):
-    """Toggle a user's exclusion status and return new status"""
-    exclusions = load_activity_exclusions()
-    user_id = str(user_id)
-    
-    if user_id in exclusions:
-        exclusions.remove(user_id)
-        save_activity_exclusions(exclusions)
-        return False  # No longer excluded
-    else:
-        exclusions.append(user_id)
-        save_activity_exclusions(exclusions)
-        return True  # Now excluded
-
-def load_daily_activity():
-    """Load daily activity tracking data"""
-    try:
-        with open(os.path.join(_MODULE_DIR, "store", "daily_activity.json"), "r") as f:
-            return json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        return {"date": "", "users": {}}
-
-def save_daily_activity(data):
-    """Save daily activity tracking data"""
-    with open(os.path.join(_MODULE_DIR, "store", "daily_activity.json"), "w") as f:
-        json.dump(data, f)
+    """Toggle a user's exclusion status and return new status (True if now excluded)"""
+    return user_preferences.toggle(FLAG_ACTIVITY_EXCLUDED, user_id)
 
 def get_current_date():
     """Get current date in server timezone (UTC for now)"""
@@ -489,23 +395,20 @@ async def send_credit_dm(user, old_balance, new_balance, credit_amount, subscrip
 async def process_daily_credits():
     """Reset daily tracking and announce new day at midnight"""
     global last_daily_announcement_date
-    try:
-        activity_data = load_daily_activity()
-    except Exception:
-        activity_data = {"date": "", "users": {}}
-
     current_date = get_current_date()
 
     if last_daily_announcement_date == current_date:
         return
 
-    users_awarded = len(activity_data.get("users", {}))
-    total_credits_awarded = sum(activity_data.get("users", {}).values())
-
     try:
-        save_daily_activity({"date": "", "users": {}})
+        closed_day = daily_ledger.roll_over(current_date)
     except Exception as e:
-        print(f"Failed to reset daily activity store: {e}")
+        print(f"Failed to reset daily activity ledger: {e}")
+        closed_day = {"users": 0, "total": 0.0}
+
+    users_awarded = closed_day["users"]
+    total_credits_awarded = closed_day["total"]
+    dm_optins = len(user_preferences.filter(FLAG_DAILY_CREDIT_DM, closed_day.get("user_ids", ())))
 
     general_channel = client.get_channel(1338555310335463557)  # rotur general
     try:
@@ -532,7 +435,7 @@ async def process_daily_credits():
     except Exception as e:
         print(f"Failed to send daily credits announcement: {e}")
 
-    print(f"Daily credits reset: Yesterday had {users_awarded} users, {total_credits_awarded:.2f} total credits")
+    print(f"Daily credits reset: Yesterday had {users_awarded} users ({dm_optins} with DMs on), {total_credits_awarded:.2f} total credits")
     last_daily_announcement_date = current_date
 
 async def battery_notifier():
@@ -620,7 +523,7 @@ async def memory_cleanup_scheduler():
     while not client.is_closed():
         try:
             print("Running memory cleanup...")
-            deleted_count = MemorySystem.cleanup_expired()
+            deleted_count = await MemorySystem.cleanup_expired_async()
             print(f"Memory cleanup complete: {deleted_count} expired memories removed")
             
             await asyncio.sleep(86400)
@@ -635,7 +538,16 @@ intents.reactions = True
 intents.presences = True
 intents.members = True
 
-client = discord.Client(intents=intents)
+class RoturBotClient(discord.Client):
+    async def close(self):
+        # client.run() stops the event loop after this, so release the pooled
+        # HTTP connections here rather than in run()'s finally block.
+        await rotur.close()
+        await http_clients.close()
+        await super().close()
+
+
+client = RoturBotClient(intents=intents)
 
 last_daily_announcement_date = None
 daily_scheduler_started = False
@@ -896,6 +808,74 @@ async def restart(ctx: discord.Interaction):
     except Exception as e:
         await send_message(ctx.response, f'Error: {str(e)}', ephemeral=True)
 
+@allowed_everywhere
+@tree.command(name='memorystats', description='Show memory store and reaction stats write counters (bot owner only)')
+async def memorystats(ctx: discord.Interaction):
+    if ctx.user.id != BOT_OWNER_ID:
+        await send_message(ctx.response, 'Only the bot owner can use this command', ephemeral=True)
+        return
+
+    stats = memory_storage_stats()
+    lines = [
+        f"Write locks acquired: {stats['acquired']} (contended: {stats['contended']})",
+        f"Wait: {stats['wait_seconds']}s total, {stats['avg_wait_ms']}ms avg, {stats['max_wait_seconds']}s max",
+        f"Reloads: {stats['reloads']}, merges: {stats['merges']}",
+        f"Flushes: {stats['flushes']} ({stats['guilds_written']} guild writes, {stats['changes']} changes)",
+        f"Resident guilds: {stats['resident_guilds']}, dirty: {stats['dirty_guilds']}",
+    ]
+    reactions = reactionStorage.get_flush_counters()
+    lines.append(
+        f"Reaction stats: {reactions['flushes']} flushes, {reactions['avg_coalesced']} events per flush "
+        f"(max {reactions['max_coalesced']}), {reactions['pending']} pending"
+    )
+    await send_message(ctx.response, "\n".join(lines), ephemeral=True)
+
+@allowed_everywhere
+@tree.command(name='apistats', description='Show rotur API latency per endpoint (bot owner only)')
+@app_commands.describe(export='Attach the full stats as a text file')
+async def apistats(ctx: discord.Interaction, export: bool = False):
+    if ctx.user.id != BOT_OWNER_ID:
+        await send_message(ctx.response, 'Only the bot owner can use this command', ephemeral=True)
+        return
+
+    stats = rotur.api_stats()
+    if not stats:
+        await send_message(ctx.response, 'No rotur API requests recorded yet.', ephemeral=True)
+        return
+
+    width = min(32, max(len(name) for name in stats))
+    lines = [f"{'endpoint':<{width}} {'n':>6} {'4xx':>4} {'5xx':>4} {'err':>4} {'p50':>6} {'p95':>6} {'p99':>6}"]
+    for name, row in list(stats.items())[:15]:
+        failed = row.get('error', 0) + row.get('timeout', 0) + row.get('short_circuit', 0)
+        lines.append(
+            f"{name[:width]:<{width}} {row['requests']:>6} {row.get('4xx', 0):>4} {row.get('5xx', 0):>4} {failed:>4} "
+            f"{row['p50_ms']:>6.0f} {row['p95_ms']:>6.0f} {row['p99_ms']:>6.0f}"
+        )
+    message = "Slowest rotur endpoints by p95 (ms):\n```\n" + "\n".join(lines) + "\n```"
+    if len(stats) > 15:
+        message += f"\n{len(stats) - 15} more endpoints not shown."
+    pool = rotur.pool_metrics()
+    message += (
+        f"\nPool: {pool['connections_in_use']} in use, {pool['connections_idle']} idle "
+        f"(limit {pool['limit_per_host']} per host, {pool['limit']} total); "
+        f"{pool['queue_waits']} waited for a connection, avg {pool['avg_queue_wait_ms']}ms, max {pool['max_queue_wait_seconds']}s"
+    )
+    users = rotur.get_user_cache_stats()
+    message += (
+        f"\nUser cache: {users['hit_rate']:.0%} hit rate ({users['hits']} hits, {users['coalesced']} coalesced, "
+        f"{users['misses']} misses), {users['size']} cached, {users['invalidations']} invalidations"
+    )
+    shared = rotur.request_stats
+    message += f"\nShared GETs: {shared['coalesced']} coalesced, {shared['cache_hits']} served from cache"
+    resilience = rotur.resilience_stats
+    tripped = [f"{name} ({health['state']})" for name, health in rotur.breaker_states().items() if health['state'] != 'closed']
+    message += (
+        f"\nRetries: {resilience['retries']}, timeouts: {resilience['timeouts']}, "
+        f"short-circuited: {resilience['short_circuited']}; breakers not closed: {', '.join(tripped) or 'none'}"
+    )
+    file = discord.File(BytesIO(rotur.api_stats_text().encode()), filename="apistats.txt") if export else None
+    await send_message(ctx.response, message, file=file, ephemeral=True)
+
 @allowed_everywhere
 @friends.command(name='add', description='Send a friend request to a user')
 @app_commands.describe(username='The username to send a friend request to')
@@ -1363,6 +1343,86 @@ async def level(ctx: discord.Interaction):
     except Exception as e:
         await send_message(ctx.response, f"Error fetching level data: {str(e)}")
 
+LEADERBOARD_PAGE_SIZE = 10
+
+def _build_leaderboard_embed(user: discord.abc.User, page: int) -> discord.Embed:
+    """Render one page of the XP leaderboard straight from the rank index."""
+    offset = page * LEADERBOARD_PAGE_SIZE
+    entries = xp_system.get_leaderboard(offset=offset, limit=LEADERBOARD_PAGE_SIZE)
+
+    leaderboard_text = []
+    for i, (uid, stats) in enumerate(entries, offset + 1):
+        level = stats.get('level', 0)
+        xp = stats.get('xp', 0)
+        
+        medal = ""
+        if i == 1:
+            medal = "🥇 "
+        elif i == 2:
+            medal = "🥈 "
+        elif i == 3:
+            medal = "🥉 "
+        
+        leaderboard_text.append(f"{medal}**#{i}** <@{uid}> - Level {level} ({xp:,} XP)")
+    
+    embed = discord.Embed(
+        title="XP Leaderboard",
+        description="\n".join(leaderboard_text) or "No entries on this page.",
+        color=discord.Color.gold()
+    )
+    
+    user_rank = xp_system.get_user_rank(user.id)
+    if user_rank:
+        user_stats = xp_system.get_user_xp_stats(user.id)
+        user_level = user_stats.get('level', 0)
+        user_xp = user_stats.get('xp', 0)
+        
+        if user_rank <= 10:
+            footer_text = f"You are #{user_rank} on the leaderboard!"
+        else:
+            footer_text = f"Your Rank: #{user_rank} - Level {user_level} ({user_xp:,} XP)"
+        
+        embed.set_footer(text=footer_text, icon_url=user.display_avatar.url)
+    else:
+        embed.set_footer(text="Start chatting to appear on the leaderboard!")
+    return embed
+
+class LeaderboardView(discord.ui.View):
+    def __init__(self, owner_id: int, page: int = 0):
+        super().__init__(timeout=300)
+        self.owner_id = owner_id
+        self.page = page
+        self._update_buttons()
+
+    def _page_count(self) -> int:
+        total = xp_system.get_ranked_user_count()
+        return max(1, (total + LEADERBOARD_PAGE_SIZE - 1) // LEADERBOARD_PAGE_SIZE)
+
+    def _update_buttons(self):
+        self.previous_page.disabled = self.page <= 0
+        self.next_page.disabled = self.page >= self._page_count() - 1
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        if interaction.user.id != self.owner_id:
+            await interaction.response.send_message("These buttons are not for you!", ephemeral=True)
+            return False
+        return True
+
+    async def _show(self, interaction: discord.Interaction):
+        self.page = max(0, min(self.page, self._page_count() - 1))
+        self._update_buttons()
+        await interaction.response.edit_message(embed=_build_leaderboard_embed(interaction.user, self.page), view=self)
+
+    @discord.ui.button(label='◀ Previous', style=discord.ButtonStyle.secondary)
+    async def previous_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        self.page -= 1
+        await self._show(interaction)
+
+    @discord.ui.button(label='Next ▶', style=discord.ButtonStyle.secondary)
+    async def next_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        self.page += 1
+        await self._show(interaction)
+
 @allowed_everywhere
 @tree.command(name='leaderboard', description='View the XP leaderboard')
 async def leaderboard(ctx: discord.Interaction):
@@ -1373,63 +1433,12 @@ async def leaderboard(ctx: discord.Interaction):
     await ctx.response.defer()
     
     try:
-        data = xp_system.load_user_xp_data()
-        
-        if not data:
+        if xp_system.get_ranked_user_count() == 0:
             await send_message(ctx.followup, "No leaderboard data available yet!")
             return
         
-        sorted_users = sorted(
-            data.items(),
-            key=lambda x: (x[1].get('level', 0), x[1].get('xp', 0)),
-            reverse=True
-        )
-        
-        user_id = str(ctx.user.id)
-        user_rank = None
-        for i, (uid, _) in enumerate(sorted_users, 1):
-            if uid == user_id:
-                user_rank = i
-                break
-        
-        top_10 = sorted_users[:10]
-        
-        leaderboard_text = []
-        for i, (uid, stats) in enumerate(top_10, 1):
-            level = stats.get('level', 0)
-            xp = stats.get('xp', 0)
-            
-            medal = ""
-            if i == 1:
-                medal = "🥇 "
-            elif i == 2:
-                medal = "🥈 "
-            elif i == 3:
-                medal = "🥉 "
-            
-            leaderboard_text.append(f"{medal}**#{i}** <@{uid}> - Level {level} ({xp:,} XP)")
-        
-        embed = discord.Embed(
-            title="XP Leaderboard",
-            description="\n".join(leaderboard_text),
-            color=discord.Color.gold()
-        )
-        
-        if user_rank:
-            user_stats = data[user_id]
-            user_level = user_stats.get('level', 0)
-            user_xp = user_stats.get('xp', 0)
-            
-            if user_rank <= 10:
-                footer_text = f"You are #{user_rank} on the leaderboard!"
-            else:
-                footer_text = f"Your Rank: #{user_rank} - Level {user_level} ({user_xp:,} XP)"
-            
-            embed.set_footer(text=footer_text, icon_url=ctx.user.display_avatar.url)
-        else:
-            embed.set_footer(text="Start chatting to appear on the leaderboard!")
-        
-        await send_message(ctx.followup, embed=embed)
+        embed = _build_leaderboard_embed(ctx.user, 0)
+        await send_message(ctx.followup, embed=embed, view=LeaderboardView(ctx.user.id))
         
     except Exception as e:
         await send_message(ctx.followup, f"Error fetching leaderboard: {str(e)}")
@@ -2148,26 +2157,13 @@ async def most_true(ctx: discord.Interaction):
      
      try:
         await ctx.response.defer()
-        stats = reactionStorage.load_reaction_stats() or {}
-
         cur_emoji = "✅"
-        neg_emoji = "❌"
+        top = reactionStorage.top_messages("true", limit=10)
 
-        entries: list[tuple[str, int, dict]] = []
-        for link, reacts in stats.items():
-            if not isinstance(reacts, dict):
-                continue
-            count = int(reacts.get(cur_emoji, 0) or 0) - int(reacts.get(neg_emoji, 0) or 0)
-            if count > 0:
-                entries.append((link, count, reacts))
-
-        if not entries:
+        if not top:
             await send_message(ctx.followup, f"No messages have received any {cur_emoji} reactions yet.", ephemeral=True)
             return
 
-        entries.sort(key=lambda e: e[1], reverse=True)
-        top = entries[:10]
-
         embed = discord.Embed(title="Most True Messages", description=f"Messages with the most {cur_emoji} reactions", color=discord.Color.green())
         for i, (link, count, reacts) in enumerate(top, start=1):
             value = _format_entry(link, count, reacts, cur_emoji)
@@ -2182,26 +2178,13 @@ async def most_true(ctx: discord.Interaction):
 async def most_false(ctx: discord.Interaction):
     try:
         await ctx.response.defer()
-        stats = reactionStorage.load_reaction_stats() or {}
-
         cur_emoji = "❌"
-        neg_emoji = "✅"
-
-        entries: list[tuple[str, int, dict]] = []
-        for link, reacts in stats.items():
-            if not isinstance(reacts, dict):
-                continue
-            count = int(reacts.get(cur_emoji, 0) or 0) - int(reacts.get(neg_emoji, 0) or 0)
-            if count > 0:
-                entries.append((link, count, reacts))
+        top = reactionStorage.top_messages("false", limit=10)
 
-        if not entries:
+        if not top:
             await send_message(ctx.followup, f"No messages have received any {cur_emoji} reactions yet.", ephemeral=True)
             return
 
-        entries.sort(key=lambda e: e[1], reverse=True)
-        top = entries[:10]
-
         embed = discord.Embed(title="Most False Messages", description=f"Messages with the most {cur_emoji} reactions", color=discord.Color.red())
         for i, (link, count, reacts) in enumerate(top, start=1):
             # Use the same formatting helper as most_true for consistency
@@ -2229,6 +2212,7 @@ async def link(ctx: discord.Interaction, username: str, password: str):
         return
     try:
         resp = await rotur.update_user("update", user.get('username'), "discord_id", str(ctx.user.id))
+        rotur.invalidate_user(discord_id=ctx.user.id)
         if not resp.get("error"):
             await send_message(ctx.response, "Your Discord account has been linked to your rotur account.", ephemeral=True)
         else:
@@ -2276,6 +2260,7 @@ async def unlink(ctx: discord.Interaction):
         return
     try:
         resp = await rotur.update_user("update", user.get('username'), "discord_id", "")
+        rotur.invalidate_user(discord_id=ctx.user.id)
         if not resp.get("error"):
             await send_message(ctx.response, "Your Discord account has been unlinked from your rotur account.", ephemeral=True)
         else:
@@ -2364,30 +2349,28 @@ async def syncpfp(ctx: discord.Interaction):
     try:
         # Fetch user's Discord avatar bytes
         asset = str(ctx.user.display_avatar)
-        async with aiohttp.ClientSession() as session:
-            async with session.get(asset, timeout=aiohttp.ClientTimeout(total=15)) as r:
-                r.raise_for_status()
-                avatar_bytes = await r.read()
+        async with http_clients.session("discord_cdn").get(asset, timeout=aiohttp.ClientTimeout(total=15)) as r:
+            r.raise_for_status()
+            avatar_bytes = await r.read()
 
         b64_avatar = base64.b64encode(avatar_bytes).decode("utf-8")
         data_url = f"data:{r.content_type};base64,{b64_avatar}"
 
         payload = {"token": token, "image": data_url}
 
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                f"{avatars_api_base}/rotur-upload-pfp?ADMIN_TOKEN={os.getenv('ADMIN_TOKEN')}",
-                json=payload,
-                timeout=aiohttp.ClientTimeout(total=20)
-            ) as resp:
-                if resp.status == 200:
-                    await send_message(ctx.followup, "Your profile picture has been synced to rotur.", ephemeral=True)
-                else:
-                    await send_message(ctx.followup,
-                        f"Failed to sync profile picture. Server responded with status {resp.status}, message: {await resp.text()}",
-                        ephemeral=True,
-                    )
-            await rotur.update_user("update", user.get("username"), "pfp", f"{user.get('username')}?nocache={randomString(5)}")
+        async with http_clients.session("avatars").post(
+            f"{avatars_api_base}/rotur-upload-pfp?ADMIN_TOKEN={os.getenv('ADMIN_TOKEN')}",
+            json=payload,
+            timeout=aiohttp.ClientTimeout(total=20)
+        ) as resp:
+            if resp.status == 200:
+                await send_message(ctx.followup, "Your profile picture has been synced to rotur.", ephemeral=True)
+            else:
+                await send_message(ctx.followup,
+                    f"Failed to sync profile picture. Server responded with status {resp.status}, message: {await resp.text()}",
+                    ephemeral=True,
+                )
+        await rotur.update_user("update", user.get("username"), "pfp", f"{user.get('username')}?nocache={randomString(5)}")
     except Exception as e:
         # Use followup since we've already deferred
         await send_message(ctx.followup, f"Error syncing profile picture: {str(e)}", ephemeral=True)
@@ -2586,9 +2569,9 @@ async def get_key(ctx: discord.Interaction, key: str):
 ])
 async def tod(ctx: discord.Interaction, mode: str = 'truth'):
     try:
-        response = requests.get(f'https://api.truthordarebot.xyz/v1/{mode}')
-        if response.status_code == 200:
-            data = response.json()
+        async with http_clients.session("truthordare").get(f'https://api.truthordarebot.xyz/v1/{mode}') as response:
+            data = await response.json(content_type=None) if response.status == 200 else None
+        if data is not None:
             question = data.get('question', 'No question available')
             
             embed = discord.Embed(
@@ -2808,11 +2791,7 @@ async def reset_counting(ctx: discord.Interaction):
         await send_message(ctx.response, "This command only works in the counting channel!", ephemeral=True)
         return
     
-    state = counting.get_channel_state(channel_id)
-    old_count = state["current_count"]
-    state["current_count"] = 0
-    state["last_user"] = None
-    counting.save_state()
+    old_count = counting.reset_count(channel_id)
     
     embed = discord.Embed(
         title="🔄 Counting Reset",
@@ -2992,17 +2971,12 @@ async def on_message(message):
         not message.author.bot and
         str(message.guild.id) == originOS):
         
+        user_id = str(message.author.id)
+        current_date = get_current_date()
+        claimed = False
         try:
-            activity_data = load_daily_activity()
-            current_date = get_current_date()
-            
-            if activity_data.get("date") != current_date:
-                activity_data = {"date": current_date, "users": {}}
-            
-            user_id = str(message.author.id)
-            
-            if user_id not in activity_data["users"]:
-                activity_data["users"][user_id] = 0
+            claimed = daily_ledger.claim(user_id, current_date)
+            if claimed:
                 rotur_user = await rotur.get_user_by('discord_id', user_id)
                 if rotur_user and rotur_user.get('error') != "User not found":
                     credit_amount = get_user_highest_role_credit(message.author)
@@ -3012,8 +2986,8 @@ async def on_message(message):
                     if success:
                         old_balance, new_balance, awarded_amount, subscription_tier, subscription_multiplier = result
                         
-                        activity_data["users"][user_id] = awarded_amount
-                        save_daily_activity(activity_data)
+                        daily_ledger.record_credit(user_id, awarded_amount, current_date)
+                        claimed = False
                         
                         try:
                             await message.add_reaction("<:claimed_your_daily_chat_credit:1375999884179669053>")
@@ -3037,6 +3011,9 @@ async def on_message(message):
                     
         except Exception as e:
             print(f"Error processing daily activity: {e}")
+        finally:
+            if claimed:
+                daily_ledger.release(user_id)
 
     if not message.author.bot and message.guild is not None and str(message.guild.id) == originOS:
         if XP_SYSTEM_ENABLED and xp_system:
@@ -3130,7 +3107,7 @@ async def on_message(message):
 
     match spl[0]:
         case '!stats':
-            result = stats.query(spl)
+            result = await stats.query(spl)
             if result is not None and str(result).strip() != "":
                 await channel.send(result)
             else:
@@ -3178,10 +3155,7 @@ async def on_reaction_remove(reaction, user):
 
     message_link = f"{message.channel.id}/{message.id}"
 
-    stats = reactionStorage.load_reaction_stats() or {}
-    if message_link in stats:
-        stats[message_link][emoji] = reaction.count
-    reactionStorage.save_reaction_stats(stats)
+    reactionStorage.record_reaction(message_link, emoji, reaction.count, create=False)
 
 @client.event
 async def on_reaction_add(reaction, user):
@@ -3196,23 +3170,17 @@ async def on_reaction_add(reaction, user):
     message = reaction.message
     message_link = f"{message.channel.id}/{message.id}"
     
-    stats = reactionStorage.load_reaction_stats()
-    if message_link not in stats:
-        stats[message_link] = {}
-    stats[message_link][emoji] = reaction.count
-    stats[message_link]["author"] = message.author.name
-    stats[message_link]["content"] = message.content[:500]
-    reactionStorage.save_reaction_stats(stats)
+    reactionStorage.record_reaction(
+        message_link,
+        emoji,
+        reaction.count,
+        author=message.author.name,
+        content=message.content[:500],
+    )
 
     if emoji == '🔥' and reaction.count >= 4:
-        with open(os.path.join(_MODULE_DIR, "store", "roturboarded.json"), 'r') as f:
-            data = json.load(f)
         id = f"{reaction.message.id}/{reaction.message.channel.id}"
-        if id not in data:
-            data.append(id)
-            with open(os.path.join(_MODULE_DIR, "store", "roturboarded.json"), 'w') as f:
-                json.dump(data, f)
-
+        if get_db().markers.add(MARKER_ROTURBOARDED, id):
             target_channel = reaction.message.guild.get_channel(1363548391443009646)
             target_message_url = None
             if target_channel:
@@ -3283,30 +3251,24 @@ async def on_reaction_add(reaction, user):
         except Exception:
             return
         
-        with open(os.path.join(_MODULE_DIR, "store", "shushes.json"), 'r') as f:
-            timeouts = json.load(f)
         id = f"{reaction.message.id}/{reaction.message.channel.id}"
-        if id in timeouts:
+        if not get_db().markers.add(MARKER_SHUSHED, id):
             return
-        timeouts.append(id)
         error_messages = [
             f'Shush Error: {reaction.message.author.mention} has too much aura',
             f'Shush Error: {reaction.message.author.mention} has plot armour',
             f'Shush Error: {reaction.message.author.mention} has a discord addiction'
         ]
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(
-                    f'http://127.0.0.1:5601/timeout-user?token={token}&guildid={reaction.message.guild.id}&userid={reaction.message.author.id}&duration=90'
-                ) as resp:
-                    if resp.status == 500:
-                        await reaction.message.reply(random.choice(error_messages))
-                    else:
-                        await reaction.message.reply(f'{reaction.message.author.mention} has been shushed for 90 seconds!')
+            async with http_clients.session("local").get(
+                f'http://127.0.0.1:5601/timeout-user?token={token}&guildid={reaction.message.guild.id}&userid={reaction.message.author.id}&duration=90'
+            ) as resp:
+                if resp.status == 500:
+                    await reaction.message.reply(random.choice(error_messages))
+                else:
+                    await reaction.message.reply(f'{reaction.message.author.mention} has been shushed for 90 seconds!')
         except Exception:
             await reaction.message.channel.send(random.choice(error_messages))
-        with open(os.path.join(_MODULE_DIR, "store", "shushes.json"), 'w') as f:
-            json.dump(timeouts, f)
 
 @client.event
 async def on_member_join(member):
@@ -3401,13 +3363,12 @@ async def on_audit_log_entry_create(entry):
 async def on_ready():
     print(f'Logged in as {client.user}')
     print('------')
-    counting.init_state_file(_MODULE_DIR)
+    counting.init_state()
     
     global icon_cache
     if icon_cache is None:
         try:
-            cache_file = os.path.join(_MODULE_DIR, "store", "icon_cache.json")
-            icon_cache = IconCache(cache_file, client)
+            icon_cache = IconCache(client)
             print(f'Icon cache initialized with {len(icon_cache.cache)} cached application emojis')
         except Exception as e:
             print(f'Failed to initialize icon cache: {e}')
@@ -3547,7 +3508,7 @@ async def classify_query_complexity(prompt: str) -> str:
         raw = response.choices[0].message.content or ""
         raw = raw.strip().removeprefix("```json").removeprefix("```").removesuffix("```").strip()
         print(f"[router] '{prompt[:60]}' → {raw}")
-        data = json.loads(raw)
+        data = json_codec.loads(raw)
         complexity = data.get("complexity", "simple")
         print(f"[router] '{prompt[:60]}' → {complexity}")
         return complexity
@@ -3564,69 +3525,24 @@ def truncate_response(content: str) -> str:
     return truncated + f"\n\n[Note: Response truncated at {MAX_RESPONSE_CHARS} characters. Cannot display more content.]"
 
 async def call_tool(name: str, arguments: dict, my_msg: discord.Message | None = None, user_message: discord.Message | None = None) -> str:
-    async with aiohttp.ClientSession() as session:
-        match name:
-            case "get_context":
-                channel = client.get_channel(arguments.get("channel", 0))
-                if channel is None:
-                    return "Channel not found"
+    match name:
+        case "get_context":
+            channel = client.get_channel(arguments.get("channel", 0))
+            if channel is None:
+                return "Channel not found"
 
-                msg_id = arguments.get("message_id")
-                message = None
+            msg_id = arguments.get("message_id")
+            message = None
 
-                if msg_id:
-                    try:
-                        message = await channel.fetch_message(msg_id)
-                    except Exception:
-                        pass
-
-                    msgs = []
-
-                    if isinstance(channel, discord.TextChannel):
-                        cached_messages = message_cache.get_recent_messages(channel.id, 20)
-
-                        if cached_messages:
-                            for msg in cached_messages:
-                                msgs.append({
-                                    "author": {"username": msg["author"], "discord_id": msg.get("author_id", "unknown")},
-                                    "content": msg["content"][:500] if msg["content"] else "[No text content]",
-                                    "timestamp": msg["timestamp"],
-                                    "attachments": False,
-                                    "is_bot": msg["author_is_bot"],
-                                    "message_id": msg["id"],
-                                    "reactions": msg.get("reactions", [])
-                                })
-                            return json.dumps({"success": True, "messages": msgs, "source": "cache"})
-
-                        async for msg in channel.history(limit=20):
-                            message_reactions = []
-                            for reaction in msg.reactions:
-                                reaction_users = []
-                                async for user in reaction.users():
-                                    reaction_users.append({"id": str(user.id), "name": user.name})
-                                message_reactions.append({
-                                    "emoji": str(reaction.emoji),
-                                    "count": reaction.count,
-                                    "users": reaction_users
-                                })
+            if msg_id:
+                try:
+                    message = await channel.fetch_message(msg_id)
+                except Exception:
+                    pass
 
-                            msgs.append({
-                                "author": {"username": msg.author.name, "discord_id": str(msg.author.id)},
-                                "content": msg.content[:500] if msg.content else "[No text content]",
-                                "timestamp": msg.created_at.isoformat(),
-                                "attachments": len(msg.attachments) > 0,
-                                "is_bot": msg.author.bot,
-                                "message_id": msg.id,
-                                "reactions": message_reactions
-                            })
-                    else:
-                        return json.dumps({"success": False, "error": "Channel is not a text channel"})
+                msgs = []
 
-                    return json.dumps({"success": True, "messages": msgs, "source": "api"})
-                else:
-                    if not isinstance(channel, discord.TextChannel):
-                        return "Channel is not a text channel"
-                    msgs = []
+                if isinstance(channel, discord.TextChannel):
                     cached_messages = message_cache.get_recent_messages(channel.id, 20)
 
                     if cached_messages:
@@ -3640,7 +3556,7 @@ async def call_tool(name: str, arguments: dict, my_msg: discord.Message | None =
                                 "message_id": msg["id"],
                                 "reactions": msg.get("reactions", [])
                             })
-                        return parseMessages(msgs[::-1])
+                        return json_codec.dumps({"success": True, "messages": msgs, "source": "cache"})
 
                     async for msg in channel.history(limit=20):
                         message_reactions = []
@@ -3663,195 +3579,241 @@ async def call_tool(name: str, arguments: dict, my_msg: discord.Message | None =
                             "message_id": msg.id,
                             "reactions": message_reactions
                         })
+                else:
+                    return json_codec.dumps({"success": False, "error": "Channel is not a text channel"})
+
+                return json_codec.dumps({"success": True, "messages": msgs, "source": "api"})
+            else:
+                if not isinstance(channel, discord.TextChannel):
+                    return "Channel is not a text channel"
+                msgs = []
+                cached_messages = message_cache.get_recent_messages(channel.id, 20)
+
+                if cached_messages:
+                    for msg in cached_messages:
+                        msgs.append({
+                            "author": {"username": msg["author"], "discord_id": msg.get("author_id", "unknown")},
+                            "content": msg["content"][:500] if msg["content"] else "[No text content]",
+                            "timestamp": msg["timestamp"],
+                            "attachments": False,
+                            "is_bot": msg["author_is_bot"],
+                            "message_id": msg["id"],
+                            "reactions": msg.get("reactions", [])
+                        })
                     return parseMessages(msgs[::-1])
-            case "search_posts":
-                _, payload = await rotur.search_posts(arguments.get('query') or "", limit=20)
-                content = json.dumps(payload)
-                return truncate_response(content)
-            case "get_user":
-                _, payload = await rotur.profile_by_username(arguments.get('username') or "", include_posts=0)
-                content = json.dumps(payload)
-                return truncate_response(content)
-            case "get_posts":
-                _, payload = await rotur.profile_by_username(arguments.get('username') or "", include_posts=1)
-                content = json.dumps(payload)
-                return truncate_response(content)
-            case "convert_timestamp":
-                ts = arguments.get("timestamp")
-                if ts is None:
-                    return json.dumps({"error": "timestamp argument missing"})
 
-                try:
-                    ts_float = float(ts)
-                except Exception:
-                    return json.dumps({"error": "invalid timestamp"})
+                async for msg in channel.history(limit=20):
+                    message_reactions = []
+                    for reaction in msg.reactions:
+                        reaction_users = []
+                        async for user in reaction.users():
+                            reaction_users.append({"id": str(user.id), "name": user.name})
+                        message_reactions.append({
+                            "emoji": str(reaction.emoji),
+                            "count": reaction.count,
+                            "users": reaction_users
+                        })
 
-                # Detect likely unit
-                if ts_float > 1e18:      # nanoseconds
-                    ts_float /= 1e9
-                elif ts_float > 1e15:    # microseconds
-                    ts_float /= 1e6
-                elif ts_float > 1e12:    # milliseconds
-                    ts_float /= 1e3
-                # else: already seconds
+                    msgs.append({
+                        "author": {"username": msg.author.name, "discord_id": str(msg.author.id)},
+                        "content": msg.content[:500] if msg.content else "[No text content]",
+                        "timestamp": msg.created_at.isoformat(),
+                        "attachments": len(msg.attachments) > 0,
+                        "is_bot": msg.author.bot,
+                        "message_id": msg.id,
+                        "reactions": message_reactions
+                    })
+                return parseMessages(msgs[::-1])
+        case "search_posts":
+            _, payload = await rotur.search_posts(arguments.get('query') or "", limit=20)
+            content = json_codec.dumps(payload)
+            return truncate_response(content)
+        case "get_user":
+            _, payload = await rotur.profile_by_username(arguments.get('username') or "", include_posts=0)
+            content = json_codec.dumps(payload)
+            return truncate_response(content)
+        case "get_posts":
+            _, payload = await rotur.profile_by_username(arguments.get('username') or "", include_posts=1)
+            content = json_codec.dumps(payload)
+            return truncate_response(content)
+        case "convert_timestamp":
+            ts = arguments.get("timestamp")
+            if ts is None:
+                return json_codec.dumps({"error": "timestamp argument missing"})
 
-                try:
-                    dt = datetime.fromtimestamp(ts_float, tz=timezone.utc)
-                except Exception as e:
-                    return json.dumps({"error": f"invalid timestamp: {e}"})
-
-                iso = dt.isoformat()
-                human = dt.strftime("%Y-%m-%d %H:%M:%S UTC")
-                unix_sec = int(ts_float)
-                discord_ts = f"<t:{unix_sec}:f>"
-
-                return json.dumps({
-                    "iso": iso,
-                    "human": human,
-                    "unix": unix_sec,
-                    "discord_timestamp": discord_ts
-                })
-            case "get_timezone_info":
-                async with session.get(f"https://apps.mistium.com/timezone-info?timezone={arguments.get('timezone')}") as resp:
-                    return json.dumps(await resp.json())
+            try:
+                ts_float = float(ts)
+            except Exception:
+                return json_codec.dumps({"error": "invalid timestamp"})
+
+            # Detect likely unit
+            if ts_float > 1e18:      # nanoseconds
+                ts_float /= 1e9
+            elif ts_float > 1e15:    # microseconds
+                ts_float /= 1e6
+            elif ts_float > 1e12:    # milliseconds
+                ts_float /= 1e3
+            # else: already seconds
+
+            try:
+                dt = datetime.fromtimestamp(ts_float, tz=timezone.utc)
+            except Exception as e:
+                return json_codec.dumps({"error": f"invalid timestamp: {e}"})
+
+            iso = dt.isoformat()
+            human = dt.strftime("%Y-%m-%d %H:%M:%S UTC")
+            unix_sec = int(ts_float)
+            discord_ts = f"<t:{unix_sec}:f>"
+
+            return json_codec.dumps({
+                "iso": iso,
+                "human": human,
+                "unix": unix_sec,
+                "discord_timestamp": discord_ts
+            })
+        case "get_timezone_info":
+            async with http_clients.session("mistium").get(f"https://apps.mistium.com/timezone-info?timezone={arguments.get('timezone')}") as resp:
+                return json_codec.dumps(await resp.json(loads=json_codec.loads))
+        
+        case "get_current_time":
+            now_utc = datetime.now(timezone.utc)
+            result = {
+                "utc": {
+                    "iso": now_utc.isoformat(),
+                    "human": now_utc.strftime("%Y-%m-%d %H:%M:%S UTC"),
+                    "unix": int(now_utc.timestamp())
+                },
+                "timezones": {}
+            }
             
-            case "get_current_time":
-                now_utc = datetime.now(timezone.utc)
-                result = {
-                    "utc": {
-                        "iso": now_utc.isoformat(),
-                        "human": now_utc.strftime("%Y-%m-%d %H:%M:%S UTC"),
-                        "unix": int(now_utc.timestamp())
-                    },
-                    "timezones": {}
-                }
-                
-                common_timezones = [
-                    ("America/New_York", "EST/EDT"),
-                    ("America/Los_Angeles", "PST/PDT"),
-                    ("America/Chicago", "CST/CDT"),
-                    ("Europe/London", "GMT/BST"),
-                    ("Europe/Paris", "CET/CEST"),
-                    ("Europe/Berlin", "CET/CEST"),
-                    ("Asia/Tokyo", "JST"),
-                    ("Asia/Shanghai", "CST"),
-                    ("Australia/Sydney", "AEST/AEDT"),
-                    ("Pacific/Auckland", "NZST/NZDT")
-                ]
-                
-                for tz_name, tz_label in common_timezones:
-                    try:
-                        from zoneinfo import ZoneInfo
-                        tz_time = now_utc.astimezone(ZoneInfo(tz_name))
-                        result["timezones"][tz_label] = {
-                            "timezone": tz_name,
-                            "time": tz_time.strftime("%Y-%m-%d %H:%M:%S"),
-                            "offset": tz_time.strftime("%z")
-                        }
-                    except Exception:
-                        pass
-                
-                return json.dumps(result)
+            common_timezones = [
+                ("America/New_York", "EST/EDT"),
+                ("America/Los_Angeles", "PST/PDT"),
+                ("America/Chicago", "CST/CDT"),
+                ("Europe/London", "GMT/BST"),
+                ("Europe/Paris", "CET/CEST"),
+                ("Europe/Berlin", "CET/CEST"),
+                ("Asia/Tokyo", "JST"),
+                ("Asia/Shanghai", "CST"),
+                ("Australia/Sydney", "AEST/AEDT"),
+                ("Pacific/Auckland", "NZST/NZDT")
+            ]
             
-            case "extract_page":
-                async with session.post(
-                    f"https://api.tavily.com/extract",
-                    json={"urls": [*arguments.get("urls", [])]},
-                    headers={
-                        "authorization": f"Bearer {tavily_token}",
-                        "content-type":"application/json"
-                    }
-                ) as resp:
-                    data = await resp.json()
-                    results = data.get("results", [{}])
-                    if len(results) == 0:
-                        return "Error extracting data"
-                    content = results[0].get("raw_content", "")
-                    return truncate_response(content)
-            case "search_lore":
-                async with session.post(
-                    f"https://api.tavily.com/search",
-                    json={"query": f"originos.fandom.com {arguments.get('query', '')}"},
-                    headers={
-                        "authorization": f"Bearer {tavily_token}",
-                        "content-type":"application/json"
+            for tz_name, tz_label in common_timezones:
+                try:
+                    from zoneinfo import ZoneInfo
+                    tz_time = now_utc.astimezone(ZoneInfo(tz_name))
+                    result["timezones"][tz_label] = {
+                        "timezone": tz_name,
+                        "time": tz_time.strftime("%Y-%m-%d %H:%M:%S"),
+                        "offset": tz_time.strftime("%z")
                     }
-                ) as resp:
-                    data = await resp.json()
-                    results = data.get("results", [])
-                    return json.dumps([{"url": v.get("url", "")} for v in results if v.get("url", "").startswith("https://originos.fandom.com")])
-            case "get_lore_page":
-                page_title = arguments.get("page_title", "")
-                if not page_title:
-                    return json.dumps({"error": "Missing required parameter: page_title"})
-
-                wiki_api_url = os.getenv("WIKI_API_URL", "https://originos.fandom.com/api.php")
-                params = {
-                    "action": "query",
-                    "prop": "revisions",
-                    "rvprop": "content|timestamp|user",
-                    "rvslots": "main",
-                    "format": "json",
-                    "titles": page_title,
-                    "formatversion": "2"
+                except Exception:
+                    pass
+            
+            return json_codec.dumps(result)
+        
+        case "extract_page":
+            async with http_clients.session("tavily").post(
+                f"https://api.tavily.com/extract",
+                json={"urls": [*arguments.get("urls", [])]},
+                headers={
+                    "authorization": f"Bearer {tavily_token}",
+                    "content-type":"application/json"
                 }
-
-                async with session.get(wiki_api_url, params=params) as resp:
-                    if resp.status != 200:
-                        return json.dumps({"error": f"Wiki API returned status {resp.status}"})
-                    data = await resp.json()
-
-                    pages = data.get("query", {}).get("pages", [])
-                    if not pages:
-                        return json.dumps({"error": "No pages found"})
-
-                    page = pages[0]
-                    if "missing" in page:
-                        return json.dumps({"error": "Page not found", "page_title": page_title})
-
-                    revisions = page.get("revisions", [])
-                    if not revisions:
-                        return json.dumps({"error": "No revisions found", "page_title": page_title})
-
-                    content = revisions[0].get("slots", {}).get("main", {}).get("content", "")
-                    timestamp = revisions[0].get("timestamp", "")
-                    last_editor = revisions[0].get("user", "")
-
-                    return json.dumps({
-                        "page_title": page_title,
-                        "content": content,
-                        "last_modified": timestamp,
-                        "last_editor": last_editor,
-                        "page_url": f"https://originos.fandom.com/wiki/{page_title.replace(' ', '_')}"
-                    })
-            case "edit_lore_page":
-                page_title = arguments.get("page_title", "")
-                new_content = arguments.get("new_content", "")
-                edit_summary = arguments.get("edit_summary", "")
-
-                if not page_title or not new_content or not edit_summary:
-                    return json.dumps({"error": "Missing required parameters: page_title, new_content, and edit_summary are required"})
-
-                wiki_username = os.getenv("WIKI_USERNAME")
-                wiki_password = os.getenv("WIKI_PASSWORD")
-                wiki_api_url = os.getenv("WIKI_API_URL", "https://originos.fandom.com/api.php")
-
-                if not wiki_username or not wiki_password:
-                    return json.dumps({"error": "Wiki credentials not configured. Please set WIKI_USERNAME and WIKI_PASSWORD environment variables."})
-
-                login_params = {
-                    "action": "login",
-                    "lgname": wiki_username,
-                    "lgpassword": wiki_password,
-                    "format": "json",
-                    "lgtoken": "login"
+            ) as resp:
+                data = await resp.json(loads=json_codec.loads)
+                results = data.get("results", [{}])
+                if len(results) == 0:
+                    return "Error extracting data"
+                content = results[0].get("raw_content", "")
+                return truncate_response(content)
+        case "search_lore":
+            async with http_clients.session("tavily").post(
+                f"https://api.tavily.com/search",
+                json={"query": f"originos.fandom.com {arguments.get('query', '')}"},
+                headers={
+                    "authorization": f"Bearer {tavily_token}",
+                    "content-type":"application/json"
                 }
+            ) as resp:
+                data = await resp.json(loads=json_codec.loads)
+                results = data.get("results", [])
+                return json_codec.dumps([{"url": v.get("url", "")} for v in results if v.get("url", "").startswith("https://originos.fandom.com")])
+        case "get_lore_page":
+            page_title = arguments.get("page_title", "")
+            if not page_title:
+                return json_codec.dumps({"error": "Missing required parameter: page_title"})
+
+            wiki_api_url = os.getenv("WIKI_API_URL", "https://originos.fandom.com/api.php")
+            params = {
+                "action": "query",
+                "prop": "revisions",
+                "rvprop": "content|timestamp|user",
+                "rvslots": "main",
+                "format": "json",
+                "titles": page_title,
+                "formatversion": "2"
+            }
+
+            async with http_clients.session("wiki").get(wiki_api_url, params=params) as resp:
+                if resp.status != 200:
+                    return json_codec.dumps({"error": f"Wiki API returned status {resp.status}"})
+                data = await resp.json(loads=json_codec.loads)
+
+                pages = data.get("query", {}).get("pages", [])
+                if not pages:
+                    return json_codec.dumps({"error": "No pages found"})
+
+                page = pages[0]
+                if "missing" in page:
+                    return json_codec.dumps({"error": "Page not found", "page_title": page_title})
+
+                revisions = page.get("revisions", [])
+                if not revisions:
+                    return json_codec.dumps({"error": "No revisions found", "page_title": page_title})
+
+                content = revisions[0].get("slots", {}).get("main", {}).get("content", "")
+                timestamp = revisions[0].get("timestamp", "")
+                last_editor = revisions[0].get("user", "")
+
+                return json_codec.dumps({
+                    "page_title": page_title,
+                    "content": content,
+                    "last_modified": timestamp,
+                    "last_editor": last_editor,
+                    "page_url": f"https://originos.fandom.com/wiki/{page_title.replace(' ', '_')}"
+                })
+        case "edit_lore_page":
+            page_title = arguments.get("page_title", "")
+            new_content = arguments.get("new_content", "")
+            edit_summary = arguments.get("edit_summary", "")
+
+            if not page_title or not new_content or not edit_summary:
+                return json_codec.dumps({"error": "Missing required parameters: page_title, new_content, and edit_summary are required"})
+
+            wiki_username = os.getenv("WIKI_USERNAME")
+            wiki_password = os.getenv("WIKI_PASSWORD")
+            wiki_api_url = os.getenv("WIKI_API_URL", "https://originos.fandom.com/api.php")
+
+            if not wiki_username or not wiki_password:
+                return json_codec.dumps({"error": "Wiki credentials not configured. Please set WIKI_USERNAME and WIKI_PASSWORD environment variables."})
+
+            login_params = {
+                "action": "login",
+                "lgname": wiki_username,
+                "lgpassword": wiki_password,
+                "format": "json",
+                "lgtoken": "login"
+            }
 
-                async with session.post(wiki_api_url, data=login_params) as login_resp:
-                    login_data = await login_resp.json()
+            # Login cookies stay in this session, never in the shared wiki one.
+            async with http_clients.login_session("wiki") as wiki_session:
+                async with wiki_session.post(wiki_api_url, data=login_params) as login_resp:
+                    login_data = await login_resp.json(loads=json_codec.loads)
 
                     if login_data.get("login", {}).get("result") != "Success":
-                        return json.dumps({"error": "Wiki login failed", "details": login_data})
+                        return json_codec.dumps({"error": "Wiki login failed", "details": login_data})
 
                     login_token = login_data.get("login", {}).get("lgtoken", "")
 
@@ -3865,346 +3827,293 @@ async def call_tool(name: str, arguments: dict, my_msg: discord.Message | None =
                         "token": login_token
                     }
 
-                    async with session.post(wiki_api_url, data=edit_params) as edit_resp:
-                        edit_data = await edit_resp.json()
+                    async with wiki_session.post(wiki_api_url, data=edit_params) as edit_resp:
+                        edit_data = await edit_resp.json(loads=json_codec.loads)
 
                         if "error" in edit_data:
-                            return json.dumps({"error": "Wiki edit failed", "details": edit_data.get("error", {})})
+                            return json_codec.dumps({"error": "Wiki edit failed", "details": edit_data.get("error", {})})
 
                         edit_result = edit_data.get("edit", {})
                         if edit_result.get("result") == "Success":
-                            return json.dumps({
+                            return json_codec.dumps({
                                 "success": True,
                                 "page_title": page_title,
                                 "new_revid": edit_result.get("newrevid"),
                                 "page_url": f"https://originos.fandom.com/wiki/{page_title.replace(' ', '_')}"
                             })
                         else:
-                            return json.dumps({"error": "Edit did not succeed", "result": edit_result})
-            case "search_web":
-                async with session.post(
-                    f"https://api.tavily.com/search",
-                    json={"query": f"{arguments.get('query', '')}"},
-                    headers={
-                        "authorization": f"Bearer {tavily_token}",
-                        "content-type":"application/json"
-                    }
-                ) as resp:
-                    return json.dumps(await resp.json())
+                            return json_codec.dumps({"error": "Edit did not succeed", "result": edit_result})
+        case "search_web":
+            async with http_clients.session("tavily").post(
+                f"https://api.tavily.com/search",
+                json={"query": f"{arguments.get('query', '')}"},
+                headers={
+                    "authorization": f"Bearer {tavily_token}",
+                    "content-type":"application/json"
+                }
+            ) as resp:
+                return json_codec.dumps(await resp.json(loads=json_codec.loads))
+        
+        case "get_rotur_user_by_discord_id":
+            discord_id = arguments.get("discord_id", "")
+            if not discord_id:
+                return json_codec.dumps({"error": "Missing required parameter: discord_id"})
+
+            _, user_data = await rotur.profile_by_discord_id(discord_id)
+            if user_data and isinstance(user_data, dict):
+                safe_data = {k: v for k, v in user_data.items() if k not in ['key', 'password']}
+                content = json_codec.dumps({"success": True, "user": safe_data})
+                return truncate_response(content)
+            else:
+                return json_codec.dumps({"error": "User not found"})
+        
+        case "save_memory":
+            from .helpers.memory_system import memory_system
+            guild_id = str(arguments.get("guild_id", "global"))
+            content = arguments.get("content", "")
+            tags = arguments.get("tags", [])
+            importance = arguments.get("importance", 5)
+            ttl_days = arguments.get("ttl_days", 30)
             
-            case "get_rotur_user_by_discord_id":
-                discord_id = arguments.get("discord_id", "")
-                if not discord_id:
-                    return json.dumps({"error": "Missing required parameter: discord_id"})
-
-                _, user_data = await rotur.profile_by_discord_id(discord_id)
-                if user_data and isinstance(user_data, dict):
-                    safe_data = {k: v for k, v in user_data.items() if k not in ['key', 'password']}
-                    content = json.dumps({"success": True, "user": safe_data})
-                    return truncate_response(content)
-                else:
-                    return json.dumps({"error": "User not found"})
+            await memory_system.load_guild(guild_id)
+            memory = memory_system.save_memory(
+                guild_id=guild_id,
+                content=content,
+                tags=tags,
+                importance=importance,
+                ttl_days=ttl_days
+            )
+            return json_codec.dumps({
+                "success": True,
+                "memory_id": memory["id"],
+                "expires_at": memory["expires_at"],
+                # Set when the content nearly duplicated an existing memory, which now holds it
+                "merged": memory.get("merge_count", 0) > 0
+            })
+        
+        case "search_memories":
+            from .helpers.memory_system import memory_system
+            guild_id = str(arguments.get("guild_id", "global"))
+            query = arguments.get("query", "")
+            tags_filter = arguments.get("tags_filter")
+            min_importance = arguments.get("min_importance", 1)
             
-            case "save_memory":
-                from .helpers.memory_system import memory_system
-                guild_id = str(arguments.get("guild_id", "global"))
-                content = arguments.get("content", "")
-                tags = arguments.get("tags", [])
-                importance = arguments.get("importance", 5)
-                ttl_days = arguments.get("ttl_days", 30)
-                
-                memory = memory_system.save_memory(
-                    guild_id=guild_id,
-                    content=content,
-                    tags=tags,
-                    importance=importance,
-                    ttl_days=ttl_days
-                )
-                return json.dumps({
-                    "success": True,
-                    "memory_id": memory["id"],
-                    "expires_at": memory["expires_at"]
-                })
+            tags_list = tags_filter if tags_filter is not None else []
             
-            case "search_memories":
-                from .helpers.memory_system import memory_system
-                guild_id = str(arguments.get("guild_id", "global"))
-                query = arguments.get("query", "")
-                tags_filter = arguments.get("tags_filter")
-                min_importance = arguments.get("min_importance", 1)
-                
-                tags_list = tags_filter if tags_filter is not None else []
-                
-                results = memory_system.search_memories(
+            await memory_system.load_guild(guild_id)
+            results = memory_system.search_memories(
+                guild_id=guild_id,
+                query=query,
+                tags_filter=tags_list,
+                min_importance=min_importance,
+                limit=5,
+                use_semantic=False
+            )
+            
+            if len(results) < 3:
+                semantic_results = memory_system.search_memories(
                     guild_id=guild_id,
                     query=query,
                     tags_filter=tags_list,
                     min_importance=min_importance,
                     limit=5,
-                    use_semantic=False
+                    use_semantic=True
                 )
-                
-                if len(results) < 3:
-                    semantic_results = memory_system.search_memories(
-                        guild_id=guild_id,
-                        query=query,
-                        tags_filter=tags_list,
-                        min_importance=min_importance,
-                        limit=5,
-                        use_semantic=True
-                    )
-                    seen_ids = {r["id"] for r in results}
-                    for r in semantic_results:
-                        if r["id"] not in seen_ids:
-                            results.append(r)
-
-                content = json.dumps({
-                    "count": len(results),
-                    "memories": [
-                        {
-                            "id": r["id"],
-                            "content": r["content"],
-                            "tags": r["tags"],
-                            "importance": r["importance"],
-                            "created_at": r["created_at"],
-                            "access_count": r["access_count"]
-                        }
-                        for r in results[:5]
-                    ]
-                })
-                return truncate_response(content)
+                seen_ids = {r["id"] for r in results}
+                for r in semantic_results:
+                    if r["id"] not in seen_ids:
+                        results.append(r)
+
+            content = json_codec.dumps({
+                "count": len(results),
+                "memories": [
+                    {
+                        "id": r["id"],
+                        "content": r["content"],
+                        "tags": r["tags"],
+                        "importance": r["importance"],
+                        "created_at": r["created_at"],
+                        "access_count": r["access_count"]
+                    }
+                    for r in results[:5]
+                ]
+            })
+            return truncate_response(content)
+        
+        case "update_memory":
+            from .helpers.memory_system import memory_system
+            guild_id = str(arguments.get("guild_id", "global"))
+            memory_id = arguments.get("memory_id", "")
+            action = arguments.get("action", "")
+            new_ttl_days = arguments.get("new_ttl_days")
+            importance_boost = arguments.get("importance_boost")
             
-            case "update_memory":
-                from .helpers.memory_system import memory_system
-                guild_id = str(arguments.get("guild_id", "global"))
-                memory_id = arguments.get("memory_id", "")
-                action = arguments.get("action", "")
-                new_ttl_days = arguments.get("new_ttl_days")
-                importance_boost = arguments.get("importance_boost")
-                
-                ttl_days = new_ttl_days if new_ttl_days is not None else 30
-                imp_boost = importance_boost if importance_boost is not None else 1
-                
-                updated = memory_system.update_memory(
-                    guild_id=guild_id,
-                    memory_id=memory_id,
-                    action=action,
-                    new_ttl_days=ttl_days,
-                    importance_boost=imp_boost
-                )
-                
-                if updated:
-                    return json.dumps({
-                        "success": True,
-                        "memory_id": updated["id"],
-                        "new_expires_at": updated.get("expires_at"),
-                        "new_importance": updated.get("importance")
-                    })
-                else:
-                    return json.dumps({"success": False, "error": "Memory not found"})
+            ttl_days = new_ttl_days if new_ttl_days is not None else 30
+            imp_boost = importance_boost if importance_boost is not None else 1
+            
+            await memory_system.load_guild(guild_id)
+            updated = memory_system.update_memory(
+                guild_id=guild_id,
+                memory_id=memory_id,
+                action=action,
+                new_ttl_days=ttl_days,
+                importance_boost=imp_boost
+            )
             
-            case "add_reactions":
-                channel_id = int(arguments.get("channel_id", 0))
-                message_ids = arguments.get("message_ids", [])
-                emoji = arguments.get("emoji", "")
+            if updated:
+                return json_codec.dumps({
+                    "success": True,
+                    "memory_id": updated["id"],
+                    "new_expires_at": updated.get("expires_at"),
+                    "new_importance": updated.get("importance")
+                })
+            else:
+                return json_codec.dumps({"success": False, "error": "Memory not found"})
+        
+        case "add_reactions":
+            channel_id = int(arguments.get("channel_id", 0))
+            message_ids = arguments.get("message_ids", [])
+            emoji = arguments.get("emoji", "")
 
-                if not channel_id or not message_ids or not emoji:
-                    return json.dumps({"success": False, "error": "Missing required parameters: channel_id, message_ids (array), and emoji are required"})
+            if not channel_id or not message_ids or not emoji:
+                return json_codec.dumps({"success": False, "error": "Missing required parameters: channel_id, message_ids (array), and emoji are required"})
 
-                try:
-                    channel = client.get_channel(channel_id)
-                    if channel is None:
-                        return json.dumps({"success": False, "error": "Channel not found"})
+            try:
+                channel = client.get_channel(channel_id)
+                if channel is None:
+                    return json_codec.dumps({"success": False, "error": "Channel not found"})
 
-                    if not isinstance(channel, discord.TextChannel):
-                        return json.dumps({"success": False, "error": "Channel is not a text channel"})
+                if not isinstance(channel, discord.TextChannel):
+                    return json_codec.dumps({"success": False, "error": "Channel is not a text channel"})
 
-                    # Track results for each message
-                    results = []
-                    successful = []
-                    failed = []
+                # Track results for each message
+                results = []
+                successful = []
+                failed = []
 
-                    for message_id in message_ids:
-                        try:
-                            msg_id_int = int(message_id)
-                            # Fetch the message
-                            message = await channel.fetch_message(msg_id_int)
-                            # Add the reaction
-                            await message.add_reaction(emoji)
-                            successful.append(str(message_id))
-                            results.append({"message_id": str(message_id), "success": True})
-                        except discord.NotFound:
-                            failed.append(str(message_id))
-                            results.append({"message_id": str(message_id), "success": False, "error": "Message not found"})
-                        except discord.Forbidden:
-                            failed.append(str(message_id))
-                            results.append({"message_id": str(message_id), "success": False, "error": "No permission to access this message"})
-                        except discord.HTTPException as e:
-                            failed.append(str(message_id))
-                            results.append({"message_id": str(message_id), "success": False, "error": f"Discord API error: {str(e)}"})
-                        except ValueError:
-                            failed.append(str(message_id))
-                            results.append({"message_id": str(message_id), "success": False, "error": "Invalid message ID format"})
-
-                    return json.dumps({
-                        "success": len(successful) > 0,
-                        "total": len(message_ids),
-                        "successful": len(successful),
-                        "failed": len(failed),
-                        "message": f"Added reaction {emoji} to {len(successful)}/{len(message_ids)} messages",
-                        "results": results
-                    })
+                for message_id in message_ids:
+                    try:
+                        msg_id_int = int(message_id)
+                        # Fetch the message
+                        message = await channel.fetch_message(msg_id_int)
+                        # Add the reaction
+                        await message.add_reaction(emoji)
+                        successful.append(str(message_id))
+                        results.append({"message_id": str(message_id), "success": True})
+                    except discord.NotFound:
+                        failed.append(str(message_id))
+                        results.append({"message_id": str(message_id), "success": False, "error": "Message not found"})
+                    except discord.Forbidden:
+                        failed.append(str(message_id))
+                        results.append({"message_id": str(message_id), "success": False, "error": "No permission to access this message"})
+                    except discord.HTTPException as e:
+                        failed.append(str(message_id))
+                        results.append({"message_id": str(message_id), "success": False, "error": f"Discord API error: {str(e)}"})
+                    except ValueError:
+                        failed.append(str(message_id))
+                        results.append({"message_id": str(message_id), "success": False, "error": "Invalid message ID format"})
+
+                return json_codec.dumps({
+                    "success": len(successful) > 0,
+                    "total": len(message_ids),
+                    "successful": len(successful),
+                    "failed": len(failed),
+                    "message": f"Added reaction {emoji} to {len(successful)}/{len(message_ids)} messages",
+                    "results": results
+                })
 
-                except discord.HTTPException as e:
-                    return json.dumps({"success": False, "error": f"Discord API error: {str(e)}"})
-                except Exception as e:
-                    return json.dumps({"success": False, "error": f"Error adding reactions: {str(e)}"})
+            except discord.HTTPException as e:
+                return json_codec.dumps({"success": False, "error": f"Discord API error: {str(e)}"})
+            except Exception as e:
+                return json_codec.dumps({"success": False, "error": f"Error adding reactions: {str(e)}"})
+        
+        case "make_web_request":
+            method = arguments.get("method", "GET").upper()
+            url = arguments.get("url", "")
+            headers = arguments.get("headers", {})
+            body = arguments.get("body", {})
+            params = arguments.get("params", {})
             
-            case "make_web_request":
-                method = arguments.get("method", "GET").upper()
-                url = arguments.get("url", "")
-                headers = arguments.get("headers", {})
-                body = arguments.get("body", {})
-                params = arguments.get("params", {})
-                
-                if not url:
-                    return json.dumps({"error": "Missing required parameter: url"})
-                
-                req_headers = {}
-                for key, value in headers.items():
-                    req_headers[key] = str(value)
-                
-                try:
-                    async with session.request(
-                        method,
-                        url,
-                        headers=req_headers,
-                        json=body if body else None,
-                        params=params
-                    ) as resp:
-                        response_data = {
-                            "status": resp.status,
-                            "headers": dict(resp.headers),
-                        }
-                        
-                        try:
-                            response_data["body"] = await resp.json()
-                        except Exception:
-                            response_data["body"] = await resp.text()
-
-                        content = json.dumps(response_data)
-                        return truncate_response(content)
-                        
-                except Exception as e:
-                    return json.dumps({"error": f"Request failed: {str(e)}"})
+            if not url:
+                return json_codec.dumps({"error": "Missing required parameter: url"})
             
-            case "list_skills":
-                skills_dir = os.path.join(_MODULE_DIR, "skills")
-                try:
-                    if not os.path.exists(skills_dir):
-                        os.makedirs(skills_dir)
-                    
-                    skills = []
-                    for filename in os.listdir(skills_dir):
-                        if filename.endswith(".md"):
-                            skill_path = os.path.join(skills_dir, filename)
-                            try:
-                                with open(skill_path, "r") as f:
-                                    content = f.read()
-                                first_line = content.split("\n")[0] if content else ""
-                                description = first_line.replace("#", "").strip()
-                                skills.append({
-                                    "name": filename[:-3],
-                                    "description": description
-                                })
-                            except Exception:
-                                skills.append({
-                                    "name": filename[:-3],
-                                    "description": "Error reading description"
-                                })
-
-                    content = json.dumps({"skills": sorted(skills, key=lambda x: x["name"])})
-                    return truncate_response(content)
-                    
-                except Exception as e:
-                    return json.dumps({"error": f"Error listing skills: {str(e)}"})
+            req_headers = {}
+            for key, value in headers.items():
+                req_headers[key] = str(value)
             
-            case "search_skills":
-                query = arguments.get("query", "").lower()
-                if not query:
-                    return json.dumps({"error": "Missing required parameter: query"})
-                
-                skills_dir = os.path.join(_MODULE_DIR, "skills")
-                try:
-                    if not os.path.exists(skills_dir):
-                        os.makedirs(skills_dir)
+            try:
+                async with http_clients.session("web").request(
+                    method,
+                    url,
+                    headers=req_headers,
+                    json=body if body else None,
+                    params=params
+                ) as resp:
+                    response_data = {
+                        "status": resp.status,
+                        "headers": dict(resp.headers),
+                    }
                     
-                    skills = []
-                    for filename in os.listdir(skills_dir):
-                        if filename.endswith(".md"):
-                            skill_path = os.path.join(skills_dir, filename)
-                            try:
-                                with open(skill_path, "r") as f:
-                                 content = f.read().lower()
-                                 
-                                 search_terms = query.strip().split()
-                                 matches = all(term in content or term in filename.lower() for term in search_terms)
-                                 if matches:
-                                    first_line = content.split("\n")[0] if content else ""
-                                    description = first_line.replace("#", "").strip()
-                                    skills.append({
-                                        "name": filename[:-3],
-                                        "description": description
-                                    })
-                            except Exception:
-                                pass
+                    try:
+                        response_data["body"] = await resp.json(loads=json_codec.loads)
+                    except Exception:
+                        response_data["body"] = await resp.text()
 
-                    content = json.dumps({"results": sorted(skills, key=lambda x: x["name"])})
+                    content = json_codec.dumps(response_data)
                     return truncate_response(content)
                     
-                except Exception as e:
-                    return json.dumps({"error": f"Error searching skills: {str(e)}"})
-            
-            case "read_skill":
-                skill_name = arguments.get("skill_name", "").replace(".md", "")
-                if not skill_name:
-                    return json.dumps({"error": "Missing required parameter: skill_name"})
+            except Exception as e:
+                return json_codec.dumps({"error": f"Request failed: {str(e)}"})
+        
+        case "list_skills":
+            try:
+                content = json_codec.dumps({"skills": skill_catalog.list()})
+                return truncate_response(content)
                 
-                skill_path = os.path.join(_MODULE_DIR, "skills", f"{skill_name}.md")
-                try:
-                    with open(skill_path, "r") as f:
-                        content = f.read()
-                    skill_content = json.dumps({"name": skill_name, "content": content})
-                    return truncate_response(skill_content)
-                    
-                except FileNotFoundError:
-                    return json.dumps({"error": f"Skill not found: {skill_name}"})
-                except Exception as e:
-                    return json.dumps({"error": f"Error reading skill: {str(e)}"})
+            except Exception as e:
+                return json_codec.dumps({"error": f"Error listing skills: {str(e)}"})
+        
+        case "search_skills":
+            query = arguments.get("query", "").lower()
+            if not query:
+                return json_codec.dumps({"error": "Missing required parameter: query"})
             
-            case "create_skill":
-                name = arguments.get("name", "").replace(".md", "").replace("/", "").replace("\\", "")
-                description = arguments.get("description", "")
-                endpoints = arguments.get("endpoints", "")
-                authentication = arguments.get("authentication", "Not specified")
-                notes = arguments.get("notes", "")
-                
-                if not name:
-                    return json.dumps({"error": "Missing required parameter: name"})
-                if not description:
-                    return json.dumps({"error": "Missing required parameter: description"})
-                if not endpoints:
-                    return json.dumps({"error": "Missing required parameter: endpoints"})
-                
-                skills_dir = os.path.join(_MODULE_DIR, "skills")
-                if not os.path.exists(skills_dir):
-                    os.makedirs(skills_dir)
-                
-                skill_path = os.path.join(skills_dir, f"{name}.md")
-                if os.path.exists(skill_path):
-                    return json.dumps({"error": f"Skill already exists: {name}. Use edit_skill to update it."})
+            try:
+                content = json_codec.dumps({"results": skill_catalog.search(query)})
+                return truncate_response(content)
                 
-                content = f"""# {description}
+            except Exception as e:
+                return json_codec.dumps({"error": f"Error searching skills: {str(e)}"})
+        
+        case "read_skill":
+            skill_name = arguments.get("skill_name", "").replace(".md", "")
+            if not skill_name:
+                return json_codec.dumps({"error": "Missing required parameter: skill_name"})
+            
+            skill = skill_catalog.get(skill_name)
+            if skill is None:
+                return json_codec.dumps({"error": f"Skill not found: {skill_name}"})
+            skill_content = json_codec.dumps({"name": skill_name, "content": skill.content})
+            return truncate_response(skill_content)
+        
+        case "create_skill":
+            name = arguments.get("name", "").replace(".md", "").replace("/", "").replace("\\", "")
+            description = arguments.get("description", "")
+            endpoints = arguments.get("endpoints", "")
+            authentication = arguments.get("authentication", "Not specified")
+            notes = arguments.get("notes", "")
+            
+            if not name:
+                return json_codec.dumps({"error": "Missing required parameter: name"})
+            if not description:
+                return json_codec.dumps({"error": "Missing required parameter: description"})
+            if not endpoints:
+                return json_codec.dumps({"error": "Missing required parameter: endpoints"})
+            
+            if name in skill_catalog or os.path.exists(skill_catalog.path_for(name)):
+                return json_codec.dumps({"error": f"Skill already exists: {name}. Use edit_skill to update it."})
+            
+            content = f"""# {description}
 
 ## Authentication
 {authentication}
@@ -4218,248 +4127,243 @@ async def call_tool(name: str, arguments: dict, my_msg: discord.Message | None =
 ---
 *Created by roturbot on {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}*
 """
+            
+            try:
+                skill_catalog.write(name, content)
+                return json_codec.dumps({"success": True, "name": name, "message": f"Skill created: {name}"})
                 
-                try:
-                    with open(skill_path, "w") as f:
-                        f.write(content)
-                    return json.dumps({"success": True, "name": name, "message": f"Skill created: {name}"})
-                    
-                except Exception as e:
-                    return json.dumps({"error": f"Error creating skill: {str(e)}"})
+            except Exception as e:
+                return json_codec.dumps({"error": f"Error creating skill: {str(e)}"})
+        
+        case "edit_skill":
+            skill_name = arguments.get("skill_name", "").replace(".md", "")
+            if not skill_name:
+                return json_codec.dumps({"error": "Missing required parameter: skill_name"})
             
-            case "edit_skill":
-                skill_name = arguments.get("skill_name", "").replace(".md", "")
-                if not skill_name:
-                    return json.dumps({"error": "Missing required parameter: skill_name"})
+            skill = skill_catalog.get(skill_name)
+            if skill is None:
+                return json_codec.dumps({"error": f"Skill not found: {skill_name}"})
+            
+            try:
+                lines = skill.content.split("\n")
+                new_lines = []
+                section = None
                 
-                skill_path = os.path.join(_MODULE_DIR, "skills", f"{skill_name}.md")
-                if not os.path.exists(skill_path):
-                    return json.dumps({"error": f"Skill not found: {skill_name}"})
+                description = arguments.get("description")
+                endpoints = arguments.get("endpoints")
+                authentication = arguments.get("authentication")
+                notes = arguments.get("notes")
                 
-                try:
-                    with open(skill_path, "r") as f:
-                        content = f.read()
-                    
-                    lines = content.split("\n")
-                    new_lines = []
-                    section = None
-                    
-                    description = arguments.get("description")
-                    endpoints = arguments.get("endpoints")
-                    authentication = arguments.get("authentication")
-                    notes = arguments.get("notes")
+                i = 0
+                while i < len(lines):
+                    line = lines[i]
                     
-                    i = 0
-                    while i < len(lines):
-                        line = lines[i]
-                        
-                        if line.startswith("# "):
-                            if description is not None:
-                                new_lines.append(f"# {description}")
-                            else:
-                                new_lines.append(line)
-                        elif line.startswith("## Authentication"):
-                            section = "authentication"
-                            new_lines.append(line)
-                        elif line.startswith("## Endpoints"):
-                            section = "endpoints"
-                            new_lines.append(line)
-                        elif line.startswith("## Notes"):
-                            section = "notes"
-                            new_lines.append(line)
-                        elif line.startswith("---"):
-                            section = None
+                    if line.startswith("# "):
+                        if description is not None:
+                            new_lines.append(f"# {description}")
+                        else:
                             new_lines.append(line)
+                    elif line.startswith("## Authentication"):
+                        section = "authentication"
+                        new_lines.append(line)
+                    elif line.startswith("## Endpoints"):
+                        section = "endpoints"
+                        new_lines.append(line)
+                    elif line.startswith("## Notes"):
+                        section = "notes"
+                        new_lines.append(line)
+                    elif line.startswith("---"):
+                        section = None
+                        new_lines.append(line)
+                    else:
+                        if section == "authentication" and authentication is not None:
+                            new_lines.append(f"{authentication}")
+                            authentication = None
+                        elif section == "endpoints" and endpoints is not None:
+                            new_lines.append(f"{endpoints}")
+                            endpoints = None
+                        elif section == "notes" and notes is not None:
+                            new_lines.append(f"{notes}")
+                            notes = None
                         else:
-                            if section == "authentication" and authentication is not None:
-                                new_lines.append(f"{authentication}")
-                                authentication = None
-                            elif section == "endpoints" and endpoints is not None:
-                                new_lines.append(f"{endpoints}")
-                                endpoints = None
-                            elif section == "notes" and notes is not None:
-                                new_lines.append(f"{notes}")
-                                notes = None
-                            else:
-                                new_lines.append(line)
-                        
-                        i += 1
-                    
-                    with open(skill_path, "w") as f:
-                        f.write("\n".join(new_lines))
-                    
-                    return json.dumps({"success": True, "name": skill_name, "message": f"Skill updated: {skill_name}"})
+                            new_lines.append(line)
                     
+                    i += 1
+                
+                skill_catalog.write(skill_name, "\n".join(new_lines))
+                
+                return json_codec.dumps({"success": True, "name": skill_name, "message": f"Skill updated: {skill_name}"})
+                
+            except Exception as e:
+                return json_codec.dumps({"error": f"Error editing skill: {str(e)}"})
+        
+        case "execute_python_code":
+            code = arguments.get("code", "")
+            if not code:
+                return json_codec.dumps({"error": "Missing required parameter: code"})
+
+            result = run_sandbox(code)
+            content = json_codec.dumps(result)
+            return truncate_response(content)
+        
+        case "silent_exit":
+            if my_msg:
+                try:
+                    await my_msg.delete()
                 except Exception as e:
-                    return json.dumps({"error": f"Error editing skill: {str(e)}"})
-            
-            case "execute_python_code":
-                code = arguments.get("code", "")
-                if not code:
-                    return json.dumps({"error": "Missing required parameter: code"})
+                    print(f"Error deleting message for silent_exit: {e}")
+            return "__SILENT_EXIT__"
+
+        case "get_message_reactions":
+            channel_id = arguments.get("channel_id", "")
+            message_id = arguments.get("message_id", "")
+
+            if not channel_id or not message_id:
+                return json_codec.dumps({"error": "Missing required parameters: channel_id and message_id"})
+
+            try:
+                channel = client.get_channel(int(channel_id))
+                if not channel:
+                    return json_codec.dumps({"error": "Channel not found"})
+
+                message = await channel.fetch_message(int(message_id))
+
+                reactions_data = []
+                for reaction in message.reactions:
+                    users = []
+                    async for user in reaction.users():
+                        users.append({
+                            "id": str(user.id),
+                            "name": user.name,
+                            "display_name": user.display_name if user.display_name else user.name,
+                            "is_bot": user.bot
+                        })
 
-                result = run_sandbox(code)
-                content = json.dumps(result)
+                    reactions_data.append({
+                        "emoji": str(reaction.emoji),
+                        "count": reaction.count,
+                        "me": reaction.me,
+                        "users": users
+                    })
+
+                content = json_codec.dumps({
+                    "success": True,
+                    "message_id": message_id,
+                    "channel_id": channel_id,
+                    "reactions": reactions_data
+                })
                 return truncate_response(content)
-            
-            case "silent_exit":
-                if my_msg:
-                    try:
-                        await my_msg.delete()
-                    except Exception as e:
-                        print(f"Error deleting message for silent_exit: {e}")
-                return "__SILENT_EXIT__"
+            except discord.NotFound:
+                return json_codec.dumps({"error": "Message not found"})
+            except discord.Forbidden:
+                return json_codec.dumps({"error": "No permission to access this message"})
+            except Exception as e:
+                return json_codec.dumps({"error": f"Error getting reactions: {str(e)}"})
 
-            case "get_message_reactions":
-                channel_id = arguments.get("channel_id", "")
-                message_id = arguments.get("message_id", "")
+        case "timeout_user":
+            if not my_msg or not my_msg.guild:
+                return json_codec.dumps({"error": "Cannot timeout users in DMs"})
 
-                if not channel_id or not message_id:
-                    return json.dumps({"error": "Missing required parameters: channel_id and message_id"})
+            timeout_duration = arguments.get("duration_minutes", 5)
 
-                try:
-                    channel = client.get_channel(int(channel_id))
-                    if not channel:
-                        return json.dumps({"error": "Channel not found"})
+            user_id = arguments.get("user_id", "")
+            if not user_id:
+                return json_codec.dumps({"error": "Missing required parameter: user_id"})
 
-                    message = await channel.fetch_message(int(message_id))
+            try:
+                member = await my_msg.guild.fetch_member(int(user_id))
 
-                    reactions_data = []
-                    for reaction in message.reactions:
-                        users = []
-                        async for user in reaction.users():
-                            users.append({
-                                "id": str(user.id),
-                                "name": user.name,
-                                "display_name": user.display_name if user.display_name else user.name,
-                                "is_bot": user.bot
-                            })
+                if member.guild_permissions.administrator:
+                    return json_codec.dumps({"error": "Cannot timeout administrators"})
 
-                        reactions_data.append({
-                            "emoji": str(reaction.emoji),
-                            "count": reaction.count,
-                            "me": reaction.me,
-                            "users": users
-                        })
+                bot_member = my_msg.guild.get_member(client.user.id)
+                if not bot_member or not bot_member.guild_permissions.moderate_members:
+                    return json_codec.dumps({"error": "I don't have permission to timeout members"})
 
-                    content = json.dumps({
-                        "success": True,
-                        "message_id": message_id,
-                        "channel_id": channel_id,
-                        "reactions": reactions_data
-                    })
-                    return truncate_response(content)
-                except discord.NotFound:
-                    return json.dumps({"error": "Message not found"})
-                except discord.Forbidden:
-                    return json.dumps({"error": "No permission to access this message"})
-                except Exception as e:
-                    return json.dumps({"error": f"Error getting reactions: {str(e)}"})
+                timeout_seconds = timeout_duration * 60
+                if timeout_seconds > 600:
+                    timeout_seconds = 600
 
-            case "timeout_user":
-                if not my_msg or not my_msg.guild:
-                    return json.dumps({"error": "Cannot timeout users in DMs"})
+                timeout_until = datetime.now(timezone.utc) + timedelta(seconds=timeout_seconds)
 
-                timeout_duration = arguments.get("duration_minutes", 5)
+                await member.timeout(timeout_until, reason="Being disruptive")
 
-                user_id = arguments.get("user_id", "")
-                if not user_id:
-                    return json.dumps({"error": "Missing required parameter: user_id"})
+                return json_codec.dumps({
+                    "success": True,
+                    "user_id": user_id,
+                    "duration_minutes": timeout_duration
+                })
+            except discord.NotFound:
+                return json_codec.dumps({"error": "User not found in this server"})
+            except discord.Forbidden:
+                return json_codec.dumps({"error": "I don't have permission to timeout this user"})
+            except Exception as e:
+                return json_codec.dumps({"error": f"Error timing out user: {str(e)}"})
 
-                try:
-                    member = await my_msg.guild.fetch_member(int(user_id))
+        case "gif_exit":
+            query = arguments.get("query", "")
+            message = arguments.get("message", "").strip()
 
-                    if member.guild_permissions.administrator:
-                        return json.dumps({"error": "Cannot timeout administrators"})
+            if not query:
+                return json_codec.dumps({"error": "Missing required parameter: query"})
 
-                    bot_member = my_msg.guild.get_member(client.user.id)
-                    if not bot_member or not bot_member.guild_permissions.moderate_members:
-                        return json.dumps({"error": "I don't have permission to timeout members"})
+            # Get personality-specific GIF prefix
+            gif_prefix = ""
+            if user_message and hasattr(user_message, 'author'):
+                user_id = str(user_message.author.id)
+                personality_name = get_user_personality(int(user_id))
+                gif_prefix = get_personality_gif_prefix(personality_name)
 
-                    timeout_seconds = timeout_duration * 60
-                    if timeout_seconds > 600:
-                        timeout_seconds = 600
+            # Trim prefix from query if it's already there (case-insensitive)
+            if gif_prefix:
+                query_lower = query.lower()
+                prefix_lower = gif_prefix.lower()
+                if query_lower.startswith(prefix_lower):
+                    query = query[len(gif_prefix):].strip()
 
-                    timeout_until = datetime.now(timezone.utc) + timedelta(seconds=timeout_seconds)
+            # Prepend prefix to query if one exists
+            search_query = f"{gif_prefix} {query}".strip() if gif_prefix else query
 
-                    await member.timeout(timeout_until, reason="Being disruptive")
+            try:
+                async with http_clients.session("mistium").get(
+                    f"https://apps.mistium.com/tenor/search",
+                    params={"query": search_query},
+                    headers={"Origin": "https://originchats.mistium.com"}
+                ) as resp:
+                    if resp.status != 200:
+                        return json_codec.dumps({"error": f"Tenor API returned status {resp.status}"})
 
-                    return json.dumps({
-                        "success": True,
-                        "user_id": user_id,
-                        "duration_minutes": timeout_duration
-                    })
-                except discord.NotFound:
-                    return json.dumps({"error": "User not found in this server"})
-                except discord.Forbidden:
-                    return json.dumps({"error": "I don't have permission to timeout this user"})
-                except Exception as e:
-                    return json.dumps({"error": f"Error timing out user: {str(e)}"})
+                    gifs = await resp.json(loads=json_codec.loads)
 
-            case "gif_exit":
-                query = arguments.get("query", "")
-                message = arguments.get("message", "").strip()
+                    if not gifs or not isinstance(gifs, list):
+                        return json_codec.dumps({"error": "No GIFs found"})
 
-                if not query:
-                    return json.dumps({"error": "Missing required parameter: query"})
+                    # Extract GIF URLs and pick one randomly
+                    gif_urls = []
+                    for gif in gifs:
+                        media = gif.get("media", [{}])[0] if gif.get("media") else {}
+                        gif_url = media.get("gif", {}).get("url", "")
+                        if gif_url:
+                            gif_urls.append(gif_url)
 
-                # Get personality-specific GIF prefix
-                gif_prefix = ""
-                if user_message and hasattr(user_message, 'author'):
-                    user_id = str(user_message.author.id)
-                    personality_name = get_user_personality(int(user_id))
-                    gif_prefix = get_personality_gif_prefix(personality_name)
+                    if not gif_urls:
+                        return json_codec.dumps({"error": "No usable GIFs found"})
 
-                # Trim prefix from query if it's already there (case-insensitive)
-                if gif_prefix:
-                    query_lower = query.lower()
-                    prefix_lower = gif_prefix.lower()
-                    if query_lower.startswith(prefix_lower):
-                        query = query[len(gif_prefix):].strip()
+                    # Pick a random GIF
+                    import random
+                    selected_gif = random.choice(gif_urls)
 
-                # Prepend prefix to query if one exists
-                search_query = f"{gif_prefix} {query}".strip() if gif_prefix else query
+                    # Format response with GIF and optional message
+                    response_content = selected_gif
+                    if message:
+                        response_content = f"{selected_gif}\n\n{message}"
 
-                try:
-                    async with session.get(
-                        f"https://apps.mistium.com/tenor/search",
-                        params={"query": search_query},
-                        headers={"Origin": "https://originchats.mistium.com"}
-                    ) as resp:
-                        if resp.status != 200:
-                            return json.dumps({"error": f"Tenor API returned status {resp.status}"})
-
-                        gifs = await resp.json()
-
-                        if not gifs or not isinstance(gifs, list):
-                            return json.dumps({"error": "No GIFs found"})
-
-                        # Extract GIF URLs and pick one randomly
-                        gif_urls = []
-                        for gif in gifs:
-                            media = gif.get("media", [{}])[0] if gif.get("media") else {}
-                            gif_url = media.get("gif", {}).get("url", "")
-                            if gif_url:
-                                gif_urls.append(gif_url)
-
-                        if not gif_urls:
-                            return json.dumps({"error": "No usable GIFs found"})
-
-                        # Pick a random GIF
-                        import random
-                        selected_gif = random.choice(gif_urls)
-
-                        # Format response with GIF and optional message
-                        response_content = selected_gif
-                        if message:
-                            response_content = f"{selected_gif}\n\n{message}"
-
-                        # Return special marker with the full content
-                        return f"__GIF_EXIT__:{response_content}"
-                except Exception as e:
-                    return json.dumps({"error": f"Error searching for GIFs: {str(e)}"})
+                    # Return special marker with the full content
+                    return f"__GIF_EXIT__:{response_content}"
+            except Exception as e:
+                return json_codec.dumps({"error": f"Error searching for GIFs: {str(e)}"})
 
-        return ""
+    return ""
 
 async def get_automatic_skills(prompt: str) -> str:
     """
@@ -4467,51 +4371,12 @@ async def get_automatic_skills(prompt: str) -> str:
     Returns string containing matched skills or empty string if none found.
     """
     try:
-        skills_dir = os.path.join(_MODULE_DIR, "skills")
-        if not os.path.exists(skills_dir):
-            return ""
-            
-        available_skills = []
-        for filename in os.listdir(skills_dir):
-            if filename.endswith(".md"):
-                skill_name = filename[:-3]
-                skill_path = os.path.join(skills_dir, filename)
-                try:
-                    with open(skill_path, "r") as f:
-                        content = f.read()
-                    available_skills.append({"name": skill_name, "content": content})
-                except Exception:
-                    pass
-                    
-        if not available_skills:
-            return ""
-            
-        prompt_lower = prompt.lower()
-        matched_skills = []
-        
-        for skill in available_skills:
-            skill_name = skill["name"].lower()
-            skill_content = skill["content"].lower()
-            
-            name_match = skill_name in prompt_lower
-            name_plural = skill_name + "s"
-            plural_match = name_plural in prompt_lower
-            
-            name_with_spaces = skill_name.replace("_", " ").replace("-", " ")
-            spaced_match = name_with_spaces in prompt_lower
-            
-            first_word = skill_name.split("_")[0].split("-")[0]
-            first_word_match = False
-            if len(first_word) >= 4:
-                first_word_match = first_word in prompt_lower
-            
-            if name_match or plural_match or spaced_match or first_word_match:
-                matched_skills.append(skill)
-                
+        matched_skills = skill_catalog.match_prompt(prompt)
+
         if matched_skills:
             skills_content = "RELEVANT SKILLS AUTOMATICALLY INCLUDED:\n\n"
             for skill in matched_skills:
-                skills_content += f"## Skill: {skill['name']}\n{skill['content']}\n\n---\n\n"
+                skills_content += f"## Skill: {skill.name}\n{skill.content}\n\n---\n\n"
             return skills_content
             
         return ""
@@ -4558,7 +4423,7 @@ async def handle_ai_query(message: discord.Message, prompt: str, context_message
         {"role": "system", "content": personality_prompt},
         {"role": "system", "content": tool_instructions},
         {"role": "system", "content": f"You are talking to the rotur user named: {rotur_user.get('username', 'someone')}. On discord they are {message.author.name} ({message.author.id}) with display name: {message.author.display_name}. You are chatting in {message.channel.id}."},
-        {"role": "system", "content": f"User object (safe fields only): {json.dumps(safe_user_data, indent=2)}"},
+        {"role": "system", "content": f"User object (safe fields only): {json_codec.dumps(safe_user_data, indent=2)}"},
         {"role": "system", "content": f"Guild ID: {message.guild.id if message.guild else 'global'} - Use this guild_id for save_memory and search_memories tool calls."},
     ]
 
@@ -4570,6 +4435,7 @@ async def handle_ai_query(message: discord.Message, prompt: str, context_message
     from .helpers.memory_system import memory_system
     guild_id = str(message.guild.id) if message.guild else "global"
     
+    await memory_system.load_guild(guild_id)
     relevant_memories = memory_system.search_memories(
         guild_id=guild_id,
         query=prompt,
@@ -4694,7 +4560,7 @@ async def query_nvidia(messages: list, my_msg: discord.Message, complexity: str,
 
                 args_raw = func.get('arguments', '{}') if isinstance(func, dict) else getattr(func, 'arguments', '{}')
                 try:
-                    args = json.loads(args_raw)
+                    args = json_codec.loads(args_raw)
                 except Exception:
                     print(f"[nvidia] Failed to parse tool args for {func_name}: {args_raw}")
                     args = {}
@@ -4798,6 +4664,13 @@ def run(parent_context_func=None):
         client.run(token)
     except Exception as e:
         print(f"Error running bot: {e}")
+    finally:
+        reactionStorage.flush()
+        if xp_system:
+            xp_system.flush()
+        counting.save_state()
+        flush_memories()
+        close_db()
 
 @client.event
 async def on_message_delete(message):
@@ -4823,11 +4696,7 @@ async def on_message_delete(message):
             if deleted_value is None:
                 await message.channel.send("A counted message was deleted. Next number may have changed.")
             else:
-                new_current = max(0, deleted_value)
-                state['current_count'] = new_current
-                state['last_count_message_id'] = None
-                state['last_count_value'] = None
-                counting.save_state()
+                counting.restore_deleted_count(channel_id, deleted_value)
 
                 next_number = state['current_count'] + 1
                 await message.channel.send(f"user deleted number: {deleted_value}, next number is: {next_number}")